@@ -32,10 +32,11 @@ def example(data_path: Path, greeting: str = "Hello", outputs_dir: Path = Path("
     metrics = {"answer": get_the_ultimate_answer()}
     azureml_logger.log_metrics(metrics)
 
+    # Metrics are buffered and sent in batches, so logging one per step is cheap
     values = [1.0, 0.0, 1.0, 2.0, 3.0, 2.0, 4.0]
-    for v in values:
+    for step, v in enumerate(values):
         metrics = {"value": v}
-        azureml_logger.log_metrics(metrics)
+        azureml_logger.log_metrics(metrics, step=step)
 
     outputs_dir.mkdir(exist_ok=True, parents=True)
     out_filepath = outputs_dir / "hello.txt"
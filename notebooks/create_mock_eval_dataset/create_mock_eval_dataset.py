@@ -1,8 +1,9 @@
 import asyncio
-import itertools
 import logging
 import shutil
-from dataclasses import dataclass
+from collections import Counter
+from collections.abc import AsyncIterator, Iterable
+from contextlib import aclosing, asynccontextmanager
 from pathlib import Path
 from textwrap import dedent
 from types import CoroutineType
@@ -13,8 +14,28 @@ from agent_framework import ChatAgent, ChatMessage, DataContent, Role, TextConte
 from jinja2 import Environment, FileSystemLoader, Template
 from pydantic import BaseModel, Field
 
-from shared.agents import get_agent_client
-from shared.llm_utils import get_image_data_urls
+from shared.agents import close_clients, get_agent_client
+from shared.async_utils import gather_until, merge_streams
+from shared.batch import BatchCheckpoint, list_documents, run_batch
+from shared.llm_utils import EXTRACTION_MODE, LLMInput, PayloadBudget, get_llm_inputs
+from shared.materiality_models import FINANCIAL_METRICS
+from shared.page_batching import estimate_page_tokens, plan_page_batches, sort_batches_by_rank
+from shared.page_relevance import METRIC_WEIGHT, rank_pages, select_relevant_pages
+from shared.raster_cache import RasterCache
+from shared.rasterize import ImageOptions
+from shared.rate_limit import AdaptiveRateLimiter, RateLimitMiddleware
+from shared.reconcile import (
+    duplicate_key,
+    extract_yoy_pct,
+    group_duplicates,
+    match_metric,
+    normalize_text,
+    unique_by,
+)
+from shared.response_cache import ResponseCache, ResponseCacheMiddleware
+from shared.stream_parsing import aiter_array_items
+from shared.text_layer import extract_page_texts
+from shared.tracing import Tracer, TracingMiddleware
 
 # Configure logging to print to terminal
 logging.basicConfig(
@@ -26,7 +47,27 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Extraction params
-PAGES_PER_CALL = 2
+# Pages are packed into as few calls as fit these budgets. Fewer pages per call keeps the
+# model focused, more pages per call gives it more context.
+MAX_PAGE_TOKENS_PER_CALL = 8_000
+MAX_PAGES_PER_CALL = 6
+# Stop extracting a report once every target metric has been found
+EARLY_EXIT = True
+# Calls of a report running at a time with early exit. The next call is only sent while some
+# metrics are still missing, so fewer calls in flight waste fewer tokens once all are found,
+# and more calls in flight extract a report faster.
+EARLY_EXIT_MAX_IN_FLIGHT = 4
+# Handle each material change as soon as it is generated, instead of waiting for whole responses
+STREAM_RESPONSES = True
+# gpt-4.1 scales images down to fit in 2048x2048 and then to 768px on the short side, so
+# pages rendered bigger than that only inflate the request
+IMAGE_OPTIONS = ImageOptions(max_pixels=2048 * 768, image_format="JPEG", quality=85)
+# Send the text layer of each page and only rasterize the pages where it is not enough
+LLM_INPUT_MODE: EXTRACTION_MODE = "hybrid"
+# Only the best ranked pages that mention at least one target metric are sent to the model.
+# Tune with `python -m shared.page_relevance` on reports with known pages.
+RELEVANT_PAGES_TOP_K = 12
+MIN_PAGE_RELEVANCE_SCORE = METRIC_WEIGHT
 TEMPLATE_ENV = Environment(loader=FileSystemLoader(Path(__file__).parent / "prompts"))
 SYSTEM_PROMPT_TEMPLATE: Template = TEMPLATE_ENV.get_template("system_prompt.jinja2")
 USER_PROMPT_TEMPLATE: Template = TEMPLATE_ENV.get_template("user_prompt.jinja2")
@@ -37,13 +78,31 @@ SOURCE_DATA_PATH = Path("data/mock/Tesco AR report extracted.pdf")
 EXTRACTED_DATASET_DIR = Path("data/mock_eval_dataset")
 PARSED_IMAGES_DIR = EXTRACTED_DATASET_DIR / "parsed_images"
 DATA_OUTPUT_DIR = EXTRACTED_DATASET_DIR / "extracted_data"
-
-LLM_EXTRACTION_SEMAPHORE = asyncio.Semaphore(10)
+RASTER_CACHE_DIR = Path("data/.cache/rasterized_pages")
+# Responses are reused across runs, set LLM_RESPONSE_CACHE_MODE to change how
+RESPONSE_CACHE_PATH = Path("data/.cache/llm_responses.sqlite")
+LLM_TRACE_PATH = EXTRACTED_DATASET_DIR / "llm_trace.jsonl"
+
+# Page images are kept on disk and only encoded while their request is sent, within this cap
+LLM_PAYLOAD_MAX_BYTES = 256 * 1024**2
+
+# Quota of each model deployment. Concurrency adapts to throttling within these budgets.
+LLM_DEPLOYMENT_QUOTAS: dict[str | None, dict[str, float]] = {
+    "gpt-4.1": {"requests_per_minute": 250, "tokens_per_minute": 250_000},
+}
+
+
+def create_rate_limiter(model_deployment_name: str | None) -> AdaptiveRateLimiter:
+    quota = LLM_DEPLOYMENT_QUOTAS.get(model_deployment_name, {})
+    return AdaptiveRateLimiter(
+        requests_per_minute=quota.get("requests_per_minute"),
+        tokens_per_minute=quota.get("tokens_per_minute"),
+        initial_concurrency=10,
+    )
 
 
-@dataclass
-class LLMInput:
-    image_data_url: str
+# Each deployment is sent requests through a limiter of its own
+LLM_RATE_LIMIT = RateLimitMiddleware(create_rate_limiter)
 
 
 class Reference(BaseModel):
@@ -108,64 +167,239 @@ async def call_agent(
     agent: ChatAgent,
     messages: ChatMessage,
 ) -> MaterialChangesReport:
-    await LLM_EXTRACTION_SEMAPHORE.acquire()
+    # Concurrency and retries are handled by the rate limiting middleware of the agent client
+    agent_run_response = await agent.run(
+        messages=messages,
+        response_format=MaterialChangesReport,
+        temperature=0.0,
+    )
 
-    try:
-        agent_run_response = await agent.run(
-            messages=messages,
-            response_format=MaterialChangesReport,
-            temperature=0.0,
-        )
+    output = agent_run_response.value
 
-        output = agent_run_response.value
+    if not isinstance(output, MaterialChangesReport):
+        raise ValueError("Agent did not return a MaterialChangesReport")
 
-        if not isinstance(output, MaterialChangesReport):
-            raise ValueError("Agent did not return a MaterialChangesReport")
+    return output
 
-        return output
-    finally:
-        LLM_EXTRACTION_SEMAPHORE.release()
+
+async def stream_agent(
+    agent: ChatAgent,
+    messages: ChatMessage,
+) -> AsyncIterator[MaterialChange]:
+    """Yields each material change of the response as soon as it is fully generated"""
+    updates = agent.run_stream(
+        messages=messages,
+        response_format=MaterialChangesReport,
+        temperature=0.0,
+    )
+
+    async for material_change in aiter_array_items(
+        (update.text async for update in updates), MaterialChange, "material_changes"
+    ):
+        yield material_change
 
 
 async def extract_eval_data(
     agent: ChatAgent,
     llm_input_by_page: dict[str, LLMInput],
+    file_name: str,
+    early_exit: bool = False,
+    stream: bool = False,
+    payload_budget: PayloadBudget | None = None,
 ) -> MaterialChangesReport:
-    """Parses Markdown content into a TallySheet object."""
+    """Parses Markdown content into a TallySheet object.
+
+    Pages are batched in page order. With `early_exit`, the batches of the pages listed first in
+    `llm_input_by_page` (most relevant first) are extracted first, a few at a time, and no more
+    calls are sent once every target metric has been found.
+
+    With `stream`, material changes are checked as soon as they are generated, so that early
+    exit also stops the calls still generating.
+
+    `payload_budget` caps the page images in memory across the documents extracted at the same
+    time. Defaults to a budget of `LLM_PAYLOAD_MAX_BYTES` for this document only.
+    """
+    if payload_budget is None:
+        payload_budget = PayloadBudget(max_bytes=LLM_PAYLOAD_MAX_BYTES)
+
+    @asynccontextmanager
+    async def prepare_messages(page_numbers_to_extract: list[str]) -> AsyncIterator[ChatMessage]:
+        llm_inputs = [llm_input_by_page[page_num] for page_num in page_numbers_to_extract]
+
+        # Page images are only loaded in memory while their request is prepared and sent
+        payload_bytes = sum(llm_input.payload_bytes for llm_input in llm_inputs)
+        async with payload_budget.reserve(payload_bytes):
+            contents: list[TextContent | DataContent] = [
+                TextContent(text=USER_PROMPT_TEMPLATE.render(file_name=file_name))
+            ]
+
+            for page_num, llm_input in zip(page_numbers_to_extract, llm_inputs, strict=True):
+                if llm_input.text is not None:
+                    contents.append(TextContent(text=f"Page {page_num}:\n{llm_input.text}"))
+                if (image_data_url := await llm_input.get_image_data_url()) is not None:
+                    contents.append(DataContent(uri=image_data_url))
+
+            yield ChatMessage(role=Role.USER, contents=contents)
+
+    async def extract_pages(page_numbers_to_extract: list[str]) -> MaterialChangesReport:
+        async with prepare_messages(page_numbers_to_extract) as messages:
+            return await call_agent(
+                agent,
+                messages,
+            )
 
-    tasks: list[CoroutineType[Any, Any, MaterialChangesReport]] = []
+    async def stream_pages(page_numbers_to_extract: list[str]) -> AsyncIterator[MaterialChange]:
+        async with prepare_messages(page_numbers_to_extract) as messages:
+            async for material_change in stream_agent(agent, messages):
+                yield material_change
+
+    # Reads the image headers of the pages, which are on disk for lazy inputs
+    page_tokens = await asyncio.to_thread(
+        lambda: {
+            page_num: estimate_page_tokens(llm_input_by_page[page_num])
+            for page_num in sorted(llm_input_by_page, key=int)
+        }
+    )
+    # Batches hold consecutive pages, so that tables split across pages are seen whole
+    page_batches = plan_page_batches(
+        page_tokens,
+        max_tokens_per_call=MAX_PAGE_TOKENS_PER_CALL,
+        max_pages_per_call=MAX_PAGES_PER_CALL,
+    )
+    if early_exit:
+        page_batches = sort_batches_by_rank(page_batches, list(llm_input_by_page))
+    logger.info(f"Extracting {len(page_tokens)} pages of {file_name} in {len(page_batches)} calls")
+
+    found_metrics: set[str] = set()
+
+    def all_metrics_found(material_changes: Iterable[MaterialChange]) -> bool:
+        for material_change in material_changes:
+            metric = match_metric(material_change.material_change)
+            # Only count the changes with a value and some evidence for it
+            if (
+                metric is not None
+                and extract_yoy_pct(material_change.material_change) is not None
+                and any(reason.suporting_text for reason in material_change.reasons_for_change)
+            ):
+                found_metrics.add(metric)
+        return found_metrics.issuperset(FINANCIAL_METRICS)
+
+    # Batches whose call was sent, to report what an early exit saved
+    started_batches: set[int] = set()
+
+    def log_early_exit(n_cancelled: int) -> None:
+        # Calls cancelled in flight were likely sent already, only the others save tokens
+        unsent_batches = [
+            batch
+            for batch_index, batch in enumerate(page_batches)
+            if batch_index not in started_batches
+        ]
+        if unsent_batches or n_cancelled:
+            saved_tokens = sum(page_tokens[page] for batch in unsent_batches for page in batch)
+            logger.info(
+                f"All target metrics found in {file_name}: {len(unsent_batches)} of "
+                f"{len(page_batches)} calls not sent, about {saved_tokens} input tokens saved, "
+                f"{n_cancelled} calls cancelled in flight"
+            )
 
-    available_pages = list(llm_input_by_page.keys())
+    # Combine the results from all the pages
+    all_material_changes: list[MaterialChange] = []
 
-    for page_numbers_to_extract in itertools.batched(available_pages, PAGES_PER_CALL):
-        image_data_urls = [
-            llm_input_by_page[page_num].image_data_url for page_num in page_numbers_to_extract
-        ]
+    if stream:
+        streamed_material_changes: list[tuple[int, MaterialChange]] = []
+        finished_batches: set[int] = set()
+
+        async def stream_batch(batch_index: int) -> AsyncIterator[MaterialChange]:
+            started_batches.add(batch_index)
+            async for material_change in stream_pages(page_batches[batch_index]):
+                yield material_change
+            finished_batches.add(batch_index)
+
+        # Closing the merged stream cancels the calls still generating. With early exit, the
+        # next call is only sent while some metrics are still missing.
+        async with aclosing(
+            merge_streams(
+                [stream_batch(batch_index) for batch_index in range(len(page_batches))],
+                max_in_flight=EARLY_EXIT_MAX_IN_FLIGHT if early_exit else None,
+            )
+        ) as material_changes:
+            async for batch_index, material_change in material_changes:
+                streamed_material_changes.append((batch_index, material_change))
+                if early_exit and all_metrics_found([material_change]):
+                    break
 
-        messages = ChatMessage(
-            role=Role.USER,
-            contents=[
-                TextContent(text=USER_PROMPT_TEMPLATE.render(file_name=SOURCE_DATA_PATH.stem)),
-                *[DataContent(uri=image_data_uri) for image_data_uri in image_data_urls],
-            ],
-        )
+        if early_exit:
+            log_early_exit(n_cancelled=len(started_batches - finished_batches))
 
-        tasks.append(
-            call_agent(
-                agent,
-                messages,
+        # Same order as without streaming, whatever the order the calls finished in
+        streamed_material_changes.sort(key=lambda streamed: streamed[0])
+        all_material_changes = [material_change for _, material_change in streamed_material_changes]
+
+    elif early_exit:
+
+        async def extract_batch(batch_index: int) -> MaterialChangesReport:
+            started_batches.add(batch_index)
+            return await extract_pages(page_batches[batch_index])
+
+        tasks: list[CoroutineType[Any, Any, MaterialChangesReport]] = [
+            extract_batch(batch_index) for batch_index in range(len(page_batches))
+        ]
+        results = await gather_until(
+            tasks,
+            lambda report: all_metrics_found(report.material_changes),
+            max_in_flight=EARLY_EXIT_MAX_IN_FLIGHT,
+        )
+        material_changes_reports = [report for report in results if report is not None]
+        log_early_exit(
+            n_cancelled=sum(
+                report is None and batch_index in started_batches
+                for batch_index, report in enumerate(results)
             )
         )
 
-    material_changes_reports: list[MaterialChangesReport] = await asyncio.gather(*tasks)
+        for extracted_material_changes_report in material_changes_reports:
+            all_material_changes.extend(extracted_material_changes_report.material_changes)
 
-    # Combine the results from all the pages
-    all_material_changes: list[MaterialChange] = []
+    else:
+        material_changes_reports = await asyncio.gather(
+            *(extract_pages(page_numbers_to_extract) for page_numbers_to_extract in page_batches)
+        )
+
+        for extracted_material_changes_report in material_changes_reports:
+            all_material_changes.extend(extracted_material_changes_report.material_changes)
+
+    return MaterialChangesReport(material_changes=reconcile_material_changes(all_material_changes))
+
+
+def reconcile_material_changes(material_changes: list[MaterialChange]) -> list[MaterialChange]:
+    """Merges the changes of the same metric found in several page batches into one, with the
+    reasons of all of them"""
+    reconciled: list[MaterialChange] = []
 
-    for extracted_material_changes_report in material_changes_reports:
-        all_material_changes.extend(extracted_material_changes_report.material_changes)
+    for duplicates in group_duplicates(
+        material_changes, lambda material_change: duplicate_key(material_change.material_change)
+    ):
+        # Keep the description with the value most batches agree on
+        values = [extract_yoy_pct(duplicate.material_change) for duplicate in duplicates]
+        most_common_value = Counter(values).most_common(1)[0][0]
+        kept = duplicates[values.index(most_common_value)]
 
-    return MaterialChangesReport(material_changes=all_material_changes)
+        reasons = unique_by(
+            (reason for duplicate in duplicates for reason in duplicate.reasons_for_change),
+            lambda reason: (
+                normalize_text(reason.reason),
+                reason.reference.file_name,
+                reason.reference.page_number,
+            ),
+        )
+        reconciled.append(
+            MaterialChange(material_change=kept.material_change, reasons_for_change=reasons)
+        )
+
+    if len(reconciled) < len(material_changes):
+        logger.info(f"Merged {len(material_changes)} material changes into {len(reconciled)}")
+
+    return reconciled
 
 
 async def gather_and_cache_llm_input(
@@ -174,16 +408,31 @@ async def gather_and_cache_llm_input(
 ) -> dict[str, LLMInput]:
     """Extracts text and images from the PDF and prepares the input for the LLM extraction"""
 
-    # Convert the PDF to images
-    image_data_url_by_page = await get_image_data_urls(pdf_input_path, parsed_image_dir)
-
-    # Gather all inputs to the LLM
-    llm_input_by_page = {
-        page_num: LLMInput(
-            image_data_url=image_data_url_by_page[page_num],
-        )
-        for page_num in image_data_url_by_page.keys()
-    }
+    # Skip the pages that are unlikely to report any of the target metrics
+    page_texts = await asyncio.to_thread(extract_page_texts, pdf_input_path)
+    ranked_pages = rank_pages(page_texts.values())
+    relevant_pages = select_relevant_pages(
+        ranked_pages,
+        top_k=RELEVANT_PAGES_TOP_K,
+        min_score=MIN_PAGE_RELEVANCE_SCORE,
+    )
+    logger.info(f"Keeping {len(relevant_pages)} relevant pages out of {len(page_texts)}")
+
+    # Pages rendered by previous runs are reused from the cache
+    llm_input_by_page = await get_llm_inputs(
+        pdf_input_path,
+        parsed_image_dir,
+        mode=LLM_INPUT_MODE,
+        cache=RasterCache(RASTER_CACHE_DIR),
+        image_options=IMAGE_OPTIONS,
+        # Most relevant pages first
+        page_texts={
+            page_score.page_number: page_texts[page_score.page_number]
+            for page_score in ranked_pages
+            if page_score.page_number in relevant_pages
+        },
+        lazy=True,
+    )
 
     return llm_input_by_page
 
@@ -198,6 +447,9 @@ def to_tabular_format(material_changes_report: MaterialChangesReport) -> pd.Data
             records.append(
                 {
                     "material_change": material_change.material_change,
+                    # Same columns as the agent responses evaluated by `shared.evaluate`
+                    "name": match_metric(material_change.material_change),
+                    "latest_yoy_pct": extract_yoy_pct(material_change.material_change),
                     "reason": reason.reason,
                     "supporting_text": reason.suporting_text,
                     "reference_file_name": reason.reference.file_name,
@@ -208,41 +460,152 @@ def to_tabular_format(material_changes_report: MaterialChangesReport) -> pd.Data
     return pd.DataFrame.from_records(records)
 
 
-async def main():
-    logger.info("Setting up")
-    PARSED_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-    DATA_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-    AGENT_CLIENT = get_agent_client(model_deployment_name="gpt-4.1")
-    EXTRACTION_AGENT = AGENT_CLIENT.create_agent(
-        instructions=SYSTEM_PROMPT_TEMPLATE.render(),
-        name="extraction",
-    )
-
-    logger.info("Gathering and caching LLM input")
+async def process_document(
+    agent: ChatAgent,
+    pdf_input_path: Path,
+    output_dir: Path,
+    parsed_image_dir: Path = PARSED_IMAGES_DIR,
+    payload_budget: PayloadBudget | None = None,
+) -> dict[str, Any]:
+    """Runs the whole extraction of one PDF and saves its output as JSON and CSV"""
+    logger.info(f"Gathering and caching LLM input of {pdf_input_path.name}")
+    # Page images are named after the PDF, so documents with the same name need their own
+    # directory, or they would send each other's pages
+    parsed_image_dir.mkdir(parents=True, exist_ok=True)
     llm_input_by_page = await gather_and_cache_llm_input(
-        SOURCE_DATA_PATH,
-        PARSED_IMAGES_DIR,
+        pdf_input_path,
+        parsed_image_dir,
     )
 
-    logger.info("Extracting evaluation data")
+    logger.info(f"Extracting evaluation data of {pdf_input_path.name}")
     material_changes_report = await extract_eval_data(
-        agent=EXTRACTION_AGENT,
+        agent=agent,
         llm_input_by_page=llm_input_by_page,
+        file_name=pdf_input_path.stem,
+        early_exit=EARLY_EXIT,
+        stream=STREAM_RESPONSES,
+        payload_budget=payload_budget,
     )
 
-    logger.info("Saving output to JSON")
-    output_filepath = DATA_OUTPUT_DIR / "material_changes_report.json"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_filepath = output_dir / "material_changes_report.json"
     output_filepath.write_text(material_changes_report.model_dump_json(indent=2))
 
-    logger.info("Saving output to CSV")
-    tabular_output_filepath = DATA_OUTPUT_DIR / "material_changes_report.csv"
+    tabular_output_filepath = output_dir / "material_changes_report.csv"
     material_changes_table = to_tabular_format(material_changes_report)
-    material_changes_table.assign(id=SOURCE_DATA_PATH.stem).to_csv(
+    material_changes_table.assign(id=pdf_input_path.stem).to_csv(
         tabular_output_filepath, index=False
     )
 
-    shutil.copy(SOURCE_DATA_PATH, EXTRACTED_DATASET_DIR / SOURCE_DATA_PATH.name)
+    # Absolute, so that the checkpoint can be resumed from another working directory
+    return {"output": str(tabular_output_filepath.resolve())}
+
+
+async def run_batch_extraction(
+    agent: ChatAgent,
+    input_path: Path,
+    output_dir: Path,
+    max_in_flight: int,
+) -> None:
+    """Extracts every PDF of a directory or manifest, resuming from the last checkpoint, and
+    combines their outputs into one table"""
+    documents = list_documents(input_path)
+    checkpoint = BatchCheckpoint(output_dir / "checkpoint.jsonl")
+    logger.info(f"{len(documents)} documents to extract, {len(checkpoint.records)} already done")
+    # Shared by the documents in flight, created in the running event loop
+    payload_budget = PayloadBudget(max_bytes=LLM_PAYLOAD_MAX_BYTES)
+
+    summary = await run_batch(
+        documents,
+        lambda path, key: process_document(
+            agent,
+            path,
+            # Content hash in the name so that documents with the same name do not collide
+            output_dir / f"{path.stem}_{key[:8]}",
+            PARSED_IMAGES_DIR / f"{path.stem}_{key[:8]}",
+            payload_budget,
+        ),
+        checkpoint,
+        max_in_flight=max_in_flight,
+    )
+
+    if summary.failed:
+        logger.warning(f"Failed documents: {', '.join(str(path) for path in summary.failed)}")
+    # Only the documents of this batch, the checkpoint may hold those of earlier batches too
+    records = [summary.records[path] for path in documents if path in summary.records]
+    if not records:
+        return
+
+    combined_output_filepath = output_dir / "material_changes_report.csv"
+    pd.concat(
+        [pd.read_csv(record["output"]) for record in records],
+        ignore_index=True,
+    ).to_csv(combined_output_filepath, index=False)
+    logger.info(f"Combined output of {len(records)} documents saved")
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract material changes from annual reports")
+    parser.add_argument(
+        "--input",
+        type=Path,
+        help="Directory of PDFs or manifest file listing them. Defaults to the mock report.",
+        required=False,
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=Path,
+        default=DATA_OUTPUT_DIR,
+        help="Where to save the outputs and the batch checkpoint",
+    )
+    parser.add_argument(
+        "--max_in_flight",
+        type=int,
+        default=2,
+        help="Number of documents processed at a time, bounding the page images held in memory",
+    )
+    args = parser.parse_args()
+
+    logger.info("Setting up")
+    PARSED_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+    DATA_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    tracer = Tracer(LLM_TRACE_PATH)
+    response_cache = ResponseCache(RESPONSE_CACHE_PATH)
+    AGENT_CLIENT = get_agent_client(
+        model_deployment_name="gpt-4.1",
+        # Traced calls include cache hits. Cached responses do not wait for the rate limiter.
+        middleware=[
+            TracingMiddleware(tracer),
+            ResponseCacheMiddleware(response_cache),
+            LLM_RATE_LIMIT,
+        ],
+    )
+    EXTRACTION_AGENT = AGENT_CLIENT.create_agent(
+        instructions=SYSTEM_PROMPT_TEMPLATE.render(),
+        name="extraction",
+    )
+
+    try:
+        if args.input is not None:
+            await run_batch_extraction(
+                EXTRACTION_AGENT,
+                args.input,
+                args.output_dir,
+                args.max_in_flight,
+            )
+        else:
+            await process_document(EXTRACTION_AGENT, SOURCE_DATA_PATH, args.output_dir)
+            shutil.copy(SOURCE_DATA_PATH, EXTRACTED_DATASET_DIR / SOURCE_DATA_PATH.name)
+    finally:
+        # Also reported and closed when the extraction fails, to see how far it went
+        tracer.log_metrics()
+        for model, limiter in LLM_RATE_LIMIT.limiters.items():
+            logger.info(f"Rate limiter of {model}: {limiter.metrics()}")
+        await close_clients()
+        response_cache.close()
 
 
 if __name__ == "__main__":
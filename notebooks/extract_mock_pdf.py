@@ -1,6 +1,6 @@
 from pathlib import Path
 
-import pymupdf
+from shared.pdf_subset import extract_pdf_pages
 
 ORIGINAL_PDF_PATH = Path("data/mock/Tesco AR 25.pdf")
 
@@ -17,19 +17,6 @@ pages = [
 
 EXTRACTED_PAGES_PATH = ORIGINAL_PDF_PATH.parent / "Tesco AR report extracted.pdf"
 
-# Open the source PDF
-doc = pymupdf.open(ORIGINAL_PDF_PATH)
-
-# Create a new PDF with selected pages
-new_doc = pymupdf.open()
-
-for page_num in pages:
-    page = doc[page_num - 1]  # pymupdf uses 0-based indexing
-    new_doc.insert_pdf(doc, from_page=page_num - 1, to_page=page_num - 1)
-
-# Save the new PDF
-new_doc.save(EXTRACTED_PAGES_PATH)
-
-# Close documents
-doc.close()
-new_doc.close()
+# Create a new PDF with the selected pages. To cut subsets out of many reports, use
+# `python -m shared.pdf_subset --manifest ...` instead.
+extract_pdf_pages(ORIGINAL_PDF_PATH, pages, EXTRACTED_PAGES_PATH)
@@ -1,14 +1,17 @@
 import asyncio
 from pathlib import Path
 
-from shared.agents import get_agent_client
+from shared.agents import close_clients, get_agent_client
 from shared.logging import azureml_logger
+from shared.tracing import Tracer, TracingMiddleware
 
 
 async def main():
     azureml_logger.log_metrics({"main_called": 1})
 
-    azure_ai_client = get_agent_client()
+    # Files in ./outputs are uploaded with the job
+    tracer = Tracer(Path("./outputs/llm_trace.jsonl"))
+    azure_ai_client = get_agent_client(middleware=[TracingMiddleware(tracer)])
 
     agent = azure_ai_client.create_agent(
         instructions=(
@@ -22,7 +25,11 @@ async def main():
         name="influencer",
     )
 
-    output = await agent.run("Baby eating pizza")
+    try:
+        output = await agent.run("Baby eating pizza")
+    finally:
+        tracer.log_metrics()
+        await close_clients()
     output_text = output.text
 
     out_filepath = Path("./outputs/agent_output.txt")
@@ -0,0 +1,63 @@
+"""Compares the single-pass evaluation engine with the per-metric pandas functions.
+
+Run with `python packages/shared/benchmarks/bench_evaluate.py --rows 10000 1000000 10000000`
+"""
+
+import argparse
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from shared.benchmark import best_of
+from shared.metrics import (
+    compute_extraction_accuracy,
+    compute_match_metrics,
+    compute_precision,
+    compute_recall,
+)
+
+
+def make_evaluation_table(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic evaluation table where about half of the extracted values are correct"""
+    rng = np.random.default_rng(seed)
+    expected = np.round(rng.normal(0, 20, n_rows), 1)
+    expected[rng.random(n_rows) < 0.3] = np.nan
+    extracted = np.where(rng.random(n_rows) < 0.5, expected, np.round(rng.normal(0, 20, n_rows), 1))
+    extracted[rng.random(n_rows) < 0.2] = np.nan
+
+    return pd.DataFrame({"expected_value": expected, "extracted_value": extracted})
+
+
+def per_metric(data: pd.DataFrame) -> None:
+    compute_precision(data)
+    compute_recall(data)
+    compute_extraction_accuracy(data)
+
+
+def single_pass(data: pd.DataFrame) -> None:
+    compute_match_metrics(data["expected_value"].to_numpy(), data["extracted_value"].to_numpy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation metrics")
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12}  {'pandas (s)':>10}  {'single pass (s)':>15}  {'speedup':>7}")
+    for n_rows in args.rows:
+        data = make_evaluation_table(n_rows)
+
+        pandas_seconds = best_of(partial(per_metric, data), args.repeat)
+        numpy_seconds = best_of(partial(single_pass, data), args.repeat)
+        print(
+            f"{n_rows:>12,}  {pandas_seconds:>10.4f}  {numpy_seconds:>15.4f}  "
+            f"{pandas_seconds / numpy_seconds:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
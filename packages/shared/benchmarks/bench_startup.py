@@ -0,0 +1,59 @@
+"""Measures the import time of `shared.agents` and the latency of the first and later
+`get_agent_client` calls, each import in a fresh interpreter.
+
+Run with `python packages/shared/benchmarks/bench_startup.py --repeat 5`
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter, so that no module is already imported
+STARTUP_SCRIPT = """
+import asyncio, time
+start = time.perf_counter()
+from shared.agents import close_clients, get_agent_client
+imported = time.perf_counter()
+
+async def main():
+    first_start = time.perf_counter()
+    get_agent_client("gpt-4.1")
+    first_end = time.perf_counter()
+    get_agent_client("gpt-4.1")
+    second_end = time.perf_counter()
+    await close_clients()
+    return first_end - first_start, second_end - first_end
+
+first_call, second_call = asyncio.run(main())
+print(imported - start, first_call, second_call)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the agent clients")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    env = {
+        "AZURE_AI_PROJECT_ENDPOINT": "https://example.services.ai.azure.com/api",
+        **os.environ,
+    }
+    timings = []
+    for _ in range(args.repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        timings.append([float(value) for value in output.split()])
+
+    for name, values in zip(("import (s)", "first call (s)", "second call (s)"), zip(*timings)):
+        print(f"{name:>16}  median {statistics.median(values):.4f}  min {min(values):.4f}")
+
+
+if __name__ == "__main__":
+    main()
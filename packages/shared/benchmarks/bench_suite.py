@@ -0,0 +1,265 @@
+"""Benchmarks the throughput of the rasterization, encoding, evaluation and extraction steps,
+saves the measurements as JSON and fails when a tracked one regressed compared to a baseline.
+
+Run with `bin/dev/bench`, or directly with
+`python packages/shared/benchmarks/bench_suite.py --output results.json --baseline baseline.json`
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from types import ModuleType
+
+import numpy as np
+import pandas as pd
+import pymupdf
+
+from shared.benchmark import Measurement, best_of, find_regressions, load_results, save_results
+from shared.evaluate import calculate_overall_metrics, create_evaluation_table
+from shared.llm_utils import (
+    LLMInput,
+    PayloadBudget,
+    extract_pages_as_images,
+    local_image_to_data_url,
+)
+from shared.mock_agents import MockAgentOptions, MockChatClient
+from shared.rasterize import ImageOptions
+from shared.rate_limit import AdaptiveRateLimiter, RateLimitMiddleware
+
+EXTRACTION_SCRIPT = (
+    Path(__file__).parents[3] / "notebooks/create_mock_eval_dataset/create_mock_eval_dataset.py"
+)
+
+CASES = ("rasterize", "data_url", "evaluation", "extraction")
+
+
+def make_report_pdf(path: Path, n_pages: int) -> Path:
+    """Synthetic annual report with a paragraph, a table and a chart on every page"""
+    doc = pymupdf.open()
+    for page_number in range(1, n_pages + 1):
+        page = doc.new_page()  # A4
+        page.insert_textbox(
+            pymupdf.Rect(50, 50, 545, 250),
+            f"Page {page_number}. Group sales increased by 4.1% to £68.2bn. " * 12,
+            fontsize=9,
+        )
+        for row in range(12):
+            y = 280 + row * 18
+            page.draw_line((50, y), (545, y))
+            for col, x in enumerate((55, 250, 350, 450)):
+                page.insert_text((x, y + 13), f"{row * 4 + col:,}.{page_number}", fontsize=8)
+        for bar in range(10):
+            height = 20 + (bar * 37 + page_number * 11) % 150
+            rect = pymupdf.Rect(60 + bar * 45, 700 - height, 90 + bar * 45, 700)
+            page.draw_rect(rect, color=(0, 0.3, 0.6), fill=(0.2, 0.5, 0.8))
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def bench_rasterize(
+    work_dir: Path, n_pages: int, dpis: list[int], max_workers: int | None, repeat: int
+) -> list[Measurement]:
+    pdf_path = make_report_pdf(work_dir / "report.pdf", n_pages)
+    measurements = []
+    runs = itertools.count()
+
+    for dpi in dpis:
+        image_options = ImageOptions(resolution=dpi)
+
+        def render(image_options: ImageOptions = image_options) -> None:
+            # A new directory each time, so that no run reuses the images of the previous one
+            output_dir = work_dir / f"pages_{next(runs)}"
+            output_dir.mkdir()
+            extract_pages_as_images(pdf_path, output_dir, max_workers, image_options=image_options)
+
+        seconds = best_of(render, repeat)
+        measurements.append(
+            Measurement(f"extract_pages_as_images_{dpi}dpi", n_pages / seconds, "pages/s")
+        )
+
+    return measurements
+
+
+def bench_data_url(work_dir: Path, image_mb: int, repeat: int) -> list[Measurement]:
+    image_path = work_dir / "image.png"
+    image_path.write_bytes(np.random.default_rng(0).bytes(image_mb * 1024**2))
+
+    seconds = best_of(lambda: local_image_to_data_url(image_path), repeat)
+    return [Measurement("local_image_to_data_url", image_mb / seconds, "MB/s")]
+
+
+def make_evaluation_inputs(n_rows: int, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Ground truth of `n_rows` metrics, 10 per company, and agent responses that miss some of
+    them, report others, and get about half of the values right"""
+    rng = np.random.default_rng(seed)
+    row_ids = np.arange(n_rows)
+    ground_truth = pd.DataFrame(
+        {
+            "id": pd.Series(row_ids // 10).astype(str),
+            "name": pd.Series(row_ids % 10).astype(str),
+            "latest_yoy_pct": np.round(rng.normal(0, 20, n_rows), 1),
+        }
+    )
+
+    responses = ground_truth.loc[rng.random(n_rows) < 0.8].copy()
+    wrong = rng.random(len(responses)) < 0.5
+    responses.loc[wrong, "latest_yoy_pct"] = np.round(rng.normal(0, 20, wrong.sum()), 1)
+    # A metric the ground truth does not have, for half of the companies
+    extra = (
+        ground_truth.loc[row_ids % 10 == 0].sample(frac=0.5, random_state=seed).assign(name="other")
+    )
+
+    return ground_truth, pd.concat([responses, extra], ignore_index=True)
+
+
+def bench_evaluation(rows: list[int], repeat: int) -> list[Measurement]:
+    measurements = []
+
+    for n_rows in rows:
+        ground_truth, responses = make_evaluation_inputs(n_rows)
+
+        def evaluate(ground_truth=ground_truth, responses=responses) -> None:
+            calculate_overall_metrics(create_evaluation_table(ground_truth, responses))
+
+        # Small tables are evaluated many times per timing, large ones take seconds per run
+        # and vary less
+        seconds = best_of(
+            evaluate,
+            repeat if n_rows < 1_000_000 else 1,
+            number=max(1, 100_000 // n_rows),
+        )
+        measurements.append(Measurement(f"evaluation_{n_rows}_rows", n_rows / seconds, "rows/s"))
+
+    return measurements
+
+
+def load_extraction_script() -> ModuleType:
+    spec = importlib.util.spec_from_file_location("create_mock_eval_dataset", EXTRACTION_SCRIPT)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # The script logs every call at INFO level
+    logging.getLogger().setLevel(logging.WARNING)
+    return module
+
+
+async def _time_extraction(
+    script: ModuleType, n_pages: int, n_documents: int, stream: bool
+) -> float:
+    # No simulated latency, so that only the time spent in the extraction loop is measured
+    client = MockChatClient(
+        MockAgentOptions(latency_median_seconds=0),
+        middleware=[RateLimitMiddleware(AdaptiveRateLimiter(initial_concurrency=64))],
+    )
+    agent = client.create_agent(instructions=script.SYSTEM_PROMPT_TEMPLATE.render())
+    # Shared by the documents, as in a batch extraction
+    payload_budget = PayloadBudget(max_bytes=script.LLM_PAYLOAD_MAX_BYTES)
+    page_text = "Group sales increased by 4.1% to £68.2bn, operating profit was £2.8bn. " * 25
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            script.extract_eval_data(
+                agent,
+                {str(page): LLMInput(text=page_text) for page in range(1, n_pages + 1)},
+                file_name=f"report_{document}",
+                stream=stream,
+                payload_budget=payload_budget,
+            )
+            for document in range(n_documents)
+        )
+    )
+    return time.perf_counter() - start
+
+
+def bench_extraction(n_pages: int, n_documents: int, repeat: int) -> list[Measurement]:
+    script = load_extraction_script()
+    measurements = []
+
+    for stream, name in ((False, "extraction"), (True, "extraction_streaming")):
+        seconds = min(
+            asyncio.run(_time_extraction(script, n_pages, n_documents, stream))
+            for _ in range(repeat)
+        )
+        measurements.append(Measurement(name, n_pages * n_documents / seconds, "pages/s"))
+
+    return measurements
+
+
+def run_benchmarks(args: argparse.Namespace) -> list[Measurement]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = Path(tmp_dir)
+        cases: dict[str, Callable[[], list[Measurement]]] = {
+            "rasterize": lambda: bench_rasterize(
+                work_dir, args.pages, args.dpis, args.max_workers, args.repeat
+            ),
+            "data_url": lambda: bench_data_url(work_dir, args.image_mb, args.repeat),
+            "evaluation": lambda: bench_evaluation(args.rows, args.repeat),
+            "extraction": lambda: bench_extraction(
+                args.extraction_pages, args.extraction_documents, args.repeat
+            ),
+        }
+
+        measurements = []
+        for case in args.cases:
+            for measurement in cases[case]():
+                print(f"{measurement.name:>40}  {measurement.value:>14,.1f} {measurement.unit}")
+                measurements.append(measurement)
+
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite with regression tracking")
+    parser.add_argument("--output", type=Path, help="Where to save the measurements as JSON")
+    parser.add_argument(
+        "--baseline", type=Path, help="Measurements to compare with, skipped if it does not exist"
+    )
+    parser.add_argument(
+        "--max_regression",
+        type=float,
+        default=0.2,
+        help="Largest relative slowdown of a tracked measurement before failing",
+    )
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the rasterized PDF")
+    parser.add_argument("--dpis", type=int, nargs="+", default=[72, 150, 300])
+    parser.add_argument("--max_workers", type=int, help="Rasterization processes")
+    parser.add_argument("--image_mb", type=int, default=16, help="Size of the encoded image")
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+    )
+    parser.add_argument("--extraction_pages", type=int, default=60)
+    parser.add_argument("--extraction_documents", type=int, default=16)
+    args = parser.parse_args()
+
+    measurements = run_benchmarks(args)
+
+    if args.output is not None:
+        save_results(args.output, measurements)
+        print(f"Measurements saved to {args.output}")
+
+    if args.baseline is None or not os.path.exists(args.baseline):
+        return
+
+    regressions = find_regressions(measurements, load_results(args.baseline), args.max_regression)
+    if regressions:
+        print(f"Regressions of more than {args.max_regression:.0%} vs {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regression of more than {args.max_regression:.0%} vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
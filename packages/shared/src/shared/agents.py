@@ -1,23 +1,104 @@
+import json
 import os
+from collections.abc import Sequence
+from functools import cache
+from typing import TYPE_CHECKING
 
-from agent_framework.azure import AzureAIAgentClient
-from azure.ai.projects import AIProjectClient
 from dotenv import load_dotenv
 
-from shared.config import ASYNC_CREDENTIAL, SYNC_CREDENTIAL
+from shared.config import get_async_credential, get_sync_credential
+
+if TYPE_CHECKING:
+    from agent_framework import ChatMiddleware
+    from agent_framework.azure import AzureAIAgentClient
+    from azure.ai.agents.aio import AgentsClient
+    from azure.ai.projects import AIProjectClient
+
+    from shared.mock_agents import MockChatClient
 
 load_dotenv()
 
+# Clients are pooled per process: one agents client (and its HTTP connection pool) per project
+# endpoint, and one agent client per deployment and middleware stack
+_AGENTS_CLIENTS: dict[str, "AgentsClient"] = {}
+_AGENT_CLIENTS: dict[
+    tuple[str, str, tuple["ChatMiddleware", ...]], "AzureAIAgentClient | MockChatClient"
+] = {}
+
+
+def _get_agents_client(project_endpoint: str) -> "AgentsClient":
+    if project_endpoint not in _AGENTS_CLIENTS:
+        from azure.ai.agents.aio import AgentsClient
+
+        _AGENTS_CLIENTS[project_endpoint] = AgentsClient(
+            endpoint=project_endpoint, credential=get_async_credential()
+        )
+    return _AGENTS_CLIENTS[project_endpoint]
+
+
+def get_agent_client(
+    model_deployment_name: str = "gpt-4.1-mini",
+    middleware: Sequence["ChatMiddleware"] | None = None,
+) -> "AzureAIAgentClient | MockChatClient":
+    """Agent client of the deployment, created on first use and shared by later calls with the
+    same deployment and middleware. Call `close_clients` before the event loop ends.
+
+    With `AGENT_BACKEND=mock`, returns an offline `MockChatClient` instead, configured by the
+    `MockAgentOptions` fields in the `MOCK_AGENT_OPTIONS` JSON object, e.g.
+    `MOCK_AGENT_OPTIONS='{"latency_median_seconds": 5, "throttle_rate": 0.1}'`.
+    """
+    if os.getenv("AGENT_BACKEND") == "mock":
+        key = ("mock", model_deployment_name, tuple(middleware or ()))
+        if key not in _AGENT_CLIENTS:
+            from shared.mock_agents import MockAgentOptions, MockChatClient
+
+            _AGENT_CLIENTS[key] = MockChatClient(
+                MockAgentOptions(**json.loads(os.getenv("MOCK_AGENT_OPTIONS", "{}"))),
+                model_id=model_deployment_name,
+                middleware=list(middleware) if middleware else None,
+            )
+        return _AGENT_CLIENTS[key]
+
+    from agent_framework.azure import AzureAIAgentClient
+
+    project_endpoint = os.environ["AZURE_AI_PROJECT_ENDPOINT"]
+    key = (project_endpoint, model_deployment_name, tuple(middleware or ()))
+
+    if key not in _AGENT_CLIENTS:
+        _AGENT_CLIENTS[key] = AzureAIAgentClient(
+            agents_client=_get_agents_client(project_endpoint),
+            model_deployment_name=model_deployment_name,
+            middleware=list(middleware) if middleware else None,
+        )
+    return _AGENT_CLIENTS[key]
+
+
+async def close_clients() -> None:
+    """Deletes the agents created by the pooled clients and closes their connections.
+
+    The async clients are bound to the event loop they were first used in, so this should be
+    awaited before that loop ends. Later calls to `get_agent_client` create new clients.
+    """
+    agent_clients = list(_AGENT_CLIENTS.values())
+    agents_clients = list(_AGENTS_CLIENTS.values())
+    _AGENT_CLIENTS.clear()
+    _AGENTS_CLIENTS.clear()
+
+    for agent_client in agent_clients:
+        await agent_client.close()
+    for agents_client in agents_clients:
+        await agents_client.close()
+
+    if get_async_credential.cache_info().currsize:
+        await get_async_credential().close()
+        get_async_credential.cache_clear()
 
-def get_agent_client(model_deployment_name: str = "gpt-4.1-mini") -> AzureAIAgentClient:
-    return AzureAIAgentClient(
-        async_credential=ASYNC_CREDENTIAL,
-        model_deployment_name=model_deployment_name,
-    )
 
+@cache
+def get_project_client() -> "AIProjectClient":
+    from azure.ai.projects import AIProjectClient
 
-def get_project_client() -> AIProjectClient:
     return AIProjectClient(
-        credential=SYNC_CREDENTIAL,
+        credential=get_sync_credential(),
         endpoint=os.environ["AZURE_AI_PROJECT_ENDPOINT"],
     )
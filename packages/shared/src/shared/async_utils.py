@@ -0,0 +1,108 @@
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterable, Awaitable, Callable, Sequence
+
+
+async def gather_until[T](
+    awaitables: Sequence[Awaitable[T]],
+    should_stop: Callable[[T], bool],
+    max_in_flight: int | None = None,
+) -> list[T | None]:
+    """Like `asyncio.gather`, but cancels the awaitables still running once `should_stop`
+    returns True for a result, and never starts the remaining ones.
+
+    `should_stop` is called on each result as soon as it is done, so it can keep track of what
+    was found so far. Awaitables listed first are started first.
+
+    :param max_in_flight: Most awaitables running at a time. The next one is only started once
+        another is done and `should_stop` has not returned True, so that little work is started
+        past the stop. Defaults to starting all of them at once.
+    :return: Results in the order of `awaitables`, None for the cancelled and never started ones.
+    """
+    window = len(awaitables) if max_in_flight is None else max(1, max_in_flight)
+    results: list[T | None] = [None] * len(awaitables)
+    index_of: dict[asyncio.Future[T], int] = {}
+    pending: set[asyncio.Future[T]] = set()
+    n_started = 0
+
+    def start_next() -> None:
+        nonlocal n_started
+        while n_started < len(awaitables) and len(pending) < window:
+            task = asyncio.ensure_future(awaitables[n_started])
+            index_of[task] = n_started
+            pending.add(task)
+            n_started += 1
+
+    try:
+        start_next()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            stop = False
+            for task in sorted(done, key=index_of.__getitem__):
+                results[index_of[task]] = task.result()
+                stop = should_stop(task.result()) or stop
+            if stop:
+                break
+            start_next()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        # Closes the coroutines never started, which would otherwise warn they were not awaited
+        for awaitable in awaitables[n_started:]:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+
+    return results
+
+
+async def merge_streams[T](
+    streams: Sequence[AsyncIterable[T]],
+    max_in_flight: int | None = None,
+) -> AsyncGenerator[tuple[int, T], None]:
+    """Items of several async iterables as soon as any of them yields one, with the index of
+    the iterable it came from.
+
+    Iterables listed first are started first. Breaking out of the loop, or an error in any of
+    them, cancels the ones still running and never starts the remaining ones.
+
+    :param max_in_flight: Most iterables consumed at a time, the next one is started once
+        another is exhausted. Defaults to starting all of them at once.
+    """
+    window = len(streams) if max_in_flight is None else max(1, max_in_flight)
+    queue: asyncio.Queue[tuple[int, T] | BaseException | None] = asyncio.Queue()
+    tasks: list[asyncio.Future[None]] = []
+
+    async def pump(index: int, stream: AsyncIterable[T]) -> None:
+        try:
+            async for item in stream:
+                await queue.put((index, item))
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(None)
+
+    def start_next() -> None:
+        index = len(tasks)
+        tasks.append(asyncio.ensure_future(pump(index, streams[index])))
+
+    try:
+        while len(tasks) < min(window, len(streams)):
+            start_next()
+        n_running = len(tasks)
+
+        while n_running:
+            message = await queue.get()
+            if message is None:
+                n_running -= 1
+                if len(tasks) < len(streams):
+                    start_next()
+                    n_running += 1
+            elif isinstance(message, BaseException):
+                raise message
+            else:
+                yield message
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
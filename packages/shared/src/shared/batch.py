@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import os
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from shared.raster_cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+def list_documents(source: Path, pattern: str = "*.pdf") -> list[Path]:
+    """Documents of a batch: the files matching `pattern` in a directory, or the paths listed in
+    a manifest file (one per line, relative to the manifest, `#` for comments)"""
+    if source.is_dir():
+        return sorted(source.rglob(pattern))
+
+    paths: list[Path] = []
+    for line in source.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            paths.append(source.parent / line)
+    return paths
+
+
+class BatchCheckpoint:
+    """Append-only JSON lines record of the documents completed by a batch run.
+
+    Documents are identified by the hash of their content, so a resumed run skips documents
+    that were already processed even if they moved, and redoes those that changed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.records: dict[str, dict[str, Any]] = {}
+
+        if not path.exists():
+            return
+
+        with open(path) as f:
+            lines = f.readlines()
+        for line in lines:
+            # The last line is incomplete if a run crashed while writing it
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self.records[record["key"]] = record
+
+        # Start the next record on its own line
+        if lines and not lines[-1].endswith("\n"):
+            with open(path, "a") as f:
+                f.write("\n")
+
+    def is_done(self, key: str) -> bool:
+        return key in self.records
+
+    def mark_done(self, key: str, **record: Any) -> None:
+        record = {"key": key, **record}
+        self.records[key] = record
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+@dataclass
+class BatchSummary:
+    completed: list[Path] = field(default_factory=list)
+    skipped: list[Path] = field(default_factory=list)
+    failed: list[Path] = field(default_factory=list)
+    # Checkpoint record of each completed or skipped document, so that the outputs of this batch
+    # can be told apart from those of other documents in the same checkpoint
+    records: dict[Path, dict[str, Any]] = field(default_factory=dict)
+
+
+async def run_batch(
+    documents: Iterable[Path],
+    process_document: Callable[[Path, str], Awaitable[dict[str, Any]]],
+    checkpoint: BatchCheckpoint,
+    max_in_flight: int = 2,
+) -> BatchSummary:
+    """Processes documents concurrently, with at most `max_in_flight` of them at a time.
+
+    `process_document` runs the whole pipeline of one document (e.g. rasterization, then LLM
+    extraction, then writing its output) and returns what to record in the checkpoint, such as
+    the path of its output. It is given the path and the content hash of the document, e.g. to
+    name its outputs so that documents with the same name do not collide.
+
+    Holding at most `max_in_flight` documents in memory bounds the memory used by page images,
+    while letting the preparation of a document overlap with the model calls of another. A
+    failed document is logged and left out of the checkpoint, so that the next run retries it.
+    """
+    summary = BatchSummary()
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def process(path: Path) -> None:
+        key = await asyncio.to_thread(file_sha256, path)
+        if checkpoint.is_done(key):
+            summary.skipped.append(path)
+            summary.records[path] = checkpoint.records[key]
+            return
+
+        async with in_flight:
+            logger.info(f"Processing {path}")
+            try:
+                record = await process_document(path, key)
+            except Exception:
+                logger.exception(f"Failed to process {path}")
+                summary.failed.append(path)
+                return
+
+        checkpoint.mark_done(key, path=str(path), **record)
+        summary.completed.append(path)
+        summary.records[path] = checkpoint.records[key]
+
+    await asyncio.gather(*(process(path) for path in documents))
+
+    logger.info(
+        f"Batch done: {len(summary.completed)} completed, {len(summary.skipped)} already done, "
+        f"{len(summary.failed)} failed"
+    )
+    return summary
@@ -0,0 +1,102 @@
+import json
+import platform
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class Measurement:
+    """Result of a benchmark case.
+
+    :param higher_is_better: Direction of an improvement, e.g. True for throughputs and False
+        for latencies.
+    :param tracked: Compared with the baseline. Untracked measurements are only reported.
+    """
+
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = True
+    tracked: bool = True
+
+
+@dataclass(frozen=True)
+class Regression:
+    measurement: Measurement
+    baseline_value: float
+
+    @property
+    def change(self) -> float:
+        """Relative change from the baseline, negative when worse"""
+        change = (self.measurement.value - self.baseline_value) / self.baseline_value
+        return change if self.measurement.higher_is_better else -change
+
+    def __str__(self) -> str:
+        return (
+            f"{self.measurement.name}: {self.measurement.value:.4g} {self.measurement.unit} "
+            f"vs {self.baseline_value:.4g} {self.measurement.unit} in the baseline "
+            f"({self.change:+.1%})"
+        )
+
+
+def best_of(fn: Callable[[], object], repeat: int, number: int = 1) -> float:
+    """Seconds per call of `fn`, from the shortest of `repeat` timings, which is the least
+    disturbed by other processes. Each timing runs `number` calls, so that calls much shorter
+    than the noise of a single timing can be measured."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def save_results(path: Path, measurements: Iterable[Measurement]) -> None:
+    """Saves measurements as JSON, with the machine they were measured on, as timings are only
+    comparable on the same machine"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    results = {
+        "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "machine": {
+            "node": platform.node(),
+            "processor": platform.processor() or platform.machine(),
+            "python": platform.python_version(),
+        },
+        "measurements": [asdict(measurement) for measurement in measurements],
+    }
+    path.write_text(json.dumps(results, indent=2) + "\n")
+
+
+def load_results(path: Path) -> dict[str, Measurement]:
+    """Measurements saved by `save_results`, by name"""
+    results = json.loads(path.read_text())
+    return {
+        measurement["name"]: Measurement(**measurement) for measurement in results["measurements"]
+    }
+
+
+def find_regressions(
+    measurements: Iterable[Measurement],
+    baseline: dict[str, Measurement],
+    max_regression: float,
+) -> list[Regression]:
+    """Tracked measurements worse than their baseline by more than `max_regression`, e.g. 0.2
+    for 20%. Measurements missing from the baseline are skipped."""
+    regressions: list[Regression] = []
+
+    for measurement in measurements:
+        baseline_measurement = baseline.get(measurement.name)
+        if not measurement.tracked or baseline_measurement is None:
+            continue
+        if baseline_measurement.value <= 0:
+            continue
+
+        regression = Regression(measurement, baseline_measurement.value)
+        if regression.change < -max_regression:
+            regressions.append(regression)
+
+    return regressions
@@ -1,5 +1,22 @@
-from azure.identity import DefaultAzureCredential
-from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+from functools import cache
+from typing import TYPE_CHECKING
 
-SYNC_CREDENTIAL = DefaultAzureCredential()
-ASYNC_CREDENTIAL = AsyncDefaultAzureCredential()
+if TYPE_CHECKING:
+    from azure.identity import DefaultAzureCredential
+    from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+
+
+# Credentials are created on first use rather than at import time, and shared by every client
+# of the process so that their access tokens are cached once.
+@cache
+def get_sync_credential() -> "DefaultAzureCredential":
+    from azure.identity import DefaultAzureCredential
+
+    return DefaultAzureCredential()
+
+
+@cache
+def get_async_credential() -> "AsyncDefaultAzureCredential":
+    from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+
+    return AsyncDefaultAzureCredential()
@@ -1,6 +1,7 @@
+import numpy as np
 import pandas as pd
 
-from shared.metrics import compute_precision, compute_recall
+from shared.metrics import compute_match_metrics
 
 
 def create_evaluation_table(
@@ -19,22 +20,126 @@ def create_evaluation_table(
     return evaluation_df
 
 
-def calculate_overall_metrics(evaluation_df: pd.DataFrame) -> dict[str, float]:
-    # Among the material changes identified, what is the % correct?
-    materiality_precision = compute_precision(
-        evaluation_df,
-        expected_value_col="latest_yoy_pct_ground_truth",
-        extracted_value_col="latest_yoy_pct_agent_response",
-    )
+def calculate_overall_metrics(
+    evaluation_df: pd.DataFrame,
+    yoy_pct_tolerance: float = 0.0,
+) -> dict[str, float]:
+    """Materiality metrics of an evaluation table, in a single pass over its columns.
 
-    # Among the material changes we expected, what is the % correct?
-    materiality_recall = compute_recall(
-        evaluation_df,
-        expected_value_col="latest_yoy_pct_ground_truth",
-        extracted_value_col="latest_yoy_pct_agent_response",
+    :param yoy_pct_tolerance: Largest absolute difference, in percentage points, between the
+        expected and extracted `latest_yoy_pct` to count as correct.
+    """
+    # Precision: among the material changes identified, what is the % correct?
+    # Recall: among the material changes we expected, what is the % correct?
+    metrics = compute_match_metrics(
+        evaluation_df["latest_yoy_pct_ground_truth"].to_numpy(dtype=np.float64, na_value=np.nan),
+        evaluation_df["latest_yoy_pct_agent_response"].to_numpy(dtype=np.float64, na_value=np.nan),
+        atol=yoy_pct_tolerance,
     )
 
-    return {
-        "materiality_precision": materiality_precision,
-        "materiality_recall": materiality_recall,
-    }
+    return {f"materiality_{name}": value for name, value in metrics.items()}
+
+
+def add_ratio_metrics(counts: pd.DataFrame) -> pd.DataFrame:
+    """Adds precision, recall and F1 to a table of `n_matches`, `n_extracted` and `n_expected`
+    counts. Counts can be summed across groups first, e.g. to combine companies."""
+    n_matches = counts["n_matches"].to_numpy(dtype=np.float64)
+    n_extracted = counts["n_extracted"].to_numpy(dtype=np.float64)
+    n_expected = counts["n_expected"].to_numpy(dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = n_matches / n_extracted
+        recall = n_matches / n_expected
+        f1 = 2 * n_matches / (n_extracted + n_expected)
+
+    return counts.assign(precision=precision, recall=recall, f1=f1)
+
+
+class GroundTruthIndex:
+    """Ground truth indexed by company and metric name, to evaluate many runs against it
+    without merging each of them with the ground truth.
+
+    Example:
+        ground_truth = GroundTruthIndex(ground_truth_df)
+        ground_truth.evaluate({"prompt_v1": v1_df, "prompt_v2": v2_df}, group_by=["run", "name"])
+    """
+
+    KEYS = ["id", "name"]
+
+    def __init__(self, ground_truth_df: pd.DataFrame, value_col: str = "latest_yoy_pct"):
+        self.keys = ground_truth_df[self.KEYS].reset_index(drop=True)
+        self.index = pd.MultiIndex.from_arrays([self.keys[col] for col in self.KEYS])
+        if self.index.has_duplicates:
+            raise ValueError("Ground truth has several rows for the same id and name")
+
+        self.values = ground_truth_df[value_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.value_col = value_col
+
+    def evaluate(
+        self,
+        agent_responses_by_run: dict[str, pd.DataFrame],
+        group_by: list[str] | None = None,
+        yoy_pct_tolerance: float = 0.0,
+    ) -> pd.DataFrame:
+        """Match counts, precision, recall and F1 of each group of responses, in one vectorized
+        pass over all the runs.
+
+        :param agent_responses_by_run: Agent responses of each run, with `id`, `name` and the
+            value column.
+        :param group_by: Any of "run", "id" and "name". Defaults to one row per run.
+        :param yoy_pct_tolerance: Largest absolute difference between the expected and
+            extracted values to count as correct.
+        """
+        group_by = ["run"] if group_by is None else list(group_by)
+        if not group_by or not set(group_by) <= {"run", *self.KEYS}:
+            raise ValueError(f"group_by must be a non empty subset of run, id and name: {group_by}")
+
+        runs = list(agent_responses_by_run)
+        responses = pd.concat(
+            [agent_responses_by_run[run].assign(run=run) for run in runs], ignore_index=True
+        )
+        if responses.duplicated(["run", *self.KEYS]).any():
+            raise ValueError("A run has several responses for the same id and name")
+
+        # Position of the ground truth of each response, -1 when there is none
+        positions = self.index.get_indexer(
+            pd.MultiIndex.from_arrays([responses[col] for col in self.KEYS])
+        )
+        found = positions >= 0
+        expected = np.full(len(positions), np.nan)
+        # Only indexed where found, as -1 would wrap around, or be out of bounds when empty
+        expected[found] = self.values[positions[found]]
+        extracted = responses[self.value_col].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        with np.errstate(invalid="ignore"):
+            is_match = np.abs(expected - extracted) <= yoy_pct_tolerance
+
+        # Counts are always computed per run, and summed across runs if not grouped by run
+        key_cols = [col for col in group_by if col != "run"]
+        response_counts: pd.DataFrame = (
+            responses[["run", *key_cols]]
+            .assign(n_matches=is_match, n_extracted=~np.isnan(extracted))
+            .groupby(["run", *key_cols])
+            .sum()
+        )  # type: ignore
+
+        # The expected counts only depend on the ground truth, so they are computed once and
+        # repeated for every run
+        ground_truth = self.keys.assign(n_expected=~np.isnan(self.values))
+        if key_cols:
+            expected_by_key: pd.DataFrame = ground_truth.groupby(key_cols)[["n_expected"]].sum()  # type: ignore
+            expected_counts = pd.concat([expected_by_key] * len(runs), keys=runs, names=["run"])
+        else:
+            expected_counts = pd.DataFrame(
+                {"n_expected": ground_truth["n_expected"].sum()}, index=pd.Index(runs, name="run")
+            )
+
+        counts: pd.DataFrame = (
+            response_counts.join(expected_counts, how="outer").fillna(0).astype(np.int64)
+        )
+        if "run" not in group_by:
+            counts = counts.groupby(level=key_cols).sum()  # type: ignore
+        elif key_cols:
+            counts = counts.reorder_levels(group_by)
+
+        return add_ratio_metrics(counts.sort_index())
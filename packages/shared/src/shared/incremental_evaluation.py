@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+from shared.evaluate import GroundTruthIndex, add_ratio_metrics
+from shared.raster_cache import file_sha256
+from shared.response_store import company_id_from_path, load_responses
+
+logger = logging.getLogger(__name__)
+
+COUNT_COLUMNS = ["n_matches", "n_extracted", "n_expected"]
+
+
+def _ground_truth_fingerprints(ground_truth_df: pd.DataFrame) -> dict[str, str]:
+    # Sum of the row hashes of each company, so that reordering its rows does not change it
+    rows = ground_truth_df[["id", "name", "latest_yoy_pct"]]
+    row_hashes = hash_pandas_object(rows, index=False)  # type: ignore
+    fingerprints: pd.Series = row_hashes.groupby(ground_truth_df["id"].to_numpy()).sum()  # type: ignore
+    return {str(company_id): f"{value:016x}" for company_id, value in fingerprints.items()}
+
+
+class EvaluationState:
+    """Per-company counts of the last evaluation, with the key of the inputs they came from"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.companies: dict[str, dict] = {}
+
+        if path.exists():
+            self.companies = json.loads(path.read_text())
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self.companies))
+        os.replace(tmp_path, self.path)
+
+
+def evaluate_incrementally(
+    ground_truth_df: pd.DataFrame,
+    response_paths: Iterable[Path],
+    state_path: Path,
+    yoy_pct_tolerance: float = 0.0,
+) -> pd.DataFrame:
+    """Per-company match counts, precision, recall and F1, only recomputing the companies whose
+    response file or ground truth changed since the last evaluation saved in `state_path`.
+
+    Companies are keyed by the hash of their response file, the fingerprint of their ground
+    truth rows and the tolerance. Response files are only hashed again when their size or
+    modification time changed. Sum the counts to get the overall metrics, see
+    `overall_metrics_from_counts`.
+
+    :param response_paths: `materiality_response_{id}.json` files, one per company.
+    """
+    state = EvaluationState(state_path)
+    ground_truth_fingerprints = _ground_truth_fingerprints(ground_truth_df)
+
+    paths_by_company = {str(company_id_from_path(path)): path for path in response_paths}
+    company_ids = set(paths_by_company) | set(ground_truth_fingerprints)
+
+    keys: dict[str, str] = {}
+    response_files: dict[str, dict] = {}
+    for company_id in company_ids:
+        response_hash = "no_response"
+
+        if (path := paths_by_company.get(company_id)) is not None:
+            # Only hash the files that were modified since the last evaluation
+            stat = path.stat()
+            response_file = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            previous = state.companies.get(company_id, {})
+            if previous.get("response_file", {}).get("stat") == response_file:
+                response_hash = previous["response_file"]["sha256"]
+            else:
+                response_hash = file_sha256(path)
+            response_files[company_id] = {"stat": response_file, "sha256": response_hash}
+
+        keys[company_id] = "/".join(
+            (
+                response_hash,
+                ground_truth_fingerprints.get(company_id, "no_ground_truth"),
+                str(yoy_pct_tolerance),
+            )
+        )
+
+    changed = [
+        company_id
+        for company_id in company_ids
+        if state.companies.get(company_id, {}).get("key") != keys[company_id]
+    ]
+    logger.info(f"Evaluating {len(changed)} changed companies out of {len(company_ids)}")
+
+    if changed:
+        changed_set = set(changed)
+        responses = load_responses(
+            path for company_id, path in paths_by_company.items() if company_id in changed_set
+        )
+        # Ids are compared as strings, as they are stored as JSON keys
+        ground_truth = GroundTruthIndex(
+            ground_truth_df.assign(id=ground_truth_df["id"].astype(str))
+        )
+        counts = ground_truth.evaluate(
+            {"current": responses.assign(id=responses["id"].astype(str))},
+            group_by=["id"],
+            yoy_pct_tolerance=yoy_pct_tolerance,
+        )
+
+        changed_counts = counts[COUNT_COLUMNS].reindex(changed, fill_value=0)
+        for company_id, company_counts in zip(changed, changed_counts.to_numpy()):
+            state.companies[company_id] = {
+                "key": keys[company_id],
+                **{col: int(count) for col, count in zip(COUNT_COLUMNS, company_counts)},
+            }
+
+    for company_id, response_file in response_files.items():
+        state.companies[company_id]["response_file"] = response_file
+
+    # Companies without responses nor ground truth anymore
+    for company_id in set(state.companies) - company_ids:
+        del state.companies[company_id]
+
+    state.save()
+
+    counts = pd.DataFrame(
+        [[company[col] for col in COUNT_COLUMNS] for company in state.companies.values()],
+        index=pd.Index(list(state.companies), name="id"),
+        columns=COUNT_COLUMNS,
+    )
+    return add_ratio_metrics(counts.astype(np.int64).sort_index())
+
+
+def overall_metrics_from_counts(counts: pd.DataFrame) -> dict[str, float]:
+    """Overall materiality precision, recall and F1 from per-company counts"""
+    totals = add_ratio_metrics(counts[COUNT_COLUMNS].sum().to_frame().T)
+    return {
+        f"materiality_{name}": float(totals[name].iloc[0]) for name in ("precision", "recall", "f1")
+    }
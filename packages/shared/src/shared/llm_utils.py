@@ -1,53 +1,459 @@
+import asyncio
 import base64
 import logging
+import math
+import os
+import shutil
+import threading
+from collections.abc import AsyncIterator, Callable, Generator, Iterable, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
 from mimetypes import guess_type
 from pathlib import Path
+from typing import Literal
 
-import pdfplumber
+from shared.raster_cache import CacheKey, RasterCache, file_sha256
+from shared.rasterize import (
+    DEFAULT_IMAGE_OPTIONS,
+    ImageOptions,
+    count_pages,
+    iter_encoded_pages,
+    iter_rendered_pages,
+    page_image_path,
+)
+from shared.text_layer import PageText, extract_page_texts
 
 logger = logging.getLogger(__name__)
 
+type EXTRACTION_MODE = Literal["image", "hybrid"]
 
-def extract_pages_as_images(pdf_path: Path, output_dir: Path) -> dict[str, Path]:
-    """Extract each page of a PDF as an image"""
 
-    image_paths: dict[str, Path] = {}
+@dataclass
+class LLMInput:
+    """What is sent to the model for a page: its image, its text layer, or both.
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            # Generate the output path for this page
-            image_path = output_dir / f"{pdf_path.stem}_page_{page.page_number}.png"
+    The image is either held as a data URL, or as a path to the encoded image file whose data
+    URL is only built when the page is about to be sent, see `get_image_data_url`.
+    """
 
-            # Save the image
-            page.to_image(resolution=500).save(image_path, format="PNG")
-            image_paths[str(page.page_number)] = image_path
+    image_data_url: str | None = None
+    text: str | None = None
+    image_path: Path | None = None
 
-    return image_paths
+    @property
+    def has_image(self) -> bool:
+        return self.image_data_url is not None or self.image_path is not None
 
+    @property
+    def payload_bytes(self) -> int:
+        """Bytes of text and data URL sent for the page, without materializing the data URL"""
+        payload_bytes = len(self.text.encode()) if self.text is not None else 0
+        if self.image_data_url is not None:
+            payload_bytes += len(self.image_data_url)
+        elif self.image_path is not None:
+            # Base64 encodes every 3 bytes as 4 characters
+            payload_bytes += len(_data_url_prefix(self.image_path))
+            payload_bytes += math.ceil(self.image_path.stat().st_size / 3) * 4
+        return payload_bytes
 
-def local_image_to_data_url(image_path: str | Path) -> str:
+    async def get_image_data_url(self) -> str | None:
+        """Data URL of the page image, read and encoded from its file if it is not held"""
+        if self.image_data_url is not None or self.image_path is None:
+            return self.image_data_url
+        return await asyncio.to_thread(local_image_to_data_url, self.image_path)
+
+
+class PayloadBudget:
+    """Caps the bytes of data URLs held in memory by the requests being prepared or sent.
+
+    A request larger than the whole budget is let through alone rather than blocked forever.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.resident_bytes = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, n_bytes: int):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.resident_bytes == 0 or self.resident_bytes + n_bytes <= self.max_bytes
+            )
+            self.resident_bytes += n_bytes
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.resident_bytes -= n_bytes
+                self._condition.notify_all()
+
+
+def _cached_page_numbers(
+    pdf_path: Path,
+    pdf_hash: str,
+    cache: RasterCache,
+    page_numbers: Iterable[int] | None = None,
+) -> list[int]:
+    if page_numbers is not None:
+        return list(page_numbers)
+
+    page_count = cache.get_page_count(pdf_hash)
+    if page_count is None:
+        page_count = count_pages(pdf_path)
+        cache.put_page_count(pdf_hash, page_count)
+
+    return list(range(1, page_count + 1))
+
+
+def _iter_cached_page_images(
+    pdf_path: Path,
+    pdf_hash: str,
+    page_numbers: list[int],
+    output_dir: Path,
+    cache: RasterCache,
+    image_options: ImageOptions,
+    max_workers: int | None = None,
+) -> Iterator[tuple[int, Path]]:
+    pages_to_render: list[int] = []
+
+    for page_number in page_numbers:
+        cached_image_path = cache.get_image(CacheKey(pdf_hash, page_number, image_options))
+        if cached_image_path is None:
+            pages_to_render.append(page_number)
+        else:
+            yield page_number, cached_image_path
+
+    logger.debug(f"Raster cache: {len(page_numbers) - len(pages_to_render)} hits")
+
+    if not pages_to_render:
+        return
+
+    for rendered_page in iter_rendered_pages(
+        pdf_path,
+        output_dir,
+        image_options,
+        max_workers=max_workers,
+        page_numbers=pages_to_render,
+    ):
+        cache.put_image(
+            CacheKey(pdf_hash, rendered_page.page_number, image_options),
+            rendered_page.path,
+        )
+        yield rendered_page.page_number, rendered_page.path
+
+
+def iter_page_images(
+    pdf_path: Path,
+    output_dir: Path,
+    max_workers: int | None = None,
+    cache: RasterCache | None = None,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+    page_numbers: Iterable[int] | None = None,
+) -> Iterator[tuple[int, Path]]:
+    """Yields `(page_number, image_path)` for the pages of a PDF as soon as they are available.
+
+    When a `cache` is given, cached pages are yielded first and only the remaining pages are
+    rendered (and added to the cache). Every page is rendered unless `page_numbers` is given.
+    """
+
+    if cache is None:
+        for rendered_page in iter_rendered_pages(
+            pdf_path,
+            output_dir,
+            image_options,
+            max_workers=max_workers,
+            page_numbers=page_numbers,
+        ):
+            yield rendered_page.page_number, rendered_page.path
+        return
+
+    pdf_hash = file_sha256(pdf_path)
+    yield from _iter_cached_page_images(
+        pdf_path,
+        pdf_hash,
+        _cached_page_numbers(pdf_path, pdf_hash, cache, page_numbers),
+        output_dir,
+        cache,
+        image_options,
+        max_workers=max_workers,
+    )
+
+
+def extract_pages_as_images(
+    pdf_path: Path,
+    output_dir: Path,
+    max_workers: int | None = None,
+    cache: RasterCache | None = None,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+) -> dict[str, Path]:
+    """Extract each page of a PDF as an image"""
+
+    image_paths = sorted(iter_page_images(pdf_path, output_dir, max_workers, cache, image_options))
+
+    return {str(page_number): image_path for page_number, image_path in image_paths}
+
+
+def _data_url_prefix(image_path: str | Path) -> str:
     mime_type, _ = guess_type(image_path)
     if mime_type is None:
         mime_type = "application/octet-stream"
 
+    return f"data:{mime_type};base64,"
+
+
+def local_image_to_data_url(image_path: str | Path) -> str:
     try:
         with open(image_path, "rb") as image_file:
             base64_encoded_data = base64.b64encode(image_file.read()).decode("utf-8")
 
-        return f"data:{mime_type};base64,{base64_encoded_data}"
+        return f"{_data_url_prefix(image_path)}{base64_encoded_data}"
 
     except FileNotFoundError:
         logger.error(f"Error: The file at {image_path} was not found.")
         raise
 
 
-async def get_image_data_urls(pdf_path: Path, output_dir: Path) -> dict[str, str]:
-    """Converts PDF to image(s) and returns the image data URLs for LLM input"""
+async def _iterate_in_thread[T](make_iterator: Callable[[], Iterator[T]]) -> AsyncIterator[T]:
+    """Runs a blocking iterator in a worker thread, yielding its items to the event loop"""
+    loop = asyncio.get_running_loop()
+    # Items are wrapped in a tuple, an exception is raised in the consumer, None is the end
+    queue: asyncio.Queue[tuple[T] | BaseException | None] = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce() -> None:
+        iterator = make_iterator()
+        try:
+            for item in iterator:
+                loop.call_soon_threadsafe(queue.put_nowait, (item,))
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+        finally:
+            # Stops the work in progress, e.g. pages still being rendered, if the consumer left
+            if isinstance(iterator, Generator):
+                iterator.close()
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while (message := await queue.get()) is not None:
+            if isinstance(message, BaseException):
+                raise message
+            yield message[0]
+    finally:
+        stop.set()
+        await asyncio.shield(producer)
 
-    image_paths = extract_pages_as_images(pdf_path, output_dir)
-    image_data_urls = {
-        page_num: local_image_to_data_url(image_path)
-        for page_num, image_path in image_paths.items()
+
+def _iter_page_data_urls(
+    pdf_path: Path,
+    output_dir: Path | None,
+    max_workers: int | None,
+    cache: RasterCache | None,
+    image_options: ImageOptions,
+    page_numbers: Iterable[int] | None,
+) -> Iterator[tuple[int, str]]:
+    pages_to_encode = list(page_numbers) if page_numbers is not None else None
+    pdf_hash = None
+
+    if cache is not None:
+        pdf_hash = file_sha256(pdf_path)
+        pages_to_encode = []
+
+        # Encoded pages are cached, so an unchanged PDF skips rendering and encoding
+        for page_number in _cached_page_numbers(pdf_path, pdf_hash, cache, page_numbers):
+            key = CacheKey(pdf_hash, page_number, image_options)
+            if (data_url := cache.get_data_url(key)) is None:
+                pages_to_encode.append(page_number)
+            else:
+                yield page_number, data_url
+
+        if not pages_to_encode:
+            return
+
+    for encoded_page in iter_encoded_pages(
+        pdf_path,
+        output_dir,
+        image_options,
+        max_workers=max_workers,
+        page_numbers=pages_to_encode,
+    ):
+        if cache is not None and pdf_hash is not None:
+            key = CacheKey(pdf_hash, encoded_page.page_number, image_options)
+            cache.put_data_url(key, encoded_page.data_url)
+        yield encoded_page.page_number, encoded_page.data_url
+
+
+async def aiter_image_data_urls(
+    pdf_path: Path,
+    output_dir: Path | None = None,
+    max_workers: int | None = None,
+    cache: RasterCache | None = None,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+    page_numbers: Iterable[int] | None = None,
+) -> AsyncIterator[tuple[int, str]]:
+    """Yields `(page_number, image_data_url)` for the pages of a PDF as soon as they are ready,
+    without blocking the event loop.
+
+    Pages are rendered and encoded in memory by worker processes, and the cache is read and
+    written from a worker thread, so model calls of other documents keep running meanwhile.
+    Cached pages come first, the others in completion order.
+
+    :param output_dir: Directory where the page images are also written, if any.
+    """
+    async for page_number, data_url in _iterate_in_thread(
+        lambda: _iter_page_data_urls(
+            pdf_path, output_dir, max_workers, cache, image_options, page_numbers
+        )
+    ):
+        yield page_number, data_url
+
+
+async def get_image_data_urls(
+    pdf_path: Path,
+    output_dir: Path | None = None,
+    max_workers: int | None = None,
+    cache: RasterCache | None = None,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+    page_numbers: Iterable[int] | None = None,
+) -> dict[str, str]:
+    """Converts PDF to image(s) and returns the image data URLs for LLM input, by page number.
+    See `aiter_image_data_urls` to use each page as soon as it is ready."""
+
+    image_data_urls: dict[int, str] = {}
+
+    async for page_number, data_url in aiter_image_data_urls(
+        pdf_path, output_dir, max_workers, cache, image_options, page_numbers
+    ):
+        image_data_urls[page_number] = data_url
+
+    if image_data_urls:
+        payload_bytes = sum(len(data_url) for data_url in image_data_urls.values())
+        logger.info(
+            f"Prepared {len(image_data_urls)} pages of {pdf_path.name}: "
+            f"{payload_bytes / len(image_data_urls) / 1024:.0f} KiB of data URL per page"
+        )
+
+    # Keep the page order callers rely on when batching pages
+    return {
+        str(page_number): image_data_urls[page_number] for page_number in sorted(image_data_urls)
     }
 
-    return image_data_urls
+
+def _pin_page_image(image_path: Path, pinned_path: Path) -> Path:
+    """Hard links a cached page image to `pinned_path`, so that the cache evicting it while its
+    request is still queued does not delete it. Copies it where hard links are not supported."""
+    if image_path == pinned_path:
+        return image_path
+
+    pinned_path.unlink(missing_ok=True)
+    try:
+        os.link(image_path, pinned_path)
+    except OSError:
+        shutil.copyfile(image_path, pinned_path)
+    return pinned_path
+
+
+async def _get_page_images(
+    pdf_path: Path,
+    output_dir: Path | None,
+    max_workers: int | None,
+    cache: RasterCache | None,
+    image_options: ImageOptions,
+    page_numbers: Iterable[int] | None,
+    lazy: bool,
+) -> dict[int, LLMInput]:
+    if not lazy:
+        image_data_urls = await get_image_data_urls(
+            pdf_path, output_dir, max_workers, cache, image_options, page_numbers
+        )
+        return {
+            int(page_number): LLMInput(image_data_url=image_data_url)
+            for page_number, image_data_url in image_data_urls.items()
+        }
+
+    if output_dir is None:
+        raise ValueError("Lazy page images need an output_dir to be rendered to")
+
+    def pinned_page_images() -> dict[int, Path]:
+        # Cache hits are paths in the cache, which are pinned to the output directory as the
+        # images are only read when their request is sent
+        return {
+            page_number: _pin_page_image(
+                image_path, page_image_path(pdf_path, output_dir, page_number, image_options)
+            )
+            for page_number, image_path in iter_page_images(
+                pdf_path, output_dir, max_workers, cache, image_options, page_numbers
+            )
+        }
+
+    image_paths = await asyncio.to_thread(pinned_page_images)
+    return {
+        page_number: LLMInput(image_path=image_path)
+        for page_number, image_path in image_paths.items()
+    }
+
+
+async def get_llm_inputs(
+    pdf_path: Path,
+    output_dir: Path | None,
+    mode: EXTRACTION_MODE = "image",
+    max_workers: int | None = None,
+    cache: RasterCache | None = None,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+    page_texts: dict[int, PageText] | None = None,
+    lazy: bool = False,
+) -> dict[str, LLMInput]:
+    """Prepares the LLM input of the pages of a PDF.
+
+    In "image" mode, every page is sent as an image. In "hybrid" mode, the text layer and
+    tables of every page are extracted, and only the pages whose text layer is not enough
+    (scans, charts, table-heavy pages) are rasterized as well.
+
+    `page_texts` is the text layer from `extract_page_texts` of the pages to prepare. When
+    given, only these pages are prepared, in its order, and their text layer is not extracted
+    again. Otherwise, pages are in page order.
+
+    With `lazy`, page images are kept as files in `output_dir` (or the cache) instead of data
+    URLs in memory, and are only encoded by `LLMInput.get_image_data_url` when sent.
+    """
+
+    if mode == "image":
+        images = await _get_page_images(
+            pdf_path,
+            output_dir,
+            max_workers,
+            cache,
+            image_options,
+            page_texts.keys() if page_texts is not None else None,
+            lazy,
+        )
+        # In the order of `page_texts`, e.g. most relevant pages first, as in "hybrid" mode
+        page_order = sorted(images) if page_texts is None else page_texts.keys()
+        return {str(page_number): images[page_number] for page_number in page_order}
+
+    if page_texts is None:
+        page_texts = await asyncio.to_thread(extract_page_texts, pdf_path, max_workers)
+
+    pages_to_rasterize = [
+        page_number for page_number, page_text in page_texts.items() if page_text.needs_image()
+    ]
+    logger.info(
+        f"Rasterizing {len(pages_to_rasterize)} of {len(page_texts)} pages of {pdf_path.name}"
+    )
+
+    images = await _get_page_images(
+        pdf_path, output_dir, max_workers, cache, image_options, pages_to_rasterize, lazy
+    )
+
+    return {
+        str(page_number): replace(
+            images.get(page_number, LLMInput()),
+            text=page_text.to_prompt_text() or None,
+        )
+        for page_number, page_text in page_texts.items()
+    }
@@ -1,31 +1,173 @@
+import atexit
+import json
+import logging
 import os
 import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from functools import cache
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Metrics are queued and written in batches from a background thread, at least this often
+FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "5"))
+# MLflow accepts at most 1000 metrics per batch
+MAX_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class MetricRecord:
+    name: str
+    value: float
+    timestamp_ms: int
+    step: int
+
+
+class MetricBuffer:
+    """Queues metrics and writes them in batches from a background thread.
+
+    A batch is written every `flush_interval_seconds`, or as soon as `max_batch_size` metrics
+    are queued. Metrics still queued are written on `flush`, `close` and interpreter exit.
+
+    :param write_batch: Writes a batch of metrics, in the order they were logged.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[list[MetricRecord]], None],
+        flush_interval_seconds: float = FLUSH_INTERVAL_SECONDS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ):
+        self.write_batch = write_batch
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_batch_size = max_batch_size
+
+        self._pending: list[MetricRecord] = []
+        self._condition = threading.Condition()
+        # Batches are written one at a time so that they stay in order
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="metric-buffer", daemon=True)
+        self._thread.start()
+
+    def add(self, records: list[MetricRecord]) -> None:
+        with self._condition:
+            if not self._closed:
+                self._pending.extend(records)
+                if len(self._pending) >= self.max_batch_size:
+                    self._condition.notify()
+                return
+
+        # Logged on exit after the buffer was closed
+        with self._write_lock:
+            self.write_batch(records)
+
+    def flush(self) -> None:
+        """Writes every metric queued so far"""
+        with self._write_lock:
+            with self._condition:
+                records, self._pending = self._pending, []
+
+            for start in range(0, len(records), self.max_batch_size):
+                try:
+                    self.write_batch(records[start : start + self.max_batch_size])
+                except Exception:
+                    # Losing metrics should not fail the job
+                    logger.exception("Failed to write a batch of metrics")
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.max_batch_size,
+                    timeout=self.flush_interval_seconds,
+                )
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self) -> None:
+        """Writes the metrics still queued and stops the background thread"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+def _records(metrics: dict[str, int | float], step: int | None) -> list[MetricRecord]:
+    timestamp_ms = int(time.time() * 1000)
+    return [
+        MetricRecord(name, float(value), timestamp_ms, step or 0) for name, value in metrics.items()
+    ]
+
 
 # "MLFLOW_TRACKING_URI" is set-up when running inside an Azure ML Job
 
 if tracking_uri := os.getenv("MLFLOW_TRACKING_URI", None):
     import mlflow
+    from mlflow.entities import Metric
+    from mlflow.tracking import MlflowClient
 
     mlflow.set_tracking_uri(tracking_uri)
+    _client = MlflowClient()
+
+    @cache
+    def _run_id() -> str:
+        # The active run is per thread, so it is looked up by the caller, not by the writer
+        return (mlflow.active_run() or mlflow.start_run()).info.run_id
+
+    def _write_metrics(records: list[MetricRecord]) -> None:
+        _client.log_batch(
+            _run_id(),
+            metrics=[
+                Metric(record.name, record.value, record.timestamp_ms, record.step)
+                for record in records
+            ],
+        )
 
     def set_tags(tags: dict[str, str]) -> None:
         mlflow.set_tags(tags)
 
-    def log_metrics(metrics: dict[str, int | float]) -> None:
-        mlflow.log_metrics(metrics)
+    def log_metrics(metrics: dict[str, int | float], step: int | None = None) -> None:
+        _run_id()
+        _buffer.add(_records(metrics, step))
 
     def log_artifact(local_path: str, artifact_path: str | None = None) -> None:
         mlflow.log_artifact(local_path, artifact_path)
 
 else:
+    # Set "METRICS_LOG_PATH" to also keep the metrics of local runs in a JSON lines file
+    _metrics_log_path = Path(path) if (path := os.getenv("METRICS_LOG_PATH")) else None
+
+    def _write_metrics(records: list[MetricRecord]) -> None:
+        sys.stderr.write("".join(f"metric:{record.name}={record.value}\n" for record in records))
+
+        if _metrics_log_path is not None:
+            _metrics_log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(_metrics_log_path, "a") as f:
+                f.writelines(json.dumps(asdict(record)) + "\n" for record in records)
 
     def set_tags(tags: dict[str, str]) -> None:
         for name, value in tags.items():
             print(f"tag:{name}={value}", file=sys.stderr)
 
-    def log_metrics(metrics: dict[str, int | float]) -> None:
-        for name, value in metrics.items():
-            print(f"metric:{name}={value}", file=sys.stderr)
+    def log_metrics(metrics: dict[str, int | float], step: int | None = None) -> None:
+        _buffer.add(_records(metrics, step))
 
     def log_artifact(local_path: str, artifact_path: str | None = None) -> None:
         print(f"artifact:{local_path} -> {artifact_path or '.'}", file=sys.stderr)
+
+
+_buffer = MetricBuffer(_write_metrics)
+atexit.register(_buffer.close)
+
+
+def flush_metrics() -> None:
+    """Writes the metrics logged so far without waiting for the next batch"""
+    _buffer.flush()
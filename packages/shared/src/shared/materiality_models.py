@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, get_args
 
 from pydantic import BaseModel, Field
 
@@ -12,6 +12,37 @@ type FINANCIAL_METRIC = Literal[
     "TFD/EBITDA (x)",
 ]
 
+FINANCIAL_METRICS: tuple[FINANCIAL_METRIC, ...] = get_args(FINANCIAL_METRIC.__value__)
+
+# How each financial metric is commonly worded in annual reports, lowercase
+METRIC_ALIASES: dict[str, tuple[str, ...]] = {
+    "Capital Expenditure": (
+        "capital expenditure",
+        "capex",
+        "capital investment",
+        "purchase of property, plant and equipment",
+    ),
+    "Change in Working Capital": (
+        "working capital",
+        "movement in working capital",
+    ),
+    "EBITDA": ("ebitda",),
+    "Net Profit": (
+        "net profit",
+        "net income",
+        "profit for the year",
+        "profit after tax",
+        "profit attributable",
+    ),
+    "TFD/EBITDA (x)": (
+        "tfd/ebitda",
+        "net debt/ebitda",
+        "net debt to ebitda",
+        "total financial debt",
+        "leverage ratio",
+    ),
+}
+
 
 class MaterialChange(BaseModel):
     name: FINANCIAL_METRIC = Field(
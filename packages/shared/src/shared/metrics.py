@@ -79,6 +79,66 @@ def compute_recall(
     return (filtered_data[expected_value_col] == filtered_data[extracted_value_col]).mean()  # type: ignore
 
 
+def compute_match_metrics(
+    expected: np.ndarray,
+    extracted: np.ndarray,
+    atol: float = 0.0,
+    rtol: float = 0.0,
+) -> dict[str, float]:
+    """
+    Computes precision, recall, extraction accuracy and F1 of numeric values in a single
+    vectorized pass, with the same definitions as `compute_precision`, `compute_recall` and
+    `compute_extraction_accuracy`. Missing values are NaN.
+
+    Values match when `|expected - extracted| <= atol + rtol * |expected|`, so the default
+    tolerances are an exact match.
+
+    Args:
+        expected (ndarray): Expected values, e.g. the ground truth column of the evaluation table.
+        extracted (ndarray): Extracted values, aligned with `expected`.
+        atol (float): Absolute tolerance of a match.
+        rtol (float): Relative tolerance of a match.
+    Returns:
+        dict[str, float]: `precision`, `recall`, `extraction_accuracy` and `f1`. Each is NaN when
+            there is nothing to compute it on.
+    """
+    expected = np.asarray(expected, dtype=np.float64)
+    extracted = np.asarray(extracted, dtype=np.float64)
+
+    is_expected = ~np.isnan(expected)
+    is_extracted = ~np.isnan(extracted)
+
+    # Comparisons with NaN are False, so only values present on both sides can match
+    with np.errstate(invalid="ignore"):
+        if atol or rtol:
+            is_match = np.abs(expected - extracted) <= atol + rtol * np.abs(expected)
+        else:
+            is_match = expected == extracted
+
+    n_rows = len(expected)
+    n_expected = np.count_nonzero(is_expected)
+    n_extracted = np.count_nonzero(is_extracted)
+    n_matches = np.count_nonzero(is_match)
+    # When both expected and extracted values are missing, we want them to be equal
+    n_both_missing = n_rows - np.count_nonzero(is_expected | is_extracted)
+
+    precision = n_matches / n_extracted if n_extracted else np.nan
+    recall = n_matches / n_expected if n_expected else np.nan
+    extraction_accuracy = (n_matches + n_both_missing) / n_rows if n_rows else np.nan
+    if precision + recall > 0:
+        f1 = 2 * precision * recall / (precision + recall)
+    else:
+        # Either nothing matched, or one of precision and recall is NaN
+        f1 = 0.0 if precision + recall == 0 else np.nan
+
+    return {
+        "precision": float(precision),
+        "recall": float(recall),
+        "extraction_accuracy": float(extraction_accuracy),
+        "f1": float(f1),
+    }
+
+
 def exact_match(expected_value: Any, extracted_value: Any) -> int:
     """
     Compares `expected_value` and `extracted_value` and returns 1 if they are equal, otherwise 0.
@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import random
+import types
+import typing
+from collections import Counter
+from collections.abc import AsyncIterable, MutableSequence
+from dataclasses import dataclass
+from typing import Any
+
+from agent_framework import (
+    BaseChatClient,
+    ChatMessage,
+    ChatOptions,
+    ChatResponse,
+    ChatResponseUpdate,
+    DataContent,
+    Role,
+    TextContent,
+    UsageContent,
+    UsageDetails,
+    use_chat_middleware,
+    use_function_invocation,
+)
+from pydantic import BaseModel
+
+from shared.rate_limit import CHARS_PER_TOKEN, IMAGE_TOKENS
+
+WORDS = (
+    "revenue operating profit margin growth sales cash flow group year increase decrease "
+    "retail market customers costs investment strategy performance adjusted statutory"
+).split()
+
+
+@dataclass(frozen=True)
+class MockAgentOptions:
+    """Behaviour of the `MockChatClient`.
+
+    :param latency_median_seconds: Median time to the first token of a response.
+    :param latency_sigma: Spread of the log-normal time to the first token. 0 makes it constant.
+    :param seconds_per_output_token: Generation time added per output token.
+    :param throttle_rate: Share of requests failing with a 429 status code.
+    :param error_rate: Share of requests failing with a 500 status code.
+    :param retry_after_seconds: Retry delay suggested by throttling errors.
+    :param min_list_items: Fewest items generated for the list fields of structured outputs.
+    :param max_list_items: Most items generated for the list fields of structured outputs.
+    :param words_per_text: Words generated for each string field, and for text responses.
+    :param seed: Seed of the generated latencies, failures and outputs. The same request gets
+        the same outcome on every run, whatever the order the requests are sent in.
+    """
+
+    latency_median_seconds: float = 2.0
+    latency_sigma: float = 0.5
+    seconds_per_output_token: float = 0.0
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    min_list_items: int = 1
+    max_list_items: int = 4
+    words_per_text: int = 12
+    seed: int = 0
+
+
+class MockServiceError(Exception):
+    """Simulated HTTP error, with the `status_code` read by `shared.rate_limit`"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def mock_value(annotation: Any, rng: random.Random, options: MockAgentOptions) -> Any:
+    """Random JSON value matching a type annotation of a pydantic model field"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {
+            name: mock_value(field.annotation, rng, options)
+            for name, field in annotation.model_fields.items()
+        }
+    if origin is typing.Literal:
+        return rng.choice(args)
+    if origin in (typing.Union, types.UnionType):
+        return mock_value(next(arg for arg in args if arg is not type(None)), rng, options)
+    if origin in (list, set, frozenset, tuple) or annotation in (list, set, frozenset, tuple):
+        item_type = args[0] if args else str
+        n_items = rng.randint(options.min_list_items, options.max_list_items)
+        return [mock_value(item_type, rng, options) for _ in range(n_items)]
+    if origin is dict or annotation is dict:
+        return {}
+    if annotation is bool:
+        return rng.random() < 0.5
+    if annotation is int:
+        return rng.randint(1, 300)
+    if annotation is float:
+        return round(rng.uniform(-50, 50), 1)
+    return " ".join(rng.choices(WORDS, k=options.words_per_text))
+
+
+def mock_response_text(
+    response_format: type[BaseModel] | None, rng: random.Random, options: MockAgentOptions
+) -> str:
+    """Text of a response, which validates into `response_format` if any"""
+    if response_format is None:
+        return mock_value(str, rng, options)
+
+    value = response_format.model_validate(mock_value(response_format, rng, options))
+    return value.model_dump_json()
+
+
+def _request_hash(messages: MutableSequence[ChatMessage], chat_options: ChatOptions) -> str:
+    digest = hashlib.sha256()
+    response_format = chat_options.response_format
+    digest.update(str(response_format.__name__ if response_format else None).encode())
+
+    for message in messages:
+        digest.update(str(message.role).encode())
+        for content in message.contents:
+            if isinstance(content, TextContent):
+                digest.update(content.text.encode())
+            elif isinstance(content, DataContent):
+                digest.update(content.uri.encode())
+
+    return digest.hexdigest()
+
+
+def _input_tokens(messages: MutableSequence[ChatMessage]) -> int:
+    chars = 0
+    n_images = 0
+
+    for message in messages:
+        for content in message.contents:
+            if isinstance(content, TextContent):
+                chars += len(content.text)
+            elif isinstance(content, DataContent):
+                n_images += 1
+
+    return chars // CHARS_PER_TOKEN + n_images * IMAGE_TOKENS
+
+
+@use_function_invocation
+@use_chat_middleware
+class MockChatClient(BaseChatClient):
+    """Offline stand-in for the Azure AI agent client, to load test the pipelines without a
+    model deployment.
+
+    Responses are generated after a simulated latency, validate into the `response_format` of
+    the request, and report token usage estimated like `shared.rate_limit` does. A share of
+    the requests fail with throttling or server errors. Supports the same middleware as
+    `get_agent_client`.
+
+    Example:
+        client = MockChatClient(MockAgentOptions(throttle_rate=0.1), middleware=[...])
+        agent = client.create_agent(instructions="...", name="extraction")
+    """
+
+    OTEL_PROVIDER_NAME = "mock"
+
+    def __init__(
+        self,
+        options: MockAgentOptions | None = None,
+        model_id: str = "mock",
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.options = options or MockAgentOptions()
+        self.model_id = model_id
+        self.n_requests = 0
+        self._attempts: Counter[str] = Counter()
+
+    async def close(self) -> None:
+        """Nothing to release, closed like the Azure AI agent clients by `close_clients`"""
+
+    def _request_rng(
+        self, messages: MutableSequence[ChatMessage], chat_options: ChatOptions
+    ) -> random.Random:
+        # Seeded by the request and its attempt number, so that retries can succeed
+        request_hash = _request_hash(messages, chat_options)
+        attempt = self._attempts[request_hash]
+        self._attempts[request_hash] += 1
+        return random.Random(f"{self.options.seed}:{request_hash}:{attempt}")
+
+    def _first_token_latency(self, rng: random.Random) -> float:
+        options = self.options
+        if options.latency_median_seconds <= 0:
+            return 0.0
+        return rng.lognormvariate(0, options.latency_sigma) * options.latency_median_seconds
+
+    def _raise_on_failure(self, rng: random.Random) -> None:
+        draw = rng.random()
+        if draw < self.options.throttle_rate:
+            raise MockServiceError(
+                f"Rate limit is exceeded. Try again in {self.options.retry_after_seconds} seconds.",
+                status_code=429,
+            )
+        if draw < self.options.throttle_rate + self.options.error_rate:
+            raise MockServiceError("Internal server error", status_code=500)
+
+    def _usage(self, messages: MutableSequence[ChatMessage], text: str) -> UsageDetails:
+        input_tokens = _input_tokens(messages)
+        output_tokens = max(len(text) // CHARS_PER_TOKEN, 1)
+        return UsageDetails(
+            input_token_count=input_tokens,
+            output_token_count=output_tokens,
+            total_token_count=input_tokens + output_tokens,
+        )
+
+    async def _inner_get_response(
+        self,
+        *,
+        messages: MutableSequence[ChatMessage],
+        chat_options: ChatOptions,
+        **kwargs: Any,
+    ) -> ChatResponse:
+        self.n_requests += 1
+        rng = self._request_rng(messages, chat_options)
+        await asyncio.sleep(self._first_token_latency(rng))
+        self._raise_on_failure(rng)
+
+        text = mock_response_text(chat_options.response_format, rng, self.options)
+        usage = self._usage(messages, text)
+        await asyncio.sleep((usage.output_token_count or 0) * self.options.seconds_per_output_token)
+
+        return ChatResponse(
+            messages=ChatMessage(role=Role.ASSISTANT, text=text),
+            model_id=chat_options.model_id or self.model_id,
+            usage_details=usage,
+            response_format=chat_options.response_format,
+        )
+
+    async def _inner_get_streaming_response(
+        self,
+        *,
+        messages: MutableSequence[ChatMessage],
+        chat_options: ChatOptions,
+        **kwargs: Any,
+    ) -> AsyncIterable[ChatResponseUpdate]:
+        self.n_requests += 1
+        rng = self._request_rng(messages, chat_options)
+        await asyncio.sleep(self._first_token_latency(rng))
+        self._raise_on_failure(rng)
+
+        text = mock_response_text(chat_options.response_format, rng, self.options)
+        chunk_chars = 16 * CHARS_PER_TOKEN
+        for start in range(0, len(text), chunk_chars):
+            await asyncio.sleep(16 * self.options.seconds_per_output_token)
+            yield ChatResponseUpdate(
+                role=Role.ASSISTANT,
+                text=text[start : start + chunk_chars],
+                model_id=chat_options.model_id or self.model_id,
+            )
+
+        yield ChatResponseUpdate(
+            role=Role.ASSISTANT,
+            contents=[UsageContent(details=self._usage(messages, text))],
+            model_id=chat_options.model_id or self.model_id,
+        )
@@ -0,0 +1,98 @@
+import base64
+import io
+import logging
+import math
+from collections.abc import Mapping, Sequence
+
+from PIL import Image
+
+from shared.llm_utils import LLMInput
+from shared.rate_limit import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# High detail images are scaled to fit in 2048x2048, then to 768px on their short side, and
+# cost a base amount plus a fixed amount per 512px tile
+MAX_IMAGE_SIDE = 2048
+SHORT_IMAGE_SIDE = 768
+TILE_SIZE = 512
+BASE_IMAGE_TOKENS = 85
+TOKENS_PER_TILE = 170
+
+
+def image_tokens(width: int, height: int) -> int:
+    """Input tokens of a high detail image of `width` x `height` pixels"""
+    scale = min(1.0, MAX_IMAGE_SIDE / max(width, height))
+    scale *= min(1.0, SHORT_IMAGE_SIDE / (min(width, height) * scale))
+    n_tiles = math.ceil(width * scale / TILE_SIZE) * math.ceil(height * scale / TILE_SIZE)
+    return BASE_IMAGE_TOKENS + TOKENS_PER_TILE * n_tiles
+
+
+def _image_size(llm_input: LLMInput) -> tuple[int, int] | None:
+    # Only the image header is read, the pixels are not decoded
+    if llm_input.image_path is not None:
+        with Image.open(llm_input.image_path) as image:
+            return image.size
+    if llm_input.image_data_url is not None:
+        _, encoded = llm_input.image_data_url.split(",", 1)
+        with Image.open(io.BytesIO(base64.b64decode(encoded))) as image:
+            return image.size
+    return None
+
+
+def estimate_page_tokens(llm_input: LLMInput) -> int:
+    """Input tokens of a page: its text layer and the tiles of its image"""
+    tokens = len(llm_input.text) // CHARS_PER_TOKEN if llm_input.text is not None else 0
+    if (image_size := _image_size(llm_input)) is not None:
+        tokens += image_tokens(*image_size)
+    return tokens
+
+
+def plan_page_batches(
+    page_tokens: Mapping[str, int],
+    max_tokens_per_call: int,
+    max_pages_per_call: int | None = None,
+) -> list[list[str]]:
+    """Packs pages into as few requests as possible within a token budget per request.
+
+    Pages keep their order and each request holds consecutive pages, so that a table or a
+    paragraph split across two pages is more likely to be seen whole. A page above the budget
+    on its own is sent alone.
+
+    :param page_tokens: Estimated input tokens of each page, in page order.
+    :param max_tokens_per_call: Input tokens budget of the pages of a request.
+    :param max_pages_per_call: Highest number of pages in a request, if any.
+    """
+    batches: list[list[str]] = []
+    batch: list[str] = []
+    batch_tokens = 0
+
+    for page, tokens in page_tokens.items():
+        is_full = max_pages_per_call is not None and len(batch) >= max_pages_per_call
+        if batch and (batch_tokens + tokens > max_tokens_per_call or is_full):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+
+        if tokens > max_tokens_per_call:
+            logger.warning(
+                f"Page {page} alone is estimated at {tokens} tokens, above the budget of "
+                f"{max_tokens_per_call} tokens per call"
+            )
+
+        batch.append(page)
+        batch_tokens += tokens
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def sort_batches_by_rank(batches: list[list[str]], ranked_pages: Sequence[str]) -> list[list[str]]:
+    """Orders the batches of `plan_page_batches` by their best ranked page, e.g. to extract the
+    most relevant pages first while each batch still holds consecutive pages.
+
+    :param ranked_pages: Pages of the batches, best ranked first.
+    """
+    rank = {page: i for i, page in enumerate(ranked_pages)}
+    return sorted(batches, key=lambda batch: min(rank[page] for page in batch))
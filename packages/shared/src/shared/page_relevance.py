@@ -0,0 +1,151 @@
+import math
+import re
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from shared.materiality_models import METRIC_ALIASES
+from shared.text_layer import PageText
+
+# One alternation per metric, so a single scan of the page finds every mention of it
+_METRIC_PATTERNS = {
+    metric: re.compile(
+        r"\b(?:" + "|".join(re.escape(alias) for alias in aliases) + r")\b", re.IGNORECASE
+    )
+    for metric, aliases in METRIC_ALIASES.items()
+}
+_NUMBER_PATTERN = re.compile(r"\(?-?[£$€]?\d[\d,]*(?:\.\d+)?(?:%|bn|m|x)?\)?", re.IGNORECASE)
+_CHANGE_PATTERN = re.compile(
+    r"\b(?:increase[ds]?|decrease[ds]?|grew|growth|decline[ds]?|year[- ]on[- ]year|yoy|"
+    r"compared (?:to|with)|vs\.?)\b|%",
+    re.IGNORECASE,
+)
+
+# Weights of each signal in the page score
+METRIC_WEIGHT = 3.0
+MENTION_WEIGHT = 1.0
+NUMBER_DENSITY_WEIGHT = 2.0
+CHANGE_WEIGHT = 1.0
+TABLE_WEIGHT = 1.0
+
+
+@dataclass(frozen=True)
+class PageScore:
+    page_number: int
+    score: float
+    matched_metrics: frozenset[str]
+
+
+def score_page(page_text: PageText) -> PageScore:
+    """Scores how likely a page is to report material changes of the target financial metrics.
+
+    The score combines how many distinct metrics are mentioned (and how often), how dense in
+    numbers the page is, how much it talks about changes, and whether it has tables.
+    """
+    text = page_text.to_prompt_text()
+    n_words = max(len(text.split()), 1)
+
+    mentions = {metric: len(pattern.findall(text)) for metric, pattern in _METRIC_PATTERNS.items()}
+    matched_metrics = frozenset(metric for metric, count in mentions.items() if count)
+
+    # Annual report pages full of figures are around one number every three words
+    number_density = min(len(_NUMBER_PATTERN.findall(text)) / n_words * 3, 1.0)
+    n_changes = len(_CHANGE_PATTERN.findall(text))
+
+    score = (
+        METRIC_WEIGHT * len(matched_metrics)
+        + MENTION_WEIGHT * math.log1p(sum(mentions.values()))
+        + NUMBER_DENSITY_WEIGHT * number_density
+        + CHANGE_WEIGHT * math.log1p(n_changes)
+        + TABLE_WEIGHT * min(len(page_text.tables), 2)
+    )
+
+    # Figures without any of the metrics are most likely about something else
+    if not matched_metrics:
+        score /= 4
+
+    return PageScore(
+        page_number=page_text.page_number,
+        score=score,
+        matched_metrics=matched_metrics,
+    )
+
+
+def rank_pages(page_texts: Iterable[PageText]) -> list[PageScore]:
+    """Scores pages and sorts them from the most to the least relevant"""
+    return sorted(
+        (score_page(page_text) for page_text in page_texts),
+        key=lambda page_score: (-page_score.score, page_score.page_number),
+    )
+
+
+def select_relevant_pages(
+    ranked_pages: Sequence[PageScore],
+    top_k: int | None = None,
+    min_score: float | None = None,
+) -> list[int]:
+    """Page numbers of the `top_k` best ranked pages scoring at least `min_score`, in page order"""
+    selected = ranked_pages[:top_k] if top_k is not None else ranked_pages
+    if min_score is not None:
+        selected = [page_score for page_score in selected if page_score.score >= min_score]
+
+    return sorted(page_score.page_number for page_score in selected)
+
+
+def relevance_recall_report(
+    ranked_pages: Sequence[PageScore],
+    expected_pages: Iterable[int],
+    ks: Iterable[int] = (1, 3, 5, 10, 20),
+) -> dict[str, float]:
+    """Recall of the pages known to hold the metrics within the top k ranked pages.
+
+    The report also has the worst rank of an expected page, i.e. the smallest top k that keeps
+    every expected page, to help tuning `top_k`.
+    """
+    expected = set(expected_pages)
+    if not expected:
+        raise ValueError("At least one expected page is needed to compute recall")
+
+    ranks = {page_score.page_number: rank for rank, page_score in enumerate(ranked_pages, 1)}
+
+    report = {
+        f"page_recall_at_{k}": sum(ranks.get(page, math.inf) <= k for page in expected)
+        / len(expected)
+        for k in ks
+    }
+    report["page_worst_expected_rank"] = max(ranks.get(page, math.inf) for page in expected)
+
+    return report
+
+
+def main():
+    import argparse
+
+    from shared.text_layer import extract_page_texts
+
+    parser = argparse.ArgumentParser(
+        description="Rank the pages of a PDF by relevance and report the recall of known pages"
+    )
+    parser.add_argument("--pdf_path", type=Path, help="PDF to rank", required=True)
+    parser.add_argument(
+        "--expected_pages",
+        type=int,
+        nargs="+",
+        help="Page numbers known to hold the target metrics",
+        required=True,
+    )
+    parser.add_argument("--top", type=int, default=20, help="Number of ranked pages to print")
+    args = parser.parse_args()
+
+    ranked_pages = rank_pages(extract_page_texts(args.pdf_path).values())
+
+    for rank, page_score in enumerate(ranked_pages[: args.top], 1):
+        metrics = ", ".join(sorted(page_score.matched_metrics))
+        print(f"{rank:>3}. page {page_score.page_number:>4}  {page_score.score:6.2f}  {metrics}")
+
+    for name, value in relevance_recall_report(ranked_pages, args.expected_pages).items():
+        print(f"{name}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import csv
+import logging
+import multiprocessing
+import os
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pymupdf
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SubsetJob:
+    """Pages of `pdf_path` to copy into `output_path`, in the order they are listed"""
+
+    pdf_path: Path
+    page_numbers: tuple[int, ...]
+    output_path: Path
+
+
+@dataclass(frozen=True)
+class SubsetResult:
+    job: SubsetJob
+    n_pages: int
+    n_insert_calls: int
+    seconds: float
+    size_bytes: int
+
+
+@dataclass
+class SubsetSummary:
+    results: list[SubsetResult] = field(default_factory=list)
+    failed: list[SubsetJob] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def n_pages(self) -> int:
+        return sum(result.n_pages for result in self.results)
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.n_pages / self.seconds if self.seconds else 0.0
+
+
+def parse_page_ranges(page_ranges: str) -> tuple[int, ...]:
+    """1-based page numbers of a spec like "21, 26, 30-32" """
+    page_numbers: list[int] = []
+
+    for part in page_ranges.replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        first, last = int(start), int(end or start)
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range {part!r}")
+        page_numbers.extend(range(first, last + 1))
+
+    return tuple(page_numbers)
+
+
+def coalesce_pages(page_numbers: Iterable[int]) -> list[tuple[int, int]]:
+    """Runs of consecutive pages as (first, last) ranges, keeping the order of the pages"""
+    ranges: list[tuple[int, int]] = []
+
+    for page_number in page_numbers:
+        if ranges and page_number == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], page_number)
+        else:
+            ranges.append((page_number, page_number))
+
+    return ranges
+
+
+def default_output_name(pdf_path: Path, page_numbers: Sequence[int]) -> str:
+    """Name of a subset named after its PDF and its first and last pages, e.g.
+    "Tesco AR 25_21-30.pdf", so that several subsets of a PDF can be written side by side"""
+    first, last = page_numbers[0], page_numbers[-1]
+    pages = str(first) if first == last else f"{first}-{last}"
+    return f"{pdf_path.stem}_{pages}{pdf_path.suffix}"
+
+
+def read_manifest(manifest_path: Path, output_dir: Path) -> list[SubsetJob]:
+    """Subset jobs of a CSV manifest with `pdf` and `pages` columns, and an optional `output`
+    column. Paths are relative to the manifest. Outputs default to `default_output_name` in
+    `output_dir`.
+
+    Example:
+        pdf,pages,output
+        Tesco AR 25.pdf,"21, 26, 30",Tesco AR report extracted.pdf
+
+    :raise ValueError: When an output would overwrite a source PDF or the output of another
+        row, before any subset is written.
+    """
+    jobs: list[SubsetJob] = []
+
+    with open(manifest_path, newline="") as f:
+        for row in csv.DictReader(f):
+            pdf_path = manifest_path.parent / row["pdf"].strip()
+            page_numbers = parse_page_ranges(row["pages"])
+            if not page_numbers:
+                raise ValueError(f"No pages to extract from {pdf_path}")
+            output = (row.get("output") or "").strip()
+            jobs.append(
+                SubsetJob(
+                    pdf_path=pdf_path,
+                    page_numbers=page_numbers,
+                    output_path=output_dir
+                    / (output or default_output_name(pdf_path, page_numbers)),
+                )
+            )
+
+    sources = {job.pdf_path.resolve() for job in jobs}
+    outputs: dict[Path, SubsetJob] = {}
+    for job in jobs:
+        output_path = job.output_path.resolve()
+        if output_path in sources:
+            raise ValueError(f"Output {job.output_path} would overwrite a source PDF")
+        if output_path in outputs:
+            raise ValueError(
+                f"Subsets of {outputs[output_path].pdf_path.name} and {job.pdf_path.name} are both "
+                f"written to {job.output_path}, set a distinct output for each"
+            )
+        outputs[output_path] = job
+
+    return jobs
+
+
+def extract_pdf_pages(
+    pdf_path: Path,
+    page_numbers: Sequence[int],
+    output_path: Path,
+    garbage: int = 0,
+    deflate: bool = False,
+) -> SubsetResult:
+    """Copies pages of a PDF into a new PDF, one `insert_pdf` call per run of consecutive pages.
+
+    :param page_numbers: 1-based page numbers, in the order they are written.
+    :param garbage: Garbage collection level of `pymupdf.Document.save`, from 0 to 4. Drops the
+        objects of the source PDF that the subset does not use.
+    :param deflate: Compress the uncompressed streams of the subset.
+    """
+    start = time.perf_counter()
+    page_ranges = coalesce_pages(page_numbers)
+
+    with pymupdf.open(pdf_path) as source, pymupdf.open() as subset:
+        for first, last in page_ranges:
+            if last > source.page_count:
+                raise ValueError(
+                    f"Page {last} is out of range, {pdf_path} has {source.page_count} pages"
+                )
+            # pymupdf uses 0-based indexing
+            subset.insert_pdf(source, from_page=first - 1, to_page=last - 1)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        subset.save(output_path, garbage=garbage, deflate=deflate)
+
+    return SubsetResult(
+        job=SubsetJob(pdf_path, tuple(page_numbers), output_path),
+        n_pages=len(page_numbers),
+        n_insert_calls=len(page_ranges),
+        seconds=time.perf_counter() - start,
+        size_bytes=output_path.stat().st_size,
+    )
+
+
+def _run_job(job: SubsetJob, garbage: int, deflate: bool) -> SubsetResult:
+    return extract_pdf_pages(job.pdf_path, job.page_numbers, job.output_path, garbage, deflate)
+
+
+def iter_pdf_subsets(
+    jobs: Sequence[SubsetJob],
+    max_workers: int | None = None,
+    garbage: int = 0,
+    deflate: bool = False,
+) -> Iterator[SubsetResult | tuple[SubsetJob, Exception]]:
+    """Runs subset jobs across a process pool, yielding each result as soon as it is done, or the
+    job and its error if it failed.
+
+    :param max_workers: Number of worker processes. Defaults to the number of CPUs, capped by
+        the number of jobs. With a single worker, jobs run in the calling process.
+    """
+    if not jobs:
+        return
+
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+
+    if workers == 1:
+        for job in jobs:
+            try:
+                yield _run_job(job, garbage, deflate)
+            except Exception as e:
+                yield job, e
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        # Same as `shared.rasterize.map_pages`, forking is unsafe when the caller runs threads
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+    try:
+        futures: dict[Future[SubsetResult], SubsetJob] = {
+            executor.submit(_run_job, job, garbage, deflate): job for job in jobs
+        }
+
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield futures[future], e
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_pdf_subsets(
+    jobs: Sequence[SubsetJob],
+    max_workers: int | None = None,
+    garbage: int = 0,
+    deflate: bool = False,
+) -> SubsetSummary:
+    """Runs every subset job, see `iter_pdf_subsets`, and logs the throughput in pages per
+    second. Failed jobs are logged and listed in the summary."""
+    summary = SubsetSummary()
+    start = time.perf_counter()
+
+    for outcome in iter_pdf_subsets(jobs, max_workers, garbage, deflate):
+        if isinstance(outcome, SubsetResult):
+            summary.results.append(outcome)
+            logger.debug(
+                f"Extracted {outcome.n_pages} pages of {outcome.job.pdf_path.name} in "
+                f"{outcome.n_insert_calls} copies and {outcome.seconds:.2f}s"
+            )
+        else:
+            job, error = outcome
+            summary.failed.append(job)
+            logger.error(f"Failed to extract pages of {job.pdf_path}: {error}")
+
+    summary.seconds = time.perf_counter() - start
+    logger.info(
+        f"Extracted {summary.n_pages} pages from {len(summary.results)} PDFs in "
+        f"{summary.seconds:.1f}s ({summary.pages_per_second:.1f} pages/s), "
+        f"{len(summary.failed)} failed"
+    )
+    return summary
+
+
+def main():
+    import argparse
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Cut page subsets out of many PDFs")
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="CSV with 'pdf', 'pages' (e.g. '21, 26, 30-32') and optional 'output' columns",
+        required=True,
+    )
+    parser.add_argument(
+        "--output_dir", type=Path, help="Where the subsets are written", required=True
+    )
+    parser.add_argument("--max_workers", type=int, help="Worker processes, defaults to CPUs")
+    parser.add_argument(
+        "--garbage",
+        type=int,
+        default=0,
+        choices=range(5),
+        help="Garbage collection level of the output, higher is smaller and slower",
+    )
+    parser.add_argument("--deflate", action="store_true", help="Compress the output streams")
+    args = parser.parse_args()
+
+    summary = extract_pdf_subsets(
+        read_manifest(args.manifest, args.output_dir),
+        max_workers=args.max_workers,
+        garbage=args.garbage,
+        deflate=args.deflate,
+    )
+
+    print(f"pages={summary.n_pages}")
+    print(f"pages_per_second={summary.pages_per_second:.1f}")
+    print(f"failed={len(summary.failed)}")
+
+    if summary.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Literal
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# `${{ inputs.name }}`, `${{ parent.jobs.step.outputs.name }}`, ...
+_REFERENCE_PATTERN = re.compile(r"\$\{\{\s*([\w.-]+)\s*\}\}")
+# Optional parts of a component command, dropped when their input is not set
+_OPTIONAL_PATTERN = re.compile(r"\$\[\[(.*?)\]\]", re.S)
+
+# Inline step kept in every pipeline so that AzureML uploads the pipeline YAML, nothing to run
+SNAPSHOT_STEP = "snapshot"
+
+type STEP_STATUS = Literal["cached", "succeeded", "failed", "skipped"]
+
+
+@dataclass
+class PipelineStep:
+    name: str
+    command: str
+    code_dir: Path
+    # Pipeline job inputs, either values or `${{ parent... }}` references
+    inputs: dict[str, Any]
+    # Input defaults and types of the component
+    input_specs: dict[str, dict[str, Any]]
+    output_specs: dict[str, dict[str, Any]]
+    dependencies: set[str] = field(default_factory=set)
+
+
+@dataclass
+class StepResult:
+    name: str
+    status: STEP_STATUS
+    key: str | None = None
+    seconds: float = 0.0
+    output_dirs: dict[str, Path] = field(default_factory=dict)
+
+
+def _references(value: Any) -> list[str]:
+    return _REFERENCE_PATTERN.findall(value) if isinstance(value, str) else []
+
+
+def load_pipeline(pipeline_path: Path) -> tuple[dict[str, Any], dict[str, PipelineStep]]:
+    """Inputs and steps of an AzureML pipeline YAML, with the components it refers to.
+
+    Component paths are relative to the pipeline YAML, as in a run directory isolated by
+    `bin/pipe/_iso`.
+    """
+    pipeline = yaml.safe_load(pipeline_path.read_text())
+    steps: dict[str, PipelineStep] = {}
+
+    for name, job in pipeline["jobs"].items():
+        if name == SNAPSHOT_STEP:
+            continue
+
+        if "component" in job:
+            component_path = pipeline_path.parent / job["component"]
+            component = yaml.safe_load(component_path.read_text())
+            base_dir = component_path.parent
+        else:
+            component = job
+            base_dir = pipeline_path.parent
+
+        inputs = job.get("inputs") or {}
+        dependencies = {
+            reference.split(".")[2]
+            for value in inputs.values()
+            for reference in _references(value)
+            if reference.startswith("parent.jobs.")
+        }
+
+        steps[name] = PipelineStep(
+            name=name,
+            command=component["command"],
+            code_dir=(base_dir / component.get("code", ".")).resolve(),
+            inputs=inputs,
+            input_specs=component.get("inputs") or {},
+            output_specs=component.get("outputs") or {},
+            dependencies=dependencies,
+        )
+
+    for step in steps.values():
+        if unknown := step.dependencies - steps.keys():
+            raise ValueError(f"Step {step.name} depends on unknown steps {sorted(unknown)}")
+
+    return pipeline.get("inputs") or {}, steps
+
+
+def downstream_steps(steps: dict[str, PipelineStep], names: Iterable[str]) -> set[str]:
+    """The given steps and every step that depends on them, directly or not"""
+    selected = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for step in steps.values():
+            if step.name not in selected and step.dependencies & selected:
+                selected.add(step.name)
+                changed = True
+    return selected
+
+
+def _tree_sha256(path: Path) -> str:
+    """Hash of the content of a file, or of the relative paths and contents of a directory"""
+    digest = hashlib.sha256()
+
+    if path.is_file():
+        files = [path]
+    else:
+        files = sorted(
+            file
+            for file in path.rglob("*")
+            if file.is_file() and "__pycache__" not in file.parts and file.suffix != ".pyc"
+        )
+
+    for file in files:
+        digest.update(str(file.relative_to(path) if file != path else file.name).encode())
+        with open(file, "rb") as f:
+            digest.update(hashlib.file_digest(f, "sha256").digest())
+
+    return digest.hexdigest()
+
+
+class PipelineRunner:
+    """Runs the steps of a pipeline locally, independent steps at the same time in separate
+    processes, and reuses the outputs of steps that already ran with the same code and inputs.
+
+    Each step output is a directory of the cache named after the hash of the step command,
+    code directory, input values and input files. The outputs of upstream steps are hashed
+    through the hash of the step that produced them, so changing a step reruns it and every
+    step downstream of it only.
+
+    :param pipeline_path: AzureML pipeline YAML, with its components next to it.
+    :param cache_dir: Where step outputs are kept across runs.
+    :param logs_dir: Where the output of each step command is written.
+    :param max_parallel: Steps running at the same time.
+    :param force: Steps to rerun even when cached, along with the steps downstream of them.
+    :param requirements: Requirements file, relative to the code directory of each step, to run
+        the step in an environment of its own built by `uv` from it, as `bin/pipe/local` does.
+        Its content is part of the step hash. Defaults to running steps in the current
+        environment.
+    """
+
+    def __init__(
+        self,
+        pipeline_path: Path,
+        cache_dir: Path,
+        logs_dir: Path,
+        max_parallel: int | None = None,
+        force: Iterable[str] = (),
+        requirements: Path | None = None,
+    ):
+        self.pipeline_path = pipeline_path
+        self.cache_dir = cache_dir
+        self.logs_dir = logs_dir
+        self.requirements = requirements
+        self.pipeline_inputs, self.steps = load_pipeline(pipeline_path)
+        self.force = downstream_steps(self.steps, force)
+        self._semaphore = asyncio.Semaphore(max_parallel or os.cpu_count() or 1)
+        self._tasks: dict[str, asyncio.Task[StepResult]] = {}
+        # Hashed once per run, steps often share code and data directories
+        self._tree_hashes: dict[Path, str] = {}
+
+    def _hash_tree(self, path: Path) -> str:
+        if path not in self._tree_hashes:
+            self._tree_hashes[path] = _tree_sha256(path)
+        return self._tree_hashes[path]
+
+    def _resolve_value(self, value: Any, results: dict[str, StepResult]) -> tuple[Any, Any]:
+        """Local value of a job input and what identifies it in the step hash"""
+        if isinstance(value, dict) and "path" not in value:
+            return self._resolve_value(value.get("default"), results)
+        if isinstance(value, dict):
+            # Data asset input, only local paths can be used outside AzureML
+            path = (self.pipeline_path.parent / value["path"]).resolve()
+            return str(path), self._hash_tree(path)
+
+        if isinstance(value, str) and (match := _REFERENCE_PATTERN.fullmatch(value.strip())):
+            parts = match.group(1).split(".")
+            if parts[:2] == ["parent", "inputs"]:
+                return self._resolve_value(self.pipeline_inputs[parts[2]], results)
+            if parts[:2] == ["parent", "jobs"] and parts[3:4] == ["outputs"]:
+                upstream = results[parts[2]]
+                return str(upstream.output_dirs[parts[4]]), f"{upstream.key}:{parts[4]}"
+            raise ValueError(f"Unsupported reference {match.group(1)}")
+
+        return value, value
+
+    def _resolve_inputs(
+        self, step: PipelineStep, results: dict[str, StepResult]
+    ) -> tuple[dict[str, Any], dict[str, Any]]:
+        values: dict[str, Any] = {}
+        hashed: dict[str, Any] = {}
+
+        for name, spec in step.input_specs.items():
+            if name in step.inputs:
+                values[name], hashed[name] = self._resolve_value(step.inputs[name], results)
+            elif "default" in spec:
+                values[name] = hashed[name] = spec["default"]
+
+        return values, hashed
+
+    def _requirements_path(self, step: PipelineStep) -> Path | None:
+        return None if self.requirements is None else (step.code_dir / self.requirements).resolve()
+
+    def step_key(self, step: PipelineStep, hashed_inputs: dict[str, Any]) -> str:
+        requirements_path = self._requirements_path(step)
+        return hashlib.sha256(
+            json.dumps(
+                {
+                    "command": step.command,
+                    "code": self._hash_tree(step.code_dir),
+                    "requirements": requirements_path and self._hash_tree(requirements_path),
+                    "inputs": hashed_inputs,
+                    "outputs": sorted(step.output_specs),
+                },
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+
+    def _render_command(self, step: PipelineStep, inputs: dict[str, Any], output_dir: Path) -> str:
+        def substitute(match: re.Match[str]) -> str:
+            kind, _, name = match.group(1).partition(".")
+            if kind == "inputs":
+                return str(inputs[name])
+            if kind == "outputs":
+                return str(output_dir / name)
+            raise ValueError(f"Unsupported reference {match.group(1)} in step {step.name}")
+
+        def optional(match: re.Match[str]) -> str:
+            names = [reference.partition(".")[2] for reference in _references(match.group(1))]
+            return match.group(1) if all(name in inputs for name in names) else ""
+
+        command = _OPTIONAL_PATTERN.sub(optional, step.command)
+        return _REFERENCE_PATTERN.sub(substitute, command)
+
+    def command_args(self, step: PipelineStep, command: str) -> list[str]:
+        """Arguments of the process running a rendered step command"""
+        args = ["bash", "-c", command]
+        if (requirements_path := self._requirements_path(step)) is None:
+            return args
+        # Same environment as `run::local` in `bin/lib/run.sh`
+        return [
+            "uv",
+            "run",
+            "--with-requirements",
+            str(requirements_path),
+            "--isolated",
+            "--no-project",
+            *args,
+        ]
+
+    async def _run_command(self, step: PipelineStep, command: str) -> int:
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        log_path = self.logs_dir / f"{step.name}.log"
+
+        with open(log_path, "wb") as log_file:
+            process = await asyncio.create_subprocess_exec(
+                *self.command_args(step, command),
+                cwd=step.code_dir,
+                stdout=log_file,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            return await process.wait()
+
+    async def _run_step(self, step: PipelineStep) -> StepResult:
+        upstream = await asyncio.gather(*(self._tasks[name] for name in step.dependencies))
+        results = {result.name: result for result in upstream}
+        if any(result.status in ("failed", "skipped") for result in upstream):
+            logger.warning(f"Skipping {step.name}, an upstream step failed")
+            return StepResult(step.name, "skipped")
+
+        # An invalid input or command fails its step only, the independent steps still run
+        try:
+            return await self._execute_step(step, results)
+        except Exception:
+            logger.exception(f"{step.name} failed")
+            return StepResult(step.name, "failed")
+
+    async def _execute_step(self, step: PipelineStep, results: dict[str, StepResult]) -> StepResult:
+        inputs, hashed_inputs = await asyncio.to_thread(self._resolve_inputs, step, results)
+        key = await asyncio.to_thread(self.step_key, step, hashed_inputs)
+        cached_dir = self.cache_dir / key
+        output_dirs = {name: cached_dir / name for name in step.output_specs}
+
+        if cached_dir.exists() and step.name not in self.force:
+            logger.info(f"{step.name} is cached ({key[:12]})")
+            return StepResult(step.name, "cached", key, output_dirs=output_dirs)
+
+        async with self._semaphore:
+            # Outputs are written aside and moved in place once the step succeeded, so that a
+            # failed or interrupted step is never reused
+            pending_dir = self.cache_dir / f".{key}.{uuid.uuid4().hex}"
+            pending_dir.mkdir(parents=True)
+            for name, spec in step.output_specs.items():
+                if spec.get("type") == "uri_file":
+                    (pending_dir / name).parent.mkdir(parents=True, exist_ok=True)
+                else:
+                    (pending_dir / name).mkdir(parents=True, exist_ok=True)
+
+            logger.info(f"Running {step.name} ({key[:12]})")
+            start = time.perf_counter()
+            try:
+                return_code = await self._run_command(
+                    step, self._render_command(step, inputs, pending_dir)
+                )
+            except BaseException:
+                shutil.rmtree(pending_dir, ignore_errors=True)
+                raise
+            seconds = time.perf_counter() - start
+
+        if return_code != 0:
+            shutil.rmtree(pending_dir, ignore_errors=True)
+            logger.error(
+                f"{step.name} failed with exit code {return_code} after {seconds:.1f}s, "
+                f"see {self.logs_dir / f'{step.name}.log'}"
+            )
+            return StepResult(step.name, "failed", key, seconds)
+
+        shutil.rmtree(cached_dir, ignore_errors=True)
+        pending_dir.rename(cached_dir)
+        logger.info(f"{step.name} succeeded in {seconds:.1f}s")
+        return StepResult(step.name, "succeeded", key, seconds, output_dirs)
+
+    async def run(self) -> dict[str, StepResult]:
+        """Runs every step once its upstream steps are done"""
+        for step in self.steps.values():
+            self._tasks[step.name] = asyncio.create_task(self._run_step(step))
+        results = await asyncio.gather(*self._tasks.values())
+        return {result.name: result for result in results}
+
+    def prune_cache(self, results: dict[str, StepResult]) -> list[Path]:
+        """Removes the step outputs of the cache that the given run did not use, including the
+        outputs of previous versions of its steps, of steps no longer in the pipeline and of
+        interrupted steps. Another run using the same cache must not be running.
+
+        Nothing is removed when a step failed or was skipped, as the outputs it would have used
+        are not known.
+
+        :return: The removed directories.
+        """
+        if any(result.status in ("failed", "skipped") for result in results.values()):
+            logger.warning("Not pruning the step cache, some steps did not run")
+            return []
+
+        keys = {result.key for result in results.values()}
+        removed = [path for path in self.cache_dir.iterdir() if path.name not in keys]
+        for path in removed:
+            shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Pruned {len(removed)} step outputs from {self.cache_dir}")
+        return removed
+
+
+def main():
+    import argparse
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(
+        description="Run an AzureML pipeline locally, reusing the outputs of unchanged steps"
+    )
+    parser.add_argument("pipeline_path", type=Path, help="Pipeline YAML of an isolated run")
+    parser.add_argument(
+        "--cache_dir", type=Path, help="Where step outputs are kept across runs", required=True
+    )
+    parser.add_argument(
+        "--logs_dir",
+        type=Path,
+        help="Where step logs are written. Defaults to 'logs' next to the pipeline YAML.",
+    )
+    parser.add_argument("--max_parallel", type=int, help="Steps running at the same time")
+    parser.add_argument(
+        "--force",
+        nargs="+",
+        default=[],
+        help="Steps to rerun even when cached, along with the steps downstream of them",
+    )
+    parser.add_argument(
+        "--requirements",
+        type=Path,
+        help="Requirements file, relative to the code directory of each step, to run the step "
+        "in an isolated environment built from. Defaults to the current environment.",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Remove the step outputs of the cache that this run did not use",
+    )
+    args = parser.parse_args()
+
+    runner = PipelineRunner(
+        args.pipeline_path,
+        cache_dir=args.cache_dir,
+        logs_dir=args.logs_dir or args.pipeline_path.parent / "logs",
+        max_parallel=args.max_parallel,
+        force=args.force,
+        requirements=args.requirements,
+    )
+    results = asyncio.run(runner.run())
+    if args.prune:
+        runner.prune_cache(results)
+
+    for result in results.values():
+        print(f"{result.name:<40} {result.status:<10} {result.seconds:8.1f}s")
+        for name, output_dir in result.output_dirs.items():
+            print(f"    {name}: {output_dir}")
+
+    if any(result.status in ("failed", "skipped") for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
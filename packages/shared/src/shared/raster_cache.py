@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+from shared.rasterize import DEFAULT_IMAGE_OPTIONS, ImageOptions
+
+logger = logging.getLogger(__name__)
+
+RENDERER = "pdfplumber"
+DEFAULT_MAX_BYTES = 5 * 1024**3
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: Path) -> str:
+    """Hash the content of a file without loading it in memory at once"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    pdf_hash: str
+    page_number: int
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS
+    renderer: str = RENDERER
+
+    def digest(self) -> str:
+        # The options repr lists every field, so any change in resolution or encoding is a miss
+        return hashlib.sha256(
+            f"{self.pdf_hash}:{self.page_number}:{self.image_options!r}:{self.renderer}".encode()
+        ).hexdigest()
+
+
+class RasterCache:
+    """Persistent, content-addressed cache of rendered PDF pages and their data URLs.
+
+    Entries are keyed by the hash of the PDF content, the page number, the image options
+    (resolution and encoding) and the renderer, so renaming or moving a PDF keeps its entries
+    valid and editing it invalidates them. When the cache grows above `max_bytes`, the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._size_bytes = sum(path.stat().st_size for path in self._entries())
+
+    def _entries(self) -> list[Path]:
+        # Skip the temporary files of writes in progress
+        return [
+            path
+            for path in self.cache_dir.glob("*/*")
+            if path.is_file() and not path.name.startswith(".")
+        ]
+
+    def _entry_path(self, name: str, suffix: str) -> Path:
+        # Shard entries in sub-directories to keep directory listings small
+        return self.cache_dir / name[:2] / f"{name}{suffix}"
+
+    def _get(self, name: str, suffix: str) -> Path | None:
+        path = self._entry_path(name, suffix)
+        try:
+            # Access time is unreliable (noatime mounts), so the modification time is used
+            # as the last-used time for LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _put(self, name: str, suffix: str, content: bytes | Path) -> Path:
+        path = self._entry_path(name, suffix)
+        path.parent.mkdir(exist_ok=True)
+
+        # Write to a temporary file first so that concurrent readers never see partial entries
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        if isinstance(content, Path):
+            shutil.copyfile(content, tmp_path)
+        else:
+            tmp_path.write_bytes(content)
+
+        previous_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        self._size_bytes += path.stat().st_size - previous_size
+        if self._size_bytes > self.max_bytes:
+            self.evict()
+
+        return path
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in `max_bytes`"""
+        entries = sorted(
+            ((path.stat(), path) for path in self._entries()),
+            key=lambda entry: entry[0].st_mtime,
+        )
+        self._size_bytes = sum(stat.st_size for stat, _ in entries)
+
+        for stat, path in entries:
+            if self._size_bytes <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._size_bytes -= stat.st_size
+            logger.debug(f"Evicted {path.name} from the raster cache")
+
+    def get_image(self, key: CacheKey) -> Path | None:
+        return self._get(key.digest(), key.image_options.suffix)
+
+    def put_image(self, key: CacheKey, image_path: Path) -> Path:
+        return self._put(key.digest(), key.image_options.suffix, image_path)
+
+    def get_data_url(self, key: CacheKey) -> str | None:
+        path = self._get(key.digest(), ".dataurl")
+        return path.read_text() if path is not None else None
+
+    def put_data_url(self, key: CacheKey, data_url: str) -> None:
+        self._put(key.digest(), ".dataurl", data_url.encode())
+
+    def get_page_count(self, pdf_hash: str) -> int | None:
+        path = self._get(pdf_hash, ".pages")
+        return int(path.read_text()) if path is not None else None
+
+    def put_page_count(self, pdf_hash: str, page_count: int) -> None:
+        self._put(pdf_hash, ".pages", str(page_count).encode())
@@ -0,0 +1,319 @@
+import base64
+import io
+import logging
+import math
+import multiprocessing
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Literal
+
+import pdfplumber
+from pdfplumber.page import Page
+from pdfplumber.pdf import PDF
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESOLUTION = 500
+
+# PDF page sizes are expressed in points, i.e. 1/72 of an inch
+POINTS_PER_INCH = 72
+
+type IMAGE_FORMAT = Literal["PNG", "JPEG", "WEBP"]
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    """How pages are rendered and encoded before being sent to a model.
+
+    :param resolution: Rendering resolution in DPI. When `max_pixels` is set, this is the
+        highest resolution a page can be rendered at.
+    :param max_pixels: Pixel budget per page. The resolution of each page is picked so that
+        its image holds at most this many pixels, which avoids sending images larger than
+        what the model downscales them to anyway.
+    :param min_resolution: Lowest resolution a page can be rendered at to fit `max_pixels`.
+    :param image_format: Image format. PNG is lossless (quantized to 256 colours), JPEG and
+        WEBP are lossy and much smaller for scanned pages and charts.
+    :param quality: Quality of lossy formats, between 1 and 100.
+    :param grayscale: Drop colours, which most financial tables do not need.
+    """
+
+    resolution: int = DEFAULT_RESOLUTION
+    max_pixels: int | None = None
+    min_resolution: int = 72
+    image_format: IMAGE_FORMAT = "PNG"
+    quality: int = 85
+    grayscale: bool = False
+
+    @property
+    def suffix(self) -> str:
+        return {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}[self.image_format]
+
+    @property
+    def mime_type(self) -> str:
+        return {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}[self.image_format]
+
+    def resolution_for(self, width: float, height: float) -> int:
+        """Resolution to render a page of `width` x `height` points at"""
+        if self.max_pixels is None:
+            return self.resolution
+
+        area_in_square_inches = (width / POINTS_PER_INCH) * (height / POINTS_PER_INCH)
+        budget_resolution = math.floor(math.sqrt(self.max_pixels / area_in_square_inches))
+
+        return max(self.min_resolution, min(self.resolution, budget_resolution))
+
+
+DEFAULT_IMAGE_OPTIONS = ImageOptions()
+
+# Each worker process opens the PDF once in its initializer, so rendering a page does not
+# re-parse the whole document
+_worker_pdf: PDF | None = None
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    page_number: int
+    path: Path
+    render_seconds: float
+    resolution: int
+    size_bytes: int
+
+
+@dataclass(frozen=True)
+class EncodedPage:
+    page_number: int
+    data_url: str
+    render_seconds: float
+    resolution: int
+    size_bytes: int
+
+
+def count_pages(pdf_path: Path) -> int:
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def page_image_path(
+    pdf_path: Path,
+    output_dir: Path,
+    page_number: int,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+) -> Path:
+    return output_dir / f"{pdf_path.stem}_page_{page_number}{image_options.suffix}"
+
+
+def _open_worker_pdf(pdf_path: Path) -> None:
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(pdf_path)
+
+
+def _process_page[T](pdf: PDF, page_number: int, page_fn: Callable[..., T], args: tuple) -> T:
+    page = pdf.pages[page_number - 1]
+    try:
+        return page_fn(page, *args)
+    finally:
+        # Drop the parsed page objects, otherwise a worker holds on to every page it processed
+        page.close()
+
+
+def _process_page_in_worker[T](page_number: int, page_fn: Callable[..., T], args: tuple) -> T:
+    if _worker_pdf is None:
+        raise RuntimeError("Worker PDF is not open")
+
+    return _process_page(_worker_pdf, page_number, page_fn, args)
+
+
+def map_pages[T](
+    pdf_path: Path,
+    page_fn: Callable[..., T],
+    *args: Any,
+    max_workers: int | None = None,
+    page_numbers: Iterable[int] | None = None,
+) -> Iterator[T]:
+    """Apply `page_fn(page, *args)` to PDF pages across a process pool, yielding each result as
+    soon as it is done.
+
+    Results are yielded in completion order, not page order, so consumers can start working on
+    the first pages while the rest of the document is still being processed. `page_fn` must be
+    a module-level function so that it can be sent to the worker processes.
+
+    :param pdf_path: PDF to process.
+    :param page_fn: Function called with a pdfplumber page and `args`.
+    :param max_workers: Number of worker processes. Defaults to the number of CPUs, capped by
+        the number of pages. With a single worker, pages are processed in the calling process.
+    :param page_numbers: 1-based page numbers to process. Defaults to every page.
+    """
+    pages = list(page_numbers) if page_numbers is not None else None
+    if pages is None:
+        pages = list(range(1, count_pages(pdf_path) + 1))
+
+    if not pages:
+        return
+
+    workers = min(max_workers or os.cpu_count() or 1, len(pages))
+
+    if workers == 1:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_number in pages:
+                yield _process_page(pdf, page_number, page_fn, args)
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        # The event loop and HTTP clients of the caller run threads, which makes forking unsafe
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_open_worker_pdf,
+        initargs=(pdf_path,),
+    )
+
+    try:
+        futures: list[Future[T]] = [
+            executor.submit(_process_page_in_worker, page_number, page_fn, args)
+            for page_number in pages
+        ]
+
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # If the consumer stops early, do not keep processing pages nobody will read
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def encode_image(image: Image.Image, image_options: ImageOptions) -> bytes:
+    """Encode a rendered page in memory according to `image_options`"""
+    if image_options.grayscale:
+        image = image.convert("L")
+
+    buffer = io.BytesIO()
+    if image_options.image_format == "PNG":
+        if not image_options.grayscale:
+            # Same palette quantization as pdfplumber's default PNG output
+            image = image.convert("RGB").quantize(256, method=Image.Quantize.FASTOCTREE)
+        image.save(buffer, format="PNG")
+    else:
+        if not image_options.grayscale:
+            # Lossy formats do not support palettes and JPEG does not support transparency
+            image = image.convert("RGB")
+        image.save(buffer, format=image_options.image_format, quality=image_options.quality)
+
+    return buffer.getvalue()
+
+
+def save_image(image: Image.Image, dest: Path, image_options: ImageOptions) -> None:
+    """Encode a rendered page according to `image_options` and write it to `dest`"""
+    dest.write_bytes(encode_image(image, image_options))
+
+
+def _render_page(
+    page: Page,
+    pdf_path: Path,
+    output_dir: Path,
+    image_options: ImageOptions,
+) -> RenderedPage:
+    start = time.perf_counter()
+
+    image_path = page_image_path(pdf_path, output_dir, page.page_number, image_options)
+    resolution = image_options.resolution_for(page.width, page.height)
+    save_image(page.to_image(resolution=resolution).original, image_path, image_options)
+
+    return RenderedPage(
+        page_number=page.page_number,
+        path=image_path,
+        render_seconds=time.perf_counter() - start,
+        resolution=resolution,
+        size_bytes=image_path.stat().st_size,
+    )
+
+
+def iter_rendered_pages(
+    pdf_path: Path,
+    output_dir: Path,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+    max_workers: int | None = None,
+    page_numbers: Iterable[int] | None = None,
+) -> Iterator[RenderedPage]:
+    """Render PDF pages to images across a process pool, yielding each page as soon as it is done.
+
+    :param pdf_path: PDF to render.
+    :param output_dir: Directory where the page images are written.
+    :param image_options: Resolution and encoding of the page images.
+    :param max_workers: Number of worker processes, see `map_pages`.
+    :param page_numbers: 1-based page numbers to render. Defaults to every page.
+    """
+    for rendered_page in map_pages(
+        pdf_path,
+        _render_page,
+        pdf_path,
+        output_dir,
+        image_options,
+        max_workers=max_workers,
+        page_numbers=page_numbers,
+    ):
+        logger.debug(
+            f"Rendered page {rendered_page.page_number} at {rendered_page.resolution} DPI in "
+            f"{rendered_page.render_seconds:.2f}s ({rendered_page.size_bytes / 1024:.0f} KiB)"
+        )
+        yield rendered_page
+
+
+def _encode_page(
+    page: Page,
+    pdf_path: Path,
+    output_dir: Path | None,
+    image_options: ImageOptions,
+) -> EncodedPage:
+    start = time.perf_counter()
+
+    resolution = image_options.resolution_for(page.width, page.height)
+    image_bytes = encode_image(page.to_image(resolution=resolution).original, image_options)
+
+    if output_dir is not None:
+        page_image_path(pdf_path, output_dir, page.page_number, image_options).write_bytes(
+            image_bytes
+        )
+
+    data_url = f"data:{image_options.mime_type};base64,{base64.b64encode(image_bytes).decode()}"
+
+    return EncodedPage(
+        page_number=page.page_number,
+        data_url=data_url,
+        render_seconds=time.perf_counter() - start,
+        resolution=resolution,
+        size_bytes=len(image_bytes),
+    )
+
+
+def iter_encoded_pages(
+    pdf_path: Path,
+    output_dir: Path | None = None,
+    image_options: ImageOptions = DEFAULT_IMAGE_OPTIONS,
+    max_workers: int | None = None,
+    page_numbers: Iterable[int] | None = None,
+) -> Iterator[EncodedPage]:
+    """Render PDF pages straight to data URLs across a process pool, yielding each page as soon
+    as it is done.
+
+    Pages are encoded in memory by the workers, so the image does not go through a file and
+    the base64 encoding does not run in the calling process.
+
+    :param output_dir: Directory where the page images are also written, if any.
+    """
+    for encoded_page in map_pages(
+        pdf_path,
+        _encode_page,
+        pdf_path,
+        output_dir,
+        image_options,
+        max_workers=max_workers,
+        page_numbers=page_numbers,
+    ):
+        logger.debug(
+            f"Encoded page {encoded_page.page_number} at {encoded_page.resolution} DPI in "
+            f"{encoded_page.render_seconds:.2f}s ({encoded_page.size_bytes / 1024:.0f} KiB)"
+        )
+        yield encoded_page
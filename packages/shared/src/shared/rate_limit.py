@@ -0,0 +1,423 @@
+import asyncio
+import logging
+import math
+import random
+import re
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+
+from agent_framework import (
+    ChatContext,
+    ChatMiddleware,
+    ChatResponse,
+    ChatResponseUpdate,
+    DataContent,
+    TextContent,
+    UsageContent,
+    UsageDetails,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rough token costs used to budget requests before they are sent: OpenAI tokenizers average
+# about 4 characters per token, and a high detail 1024x1024 image costs 765 tokens
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 765
+
+_RETRY_IN_PATTERN = re.compile(r"try again in (\d+(?:\.\d+)?) ?(ms|milliseconds|s|seconds)?", re.I)
+
+
+class TokenBucket:
+    """Budget of `capacity` units per minute, refilled continuously"""
+
+    def __init__(self, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self._clock = clock
+        self._available = capacity
+        self._updated_at = clock()
+
+    @property
+    def available(self) -> float:
+        now = self._clock()
+        self._available = min(
+            self.capacity, self._available + (now - self._updated_at) * self.capacity / 60
+        )
+        self._updated_at = now
+        return self._available
+
+    def seconds_until(self, amount: float) -> float:
+        """Time to wait until `amount` units are available. Requests larger than the capacity
+        only wait for a full bucket, otherwise they would never be sent."""
+        missing = min(amount, self.capacity) - self.available
+        return max(missing, 0) * 60 / self.capacity
+
+    def consume(self, amount: float) -> None:
+        # Can go negative when the actual usage is higher than estimated
+        self._available = self.available - amount
+
+
+class AdaptiveRateLimiter:
+    """Async rate limiter for the requests to one model deployment.
+
+    Enforces requests-per-minute and tokens-per-minute budgets, and adjusts the number of
+    concurrent requests with additive increase / multiplicative decrease (AIMD): every
+    successful request raises the limit a little, every throttled request halves it.
+
+    :param requests_per_minute: Requests per minute quota of the deployment, if any.
+    :param tokens_per_minute: Tokens per minute quota of the deployment, if any.
+    :param initial_concurrency: Concurrent requests allowed at the start.
+    :param min_concurrency: Concurrent requests allowed after repeated throttling.
+    :param max_concurrency: Highest number of concurrent requests.
+    :param decrease_factor: Concurrency limit multiplier on throttling.
+    :param max_retries: Retries of a throttled or failed request before giving up.
+    :param base_backoff_seconds: Backoff of the first retry when the service does not say
+        when to retry. Doubles on each retry, with full jitter.
+    :param max_backoff_seconds: Highest backoff between retries.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        initial_concurrency: int = 10,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        decrease_factor: float = 0.5,
+        max_retries: int = 6,
+        base_backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._clock = clock
+        self._requests = TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+
+        self._concurrency_limit = float(initial_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._last_decrease_at = -math.inf
+        self._condition = asyncio.Condition()
+
+        self.n_requests = 0
+        self.n_throttled = 0
+        self.n_retries = 0
+
+    @property
+    def concurrency_limit(self) -> int:
+        return math.floor(self._concurrency_limit)
+
+    def metrics(self) -> dict[str, float]:
+        """Current limits and load, e.g. for `azureml_logger.log_metrics`"""
+        metrics: dict[str, float] = {
+            "rate_limiter_concurrency_limit": self.concurrency_limit,
+            "rate_limiter_in_flight": self._in_flight,
+            "rate_limiter_queue_depth": self._waiting,
+            "rate_limiter_requests": self.n_requests,
+            "rate_limiter_throttled": self.n_throttled,
+            "rate_limiter_retries": self.n_retries,
+        }
+        if self._requests is not None:
+            metrics["rate_limiter_available_requests"] = self._requests.available
+        if self._tokens is not None:
+            metrics["rate_limiter_available_tokens"] = self._tokens.available
+        return metrics
+
+    async def _wait_for_budget(self, estimated_tokens: int) -> None:
+        while True:
+            wait_seconds = max(
+                self._requests.seconds_until(1) if self._requests else 0,
+                self._tokens.seconds_until(estimated_tokens) if self._tokens else 0,
+            )
+            if wait_seconds <= 0:
+                break
+            await asyncio.sleep(wait_seconds)
+
+        if self._requests is not None:
+            self._requests.consume(1)
+        if self._tokens is not None:
+            self._tokens.consume(estimated_tokens)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0):
+        """Waits for a concurrency slot and enough budget to send a request"""
+        async with self._condition:
+            self._waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self._in_flight < self.concurrency_limit)
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+
+        try:
+            await self._wait_for_budget(estimated_tokens)
+            self.n_requests += 1
+            yield
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Corrects the token budget once the actual usage of a request is known"""
+        if self._tokens is not None:
+            self._tokens.consume(actual_tokens - estimated_tokens)
+
+    async def record_success(self) -> None:
+        async with self._condition:
+            # +1 concurrent request once a full window of requests succeeded
+            self._concurrency_limit = min(
+                self.max_concurrency, self._concurrency_limit + 1 / self._concurrency_limit
+            )
+            self._condition.notify_all()
+
+    def record_throttle(self) -> None:
+        self.n_throttled += 1
+        now = self._clock()
+
+        # Requests already in flight when the limit was hit are throttled together, so only
+        # decrease once per backoff period
+        if now - self._last_decrease_at < self.base_backoff_seconds:
+            return
+
+        self._last_decrease_at = now
+        self._concurrency_limit = max(
+            self.min_concurrency, self._concurrency_limit * self.decrease_factor
+        )
+        logger.info(f"Throttled, concurrency limit lowered to {self.concurrency_limit}")
+
+    def backoff_seconds(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            # Small jitter so that the requests throttled together are not retried together
+            return retry_after + random.uniform(0, self.base_backoff_seconds)
+        return random.uniform(
+            0, min(self.max_backoff_seconds, self.base_backoff_seconds * 2**attempt)
+        )
+
+    def _should_retry(self, exception: Exception, attempt: int) -> bool:
+        status_code = get_status_code(exception)
+        is_throttled = status_code == 429 or _is_rate_limit_message(str(exception))
+        is_transient = status_code is not None and status_code >= 500
+        if attempt == self.max_retries or not (is_throttled or is_transient):
+            return False
+        if is_throttled:
+            self.record_throttle()
+        return True
+
+    async def call[T](
+        self,
+        request_fn: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+    ) -> T:
+        """Sends a request within the limits, retrying it when throttled or failed"""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self.slot(estimated_tokens):
+                try:
+                    result = await request_fn()
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+                    retry_after = get_retry_after_seconds(e)
+                else:
+                    await self.record_success()
+                    return result
+
+            self.n_retries += 1
+            backoff = self.backoff_seconds(attempt, retry_after)
+            logger.debug(f"Retrying request in {backoff:.1f}s (attempt {attempt + 1})")
+            await asyncio.sleep(backoff)
+
+        raise AssertionError("unreachable")
+
+    async def stream[T](
+        self,
+        stream_fn: Callable[[], AsyncIterable[T]],
+        estimated_tokens: int = 0,
+    ) -> AsyncIterator[T]:
+        """Streams a response within the limits, holding its slot until the stream ends.
+
+        Requests are retried when throttled or failed before their first item only, as the
+        items already yielded cannot be taken back.
+        """
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with self.slot(estimated_tokens):
+                started = False
+                try:
+                    async for item in stream_fn():
+                        started = True
+                        yield item
+                except Exception as e:
+                    if started or not self._should_retry(e, attempt):
+                        raise
+                    retry_after = get_retry_after_seconds(e)
+                else:
+                    await self.record_success()
+                    return
+
+            self.n_retries += 1
+            backoff = self.backoff_seconds(attempt, retry_after)
+            logger.debug(f"Retrying request in {backoff:.1f}s (attempt {attempt + 1})")
+            await asyncio.sleep(backoff)
+
+
+def _iter_exception_chain(exception: BaseException):
+    seen: set[int] = set()
+    current: BaseException | None = exception
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__ or current.__context__
+
+
+def _is_rate_limit_message(message: str) -> bool:
+    # Azure AI agent runs report throttling as a failed run rather than an HTTP status
+    message = message.lower()
+    return "rate limit" in message or "rate_limit" in message or "too many requests" in message
+
+
+def get_status_code(exception: BaseException) -> int | None:
+    """HTTP status code of an exception raised by the Azure or OpenAI SDKs, if any"""
+    for e in _iter_exception_chain(exception):
+        status_code = getattr(e, "status_code", None)
+        if status_code is None:
+            status_code = getattr(getattr(e, "response", None), "status_code", None)
+        if isinstance(status_code, int):
+            return status_code
+    return None
+
+
+def get_retry_after_seconds(exception: BaseException) -> float | None:
+    """How long the service asked to wait before retrying, if it did"""
+    for e in _iter_exception_chain(exception):
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        if (retry_after_ms := headers.get("retry-after-ms")) is not None:
+            return float(retry_after_ms) / 1000
+        if (retry_after := headers.get("retry-after")) is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass  # HTTP date, fall back to exponential backoff
+
+        if match := _RETRY_IN_PATTERN.search(str(e)):
+            value, unit = match.groups()
+            return float(value) / 1000 if unit in ("ms", "milliseconds") else float(value)
+    return None
+
+
+def estimate_request_tokens(context: ChatContext) -> int:
+    """Rough input + output token count of a chat request, to budget it before sending it"""
+    chars = len(context.chat_options.instructions or "")
+    n_images = 0
+
+    for message in context.messages:
+        for content in message.contents:
+            if isinstance(content, TextContent):
+                chars += len(content.text)
+            elif isinstance(content, DataContent):
+                n_images += 1
+
+    return (
+        chars // CHARS_PER_TOKEN + n_images * IMAGE_TOKENS + (context.chat_options.max_tokens or 0)
+    )
+
+
+class RateLimitMiddleware(ChatMiddleware):
+    """Chat middleware sending requests through the `AdaptiveRateLimiter` of their model
+    deployment, as each deployment has its own quota.
+
+    Put this middleware after any cache so that cached responses do not wait for the limiter.
+    Sets `queue_wait_seconds` and `retries` in the context metadata for the middleware that run
+    before it. Streamed responses hold their slot until the stream ends, and set the metadata
+    once it does.
+
+    :param limiter: Function creating the limiter of a model deployment, called with the
+        deployment name on its first request. A single limiter is shared by every deployment.
+
+    Example:
+        RateLimitMiddleware(lambda model: AdaptiveRateLimiter(**QUOTAS.get(model, {})))
+    """
+
+    def __init__(self, limiter: AdaptiveRateLimiter | Callable[[str | None], AdaptiveRateLimiter]):
+        self._create_limiter = limiter if callable(limiter) else lambda model: limiter
+        # Limiter of each model deployment that was sent a request, by deployment name
+        self.limiters: dict[str | None, AdaptiveRateLimiter] = {}
+
+    def limiter_for(self, context: ChatContext) -> AdaptiveRateLimiter:
+        model = context.chat_options.model_id or getattr(context.chat_client, "model_id", None)
+        if model not in self.limiters:
+            self.limiters[model] = self._create_limiter(model)
+        return self.limiters[model]
+
+    def _record_usage(
+        self, limiter: AdaptiveRateLimiter, estimated_tokens: int, usage: UsageDetails | None
+    ) -> None:
+        if usage is not None and usage.total_token_count is not None:
+            limiter.record_usage(estimated_tokens, usage.total_token_count)
+
+    async def _stream(
+        self,
+        context: ChatContext,
+        next: Callable[[ChatContext], Awaitable[None]],
+        limiter: AdaptiveRateLimiter,
+        estimated_tokens: int,
+    ) -> AsyncIterator[ChatResponseUpdate]:
+        queued_at = time.perf_counter()
+        n_attempts = 0
+
+        async def stream_response() -> AsyncIterator[ChatResponseUpdate]:
+            nonlocal n_attempts
+            if n_attempts == 0:
+                context.metadata["queue_wait_seconds"] = time.perf_counter() - queued_at
+            n_attempts += 1
+            await next(context)
+            async for update in context.result:  # type: ignore[union-attr]
+                yield update
+
+        try:
+            async for update in limiter.stream(stream_response, estimated_tokens):
+                for content in update.contents:
+                    if isinstance(content, UsageContent):
+                        self._record_usage(limiter, estimated_tokens, content.details)
+                yield update
+        finally:
+            context.metadata["retries"] = max(n_attempts - 1, 0)
+
+    async def process(
+        self,
+        context: ChatContext,
+        next: Callable[[ChatContext], Awaitable[None]],
+    ) -> None:
+        limiter = self.limiter_for(context)
+        estimated_tokens = estimate_request_tokens(context)
+
+        if context.is_streaming:
+            # The request is only sent once the stream is consumed, after this returns
+            context.result = self._stream(context, next, limiter, estimated_tokens)
+            return
+
+        queued_at = time.perf_counter()
+        n_attempts = 0
+
+        async def send_request() -> None:
+            nonlocal n_attempts
+            if n_attempts == 0:
+                context.metadata["queue_wait_seconds"] = time.perf_counter() - queued_at
+            n_attempts += 1
+            await next(context)
+
+        try:
+            await limiter.call(send_request, estimated_tokens)
+        finally:
+            context.metadata["retries"] = max(n_attempts - 1, 0)
+
+        if isinstance(context.result, ChatResponse):
+            self._record_usage(limiter, estimated_tokens, context.result.usage_details)
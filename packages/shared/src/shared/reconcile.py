@@ -0,0 +1,95 @@
+import re
+from collections.abc import Callable, Hashable, Iterable
+
+from shared.materiality_models import FINANCIAL_METRIC, FINANCIAL_METRICS, METRIC_ALIASES
+
+# The canonical names are aliases too, e.g. "TFD/EBITDA (x)"
+_ALIAS_TO_METRIC: dict[str, FINANCIAL_METRIC] = {
+    alias: metric
+    for metric in FINANCIAL_METRICS
+    for alias in (metric.lower(), *METRIC_ALIASES.get(metric, ()))
+}
+# Longest aliases first, so that "net debt/ebitda" is matched rather than "ebitda"
+_ALIAS_PATTERN = re.compile(
+    r"(?<!\w)(?:"
+    + "|".join(re.escape(alias) for alias in sorted(_ALIAS_TO_METRIC, key=len, reverse=True))
+    + r")(?!\w)",
+    re.IGNORECASE,
+)
+_PCT_PATTERN = re.compile(r"([+\-−]?\d+(?:\.\d+)?)\s?(?:%|per ?cent|pct)", re.IGNORECASE)
+_DECREASE_PATTERN = re.compile(r"\b(?:decrease|decline|fell|fall|drop|lower|down|reduc)", re.I)
+# A direction word only applies to the percentage of its own clause, e.g. not in
+# "EBITDA increased 5% despite a decrease in sales"
+_CLAUSE_BREAK_PATTERN = re.compile(
+    r"[,;:()]|\b(?:despite|while|whereas|but|although|though|with|against|offset)\b", re.I
+)
+# Words before a percentage that can give its direction, e.g. "fell sharply from last year by"
+_DIRECTION_WORDS_BEFORE = 6
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_LETTERS_PATTERN = re.compile(r"[a-z]+")
+
+
+def match_metric(text: str) -> FINANCIAL_METRIC | None:
+    """Financial metric of the vocabulary first mentioned in `text`, if any"""
+    if (match := _ALIAS_PATTERN.search(text)) is None:
+        return None
+    return _ALIAS_TO_METRIC[match.group().lower()]
+
+
+def _describes_decrease(text: str, pct_match: re.Match[str]) -> bool:
+    """Whether a decrease word governs the matched percentage: a few words before it in the
+    same clause, as in "fell by 8%", or the word right after it, as in "8% lower" """
+    before = _CLAUSE_BREAK_PATTERN.split(text[: pct_match.start()])[-1]
+    after = _CLAUSE_BREAK_PATTERN.split(text[pct_match.end() :])[0]
+    words = [
+        *_WORD_PATTERN.findall(before.lower())[-_DIRECTION_WORDS_BEFORE:],
+        *_WORD_PATTERN.findall(after.lower())[:1],
+    ]
+    return any(_DECREASE_PATTERN.match(word) for word in words)
+
+
+def extract_yoy_pct(text: str) -> float | None:
+    """First percentage in `text`, negative when the text describes it as a decrease"""
+    if (match := _PCT_PATTERN.search(text)) is None:
+        return None
+
+    value = float(match.group(1).replace("−", "-"))
+    if value > 0 and not match.group(1).startswith("+") and _describes_decrease(text, match):
+        value = -value
+    return value
+
+
+def duplicate_key(text: str, pct_tolerance: float = 0.5) -> Hashable:
+    """Key shared by the descriptions of the same change.
+
+    Changes of a known metric share a key whatever their wording, so that there is one per
+    metric. Other changes share a key when they have the same words and percentage, with the
+    percentage compared within `pct_tolerance` (bucketed, so values close to a bucket edge
+    can still be told apart).
+    """
+    if (metric := match_metric(text)) is not None:
+        return metric
+
+    pct = extract_yoy_pct(text)
+    return (
+        frozenset(_LETTERS_PATTERN.findall(text.lower())),
+        round(pct / pct_tolerance) if pct is not None else None,
+    )
+
+
+def group_duplicates[T](items: Iterable[T], key: Callable[[T], Hashable]) -> list[list[T]]:
+    """Groups items by key in a single pass, in order of first occurrence"""
+    groups: dict[Hashable, list[T]] = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return list(groups.values())
+
+
+def unique_by[T](items: Iterable[T], key: Callable[[T], Hashable]) -> list[T]:
+    """First item of each key, in order"""
+    return [group[0] for group in group_duplicates(items, key)]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase words only, to compare texts that differ by punctuation or spacing"""
+    return " ".join(_WORD_PATTERN.findall(text.lower()))
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
+from pathlib import Path
+from typing import Any, Literal, get_args
+
+from agent_framework import (
+    ChatContext,
+    ChatMiddleware,
+    ChatResponse,
+    ChatResponseUpdate,
+    UsageContent,
+)
+
+logger = logging.getLogger(__name__)
+
+# - "read_write": serve cached responses, call the model and cache the response on a miss
+# - "record": always call the model and (re)cache its response
+# - "replay": only serve cached responses, a miss is an error. Lets tests run offline.
+# - "off": always call the model, never touch the cache
+type CACHE_MODE = Literal["read_write", "record", "replay", "off"]
+CACHE_MODES: tuple[CACHE_MODE, ...] = get_args(CACHE_MODE.__value__)
+
+DEFAULT_MAX_BYTES = 1024**3
+
+
+class ResponseCacheMissError(LookupError):
+    """Raised in "replay" mode when a request has no cached response"""
+
+
+def _content_key(content: dict[str, Any]) -> dict[str, Any]:
+    # Hash inline payloads (page images) instead of keeping megabytes of base64 in the key
+    uri = content.get("uri")
+    if isinstance(uri, str) and uri.startswith("data:"):
+        content = {**content, "uri": hashlib.sha256(uri.encode()).hexdigest()}
+    return content
+
+
+def request_cache_key(context: ChatContext) -> str:
+    """Hash of everything that determines the response of a chat request"""
+    chat_options = context.chat_options
+    response_format = chat_options.response_format
+
+    request = {
+        "model": chat_options.model_id or getattr(context.chat_client, "model_id", None),
+        "instructions": chat_options.instructions,
+        "messages": [
+            {
+                "role": str(message.role),
+                "contents": [_content_key(content.to_dict()) for content in message.contents],
+            }
+            for message in context.messages
+        ],
+        "response_format": response_format.model_json_schema() if response_format else None,
+        "temperature": chat_options.temperature,
+        "top_p": chat_options.top_p,
+        "seed": chat_options.seed,
+        "max_tokens": chat_options.max_tokens,
+    }
+
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResponseCache:
+    """SQLite store of chat responses with a time to live and least recently used eviction"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        ttl_seconds: float | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(db_path, isolation_level=None)
+        # Several processes can share the same cache
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                size_bytes INTEGER NOT NULL
+            )
+            """
+        )
+
+    def get(self, key: str) -> str | None:
+        row = self._connection.execute(
+            "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        response, created_at = row
+        now = time.time()
+
+        if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+
+        self._connection.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+        return response
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, response, now, now, len(response.encode())),
+        )
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used responses until the cache fits in `max_bytes`"""
+        (total_bytes,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM responses"
+        ).fetchone()
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Keep the most recently used responses that fit in the budget
+        self._connection.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM (
+                    SELECT
+                        key,
+                        SUM(size_bytes) OVER (ORDER BY last_used_at DESC) AS cumulative_bytes
+                    FROM responses
+                )
+                WHERE cumulative_bytes > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+async def _replay_stream(response: ChatResponse) -> AsyncIterator[ChatResponseUpdate]:
+    for message in response.messages:
+        yield ChatResponseUpdate(
+            role=message.role,
+            contents=message.contents,
+            response_id=response.response_id,
+            model_id=response.model_id,
+        )
+    if response.usage_details is not None:
+        yield ChatResponseUpdate(contents=[UsageContent(details=response.usage_details)])
+
+
+class ResponseCacheMiddleware(ChatMiddleware):
+    """Chat middleware serving responses of identical requests from a `ResponseCache`.
+
+    Requests are keyed by model deployment, instructions, messages (with inline images
+    hashed), response format schema and sampling options. Streamed responses are cached once
+    the stream ends, and cached responses are replayed as a stream to streaming requests.
+    Sets `cache_hit` in the context metadata for the middleware that run before it.
+
+    Example:
+        get_agent_client(middleware=[ResponseCacheMiddleware(ResponseCache(path))])
+    """
+
+    def __init__(self, cache: ResponseCache, mode: CACHE_MODE | None = None):
+        self.cache = cache
+        # The mode can be switched without code changes, e.g. to replay in CI
+        mode = mode or os.getenv("LLM_RESPONSE_CACHE_MODE", "read_write")  # type: ignore[assignment]
+        if mode not in CACHE_MODES:
+            raise ValueError(
+                f"Invalid response cache mode {mode!r}, expected one of {', '.join(CACHE_MODES)}"
+            )
+        self.mode: CACHE_MODE = mode
+
+    def _put(self, key: str, response: ChatResponse) -> None:
+        cached = response.to_dict(exclude={"raw_representation"})
+        # The structured output is parsed again from the text on a hit. `exclude` cannot be
+        # used for it as it applies to nested objects too, which also have `value` fields.
+        cached.pop("value", None)
+        self.cache.put(key, json.dumps(cached))
+
+    async def _caching_stream(
+        self, key: str, updates: AsyncIterable[ChatResponseUpdate]
+    ) -> AsyncIterator[ChatResponseUpdate]:
+        received: list[ChatResponseUpdate] = []
+        async for update in updates:
+            received.append(update)
+            yield update
+
+        # Only reached when the whole response was streamed
+        self._put(key, ChatResponse.from_chat_response_updates(received))
+
+    async def process(
+        self,
+        context: ChatContext,
+        next: Callable[[ChatContext], Awaitable[None]],
+    ) -> None:
+        if self.mode == "off":
+            await next(context)
+            return
+
+        key = request_cache_key(context)
+
+        if self.mode in ("read_write", "replay") and (cached := self.cache.get(key)) is not None:
+            response = ChatResponse.from_dict(json.loads(cached))
+            if context.chat_options.response_format is not None:
+                response.try_parse_value(context.chat_options.response_format)
+
+            logger.debug(f"Response cache hit for request {key}")
+            context.metadata["cache_hit"] = True
+            context.result = _replay_stream(response) if context.is_streaming else response
+            context.terminate = True
+            return
+
+        if self.mode == "replay":
+            raise ResponseCacheMissError(f"No cached response for request {key}")
+
+        context.metadata["cache_hit"] = False
+        await next(context)
+
+        if context.is_streaming and context.result is not None:
+            context.result = self._caching_stream(key, context.result)  # type: ignore[arg-type]
+        elif isinstance(context.result, ChatResponse):
+            self._put(key, context.result)
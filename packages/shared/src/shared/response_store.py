@@ -0,0 +1,111 @@
+import logging
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from shared.materiality_models import FINANCIAL_METRICS, MaterialChange
+
+logger = logging.getLogger(__name__)
+
+# Categories are fixed by the literal, so batches of different files concatenate without
+# falling back to object columns
+METRIC_NAME_DTYPE = pd.CategoricalDtype(list(FINANCIAL_METRICS))
+
+DEFAULT_BATCH_SIZE = 100_000
+
+
+def company_id_from_path(path: Path) -> int | str:
+    """Company id of a `materiality_response_{id}.json` file"""
+    company_id = path.stem.rsplit("_", 1)[-1]
+    return int(company_id) if company_id.isdigit() else company_id
+
+
+def _to_batch(ids: list[int | str], names: list[str], values: list[float]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "name": pd.Categorical(names, dtype=METRIC_NAME_DTYPE),
+            "latest_yoy_pct": np.array(values, dtype=np.float64),
+        }
+    )
+
+
+def iter_response_batches(
+    paths: Iterable[Path],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """Streams JSON lines agent responses into DataFrames of at most `batch_size` rows.
+
+    Each line is validated against `MaterialChange`. Invalid lines are logged and skipped, so
+    that one bad response does not fail the evaluation of every company.
+
+    :param paths: `materiality_response_{id}.json` files, one per company.
+    """
+    ids: list[int | str] = []
+    names: list[str] = []
+    values: list[float] = []
+
+    for path in paths:
+        company_id = company_id_from_path(path)
+
+        with open(path, "rb") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    material_change = MaterialChange.model_validate_json(line)
+                except ValueError as e:
+                    logger.warning(f"Skipping invalid response at {path}:{line_number}: {e}")
+                    continue
+
+                ids.append(company_id)
+                names.append(material_change.name)
+                values.append(material_change.latest_yoy_pct)
+
+                if len(ids) == batch_size:
+                    yield _to_batch(ids, names, values)
+                    ids, names, values = [], [], []
+
+    if ids:
+        yield _to_batch(ids, names, values)
+
+
+def load_responses(paths: Iterable[Path], batch_size: int = DEFAULT_BATCH_SIZE) -> pd.DataFrame:
+    """Agent responses of many companies in one DataFrame, with `name` as a categorical"""
+    batches = list(iter_response_batches(paths, batch_size))
+    if not batches:
+        return _to_batch([], [], [])
+    return pd.concat(batches, ignore_index=True)
+
+
+def write_responses(batches: Iterable[pd.DataFrame], path: Path) -> None:
+    """Writes response batches to a Parquet (`.parquet`) or Arrow IPC (`.arrow`) file one batch
+    at a time, so that the responses never need to fit in memory. Requires `pyarrow`."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    batches = iter(batches)
+    # The schema of the file is taken from the first batch, an empty one if there is none
+    first_batch = next(batches, None)
+    first_table = pa.Table.from_pandas(
+        first_batch if first_batch is not None else _to_batch([], [], []), preserve_index=False
+    )
+
+    if path.suffix == ".parquet":
+        writer = pq.ParquetWriter(path, first_table.schema)
+    else:
+        writer = pa.ipc.new_file(path, first_table.schema)
+
+    with writer:
+        writer.write_table(first_table)
+        for batch in batches:
+            writer.write_table(pa.Table.from_pandas(batch, preserve_index=False))
+
+
+def read_responses(path: Path) -> pd.DataFrame:
+    """Reads responses written by `write_responses`. Requires `pyarrow`."""
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_feather(path)
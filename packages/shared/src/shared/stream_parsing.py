@@ -0,0 +1,90 @@
+import json
+import logging
+from collections.abc import AsyncIterable, AsyncIterator
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+class JsonArrayItemParser:
+    """Incremental parser of a JSON object streamed in chunks, returning the JSON text of each
+    object in the array of the top-level `array_key` as soon as the object is complete.
+
+    Example:
+        parser = JsonArrayItemParser("material_changes")
+        parser.feed('{"material_changes": [{"a": 1}, {"a"')  # ['{"a": 1}']
+        parser.feed(": 2}]}")  # ['{"a": 2}']
+    """
+
+    def __init__(self, array_key: str):
+        self.array_key = array_key
+        # Opening brackets of the containers the parser is in
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._key_chars: list[str] = []
+        self._last_key: str | None = None
+        self._in_array = False
+        self._item_chars: list[str] | None = None
+
+    def feed(self, chunk: str) -> list[str]:
+        items: list[str] = []
+
+        for char in chunk:
+            if self._item_chars is not None:
+                self._item_chars.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        # Strings of the top-level object are keys or values, the last one
+                        # before an array is its key
+                        self._last_key = json.loads('"' + "".join(self._key_chars) + '"')
+                    continue
+                if len(self._stack) == 1:
+                    self._key_chars.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._key_chars = []
+            elif char in "{[":
+                self._stack.append(char)
+                if len(self._stack) == 2 and char == "[" and self._last_key == self.array_key:
+                    self._in_array = True
+                elif self._in_array and len(self._stack) == 3 and char == "{":
+                    self._item_chars = [char]
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._item_chars is not None and len(self._stack) == 2:
+                    items.append("".join(self._item_chars))
+                    self._item_chars = None
+                elif self._in_array and len(self._stack) == 1:
+                    self._in_array = False
+
+        return items
+
+
+async def aiter_array_items[T: BaseModel](
+    chunks: AsyncIterable[str],
+    item_model: type[T],
+    array_key: str,
+) -> AsyncIterator[T]:
+    """Validates each object of the `array_key` array of a streamed JSON response into
+    `item_model` as soon as it is complete. Items that do not validate are logged and skipped.
+    """
+    parser = JsonArrayItemParser(array_key)
+
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            try:
+                yield item_model.model_validate_json(item)
+            except ValidationError as e:
+                logger.warning(f"Skipping invalid {item_model.__name__} in the response: {e}")
@@ -0,0 +1,100 @@
+import logging
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from pdfplumber.page import Page
+
+from shared.rasterize import map_pages
+
+logger = logging.getLogger(__name__)
+
+# Below this many characters outside tables, a page is considered to be a scan or a chart
+MIN_TEXT_CHARS = 200
+# Above this share of the page covered by tables, the layout matters more than the text
+MAX_TABLE_AREA_RATIO = 0.3
+
+
+@dataclass(frozen=True)
+class PageText:
+    page_number: int
+    text: str
+    tables: list[str]
+    table_area_ratio: float
+
+    def needs_image(
+        self,
+        min_text_chars: int = MIN_TEXT_CHARS,
+        max_table_area_ratio: float = MAX_TABLE_AREA_RATIO,
+    ) -> bool:
+        """Whether the text layer alone is not enough to understand the page"""
+        is_image_only = len(self.text.strip()) < min_text_chars and not self.tables
+        is_table_heavy = self.table_area_ratio > max_table_area_ratio
+        return is_image_only or is_table_heavy
+
+    def to_prompt_text(self) -> str:
+        return "\n\n".join(part for part in (self.text.strip(), *self.tables) if part)
+
+
+def table_to_markdown(rows: list[list[str | None]]) -> str:
+    cells = [[(cell or "").replace("\n", " ").strip() for cell in row] for row in rows if row]
+    if not cells:
+        return ""
+
+    header, *body = cells
+    lines = [
+        f"| {' | '.join(header)} |",
+        f"|{'---|' * len(header)}",
+        *(f"| {' | '.join(row)} |" for row in body),
+    ]
+    return "\n".join(lines)
+
+
+def _extract_page_text(page: Page) -> PageText:
+    tables = page.find_tables()
+    table_bboxes = [table.bbox for table in tables]
+
+    def is_outside_tables(obj: dict[str, Any]) -> bool:
+        return not any(
+            x0 <= obj["x0"] and obj["x1"] <= x1 and top <= obj["top"] and obj["bottom"] <= bottom
+            for x0, top, x1, bottom in table_bboxes
+        )
+
+    # Table content is extracted separately, keeping its rows and columns
+    text = page.filter(is_outside_tables).extract_text() if tables else page.extract_text()
+    table_area = sum((x1 - x0) * (bottom - top) for x0, top, x1, bottom in table_bboxes)
+
+    return PageText(
+        page_number=page.page_number,
+        text=text,
+        tables=[markdown for table in tables if (markdown := table_to_markdown(table.extract()))],
+        table_area_ratio=table_area / (page.width * page.height),
+    )
+
+
+def iter_page_texts(
+    pdf_path: Path,
+    max_workers: int | None = None,
+    page_numbers: Iterable[int] | None = None,
+) -> Iterator[PageText]:
+    """Extract the text layer and tables of PDF pages, yielding each page as soon as it is done"""
+    yield from map_pages(
+        pdf_path,
+        _extract_page_text,
+        max_workers=max_workers,
+        page_numbers=page_numbers,
+    )
+
+
+def extract_page_texts(
+    pdf_path: Path,
+    max_workers: int | None = None,
+    page_numbers: Iterable[int] | None = None,
+) -> dict[int, PageText]:
+    """Extract the text layer and tables of PDF pages, by page number"""
+    page_texts = sorted(
+        iter_page_texts(pdf_path, max_workers, page_numbers),
+        key=lambda page_text: page_text.page_number,
+    )
+    return {page_text.page_number: page_text for page_text in page_texts}
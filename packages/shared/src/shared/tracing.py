@@ -0,0 +1,237 @@
+import json
+import logging
+import math
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from agent_framework import (
+    ChatContext,
+    ChatMiddleware,
+    ChatResponse,
+    ChatResponseUpdate,
+    DataContent,
+    TextContent,
+    UsageContent,
+    UsageDetails,
+)
+
+from shared.logging import azureml_logger
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class CallTrace:
+    started_at: float
+    model: str | None
+    latency_seconds: float
+    queue_wait_seconds: float | None = None
+    # Streamed responses only
+    first_token_seconds: float | None = None
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    total_tokens: int | None = None
+    payload_bytes: int = 0
+    n_images: int = 0
+    retries: int = 0
+    cache_hit: bool | None = None
+    error: str | None = None
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile, i.e. the smallest value with at least `p`% of values below it"""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class Tracer:
+    """Records one `CallTrace` per model call, and aggregates them into run metrics.
+
+    :param trace_path: JSON lines file to append each call trace to, if any.
+    """
+
+    def __init__(self, trace_path: Path | None = None):
+        self.trace_path = trace_path
+        self.traces: list[CallTrace] = []
+
+        if trace_path is not None:
+            trace_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def record(self, trace: CallTrace) -> None:
+        self.traces.append(trace)
+
+        if self.trace_path is not None:
+            with open(self.trace_path, "a") as f:
+                f.write(json.dumps(asdict(trace)) + "\n")
+
+    def metrics(self) -> dict[str, float]:
+        """Totals and p50/p95/p99 of the calls recorded so far"""
+        traces = self.traces
+        # Cached responses keep the usage of the call that cached them, and would skew latency
+        model_calls = [trace for trace in traces if not trace.cache_hit]
+
+        metrics: dict[str, float] = {
+            "llm_calls": len(traces),
+            "llm_errors": sum(trace.error is not None for trace in traces),
+            "llm_cache_hits": len(traces) - len(model_calls),
+            "llm_retries": sum(trace.retries for trace in traces),
+            "llm_input_tokens": sum(trace.input_tokens or 0 for trace in model_calls),
+            "llm_output_tokens": sum(trace.output_tokens or 0 for trace in model_calls),
+            "llm_payload_bytes": sum(trace.payload_bytes for trace in traces),
+        }
+
+        distributions = {
+            "latency_seconds": [trace.latency_seconds for trace in model_calls],
+            "queue_wait_seconds": [
+                trace.queue_wait_seconds for trace in traces if trace.queue_wait_seconds is not None
+            ],
+            "first_token_seconds": [
+                trace.first_token_seconds
+                for trace in model_calls
+                if trace.first_token_seconds is not None
+            ],
+            "total_tokens": [
+                trace.total_tokens for trace in model_calls if trace.total_tokens is not None
+            ],
+            "payload_bytes": [trace.payload_bytes for trace in traces],
+        }
+        for name, values in distributions.items():
+            if values:
+                for p in PERCENTILES:
+                    metrics[f"llm_{name}_p{p}"] = percentile(values, p)
+
+        return metrics
+
+    def log_metrics(self) -> None:
+        """Sends the run metrics to Azure ML when running in a job, or stderr locally"""
+        azureml_logger.log_metrics(self.metrics())
+
+
+def payload_size(context: ChatContext) -> tuple[int, int]:
+    """Bytes of text and inline data sent in a chat request, and the number of images in it"""
+    payload_bytes = len((context.chat_options.instructions or "").encode())
+    n_images = 0
+
+    for message in context.messages:
+        for content in message.contents:
+            if isinstance(content, TextContent):
+                payload_bytes += len(content.text.encode())
+            elif isinstance(content, DataContent):
+                payload_bytes += len(content.uri)
+                n_images += 1
+
+    return payload_bytes, n_images
+
+
+class TracingMiddleware(ChatMiddleware):
+    """Chat middleware recording the latency, token usage and payload of every call in a `Tracer`.
+
+    Put it first in the middleware list so that the latency includes the time spent in the
+    other middleware, and so that it sees the `cache_hit`, `queue_wait_seconds` and `retries`
+    they set in the context metadata. Streamed responses are recorded once the stream ends,
+    with the time to their first update.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    def _record(
+        self,
+        context: ChatContext,
+        started_at: float,
+        start: float,
+        payload: tuple[int, int],
+        usage: UsageDetails | None,
+        error: str | None,
+        first_token_seconds: float | None = None,
+    ) -> None:
+        payload_bytes, n_images = payload
+        trace = CallTrace(
+            started_at=started_at,
+            model=context.chat_options.model_id or getattr(context.chat_client, "model_id", None),
+            latency_seconds=time.perf_counter() - start,
+            queue_wait_seconds=context.metadata.get("queue_wait_seconds"),
+            first_token_seconds=first_token_seconds,
+            payload_bytes=payload_bytes,
+            n_images=n_images,
+            retries=context.metadata.get("retries", 0),
+            cache_hit=context.metadata.get("cache_hit"),
+            error=error,
+        )
+
+        if usage is not None:
+            trace.input_tokens = usage.input_token_count
+            trace.output_tokens = usage.output_token_count
+            trace.total_tokens = usage.total_token_count
+
+        logger.debug(f"LLM call took {trace.latency_seconds:.2f}s: {trace}")
+        self.tracer.record(trace)
+
+    async def _traced_stream(
+        self,
+        context: ChatContext,
+        updates: AsyncIterable[ChatResponseUpdate],
+        started_at: float,
+        start: float,
+        payload: tuple[int, int],
+    ) -> AsyncIterator[ChatResponseUpdate]:
+        first_token_seconds = None
+        usage = None
+        error = None
+
+        try:
+            async for update in updates:
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                for content in update.contents:
+                    if isinstance(content, UsageContent):
+                        usage = content.details
+                yield update
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            # Also recorded when the consumer stops reading early
+            self._record(context, started_at, start, payload, usage, error, first_token_seconds)
+
+    async def process(
+        self,
+        context: ChatContext,
+        next: Callable[[ChatContext], Awaitable[None]],
+    ) -> None:
+        payload = payload_size(context)
+        started_at = time.time()
+        start = time.perf_counter()
+
+        streamed = False
+        error = None
+
+        try:
+            await next(context)
+            if context.is_streaming and context.result is not None:
+                # Streamed responses are traced once the stream ends
+                context.result = self._traced_stream(
+                    context,
+                    context.result,  # type: ignore[arg-type]
+                    started_at,
+                    start,
+                    payload,
+                )
+                streamed = True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if not streamed:
+                usage = (
+                    context.result.usage_details
+                    if isinstance(context.result, ChatResponse)
+                    else None
+                )
+                self._record(context, started_at, start, payload, usage, error)
@@ -0,0 +1,30 @@
+from collections.abc import Callable, Sequence
+from pathlib import Path
+
+import pymupdf
+import pytest
+
+
+@pytest.fixture
+def make_pdf() -> Callable[..., Path]:
+    """Builds a PDF with one text per page, "Page N" by default"""
+
+    def make_pdf(
+        path: Path,
+        n_pages: int = 1,
+        texts: Sequence[str] | None = None,
+        page_size: tuple[float, float] = (200, 200),
+    ) -> Path:
+        """:param texts: Text of each page, overrides `n_pages`. Pages with an empty text have
+        no text layer, like scanned pages."""
+        width, height = page_size
+        doc = pymupdf.open()
+        for text in texts if texts is not None else [f"Page {n}" for n in range(1, n_pages + 1)]:
+            page = doc.new_page(width=width, height=height)
+            if text:
+                page.insert_textbox(pymupdf.Rect(20, 20, width - 20, height - 20), text)
+        doc.save(path)
+        doc.close()
+        return path
+
+    return make_pdf
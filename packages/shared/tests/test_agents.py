@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from agent_framework.azure import AzureAIAgentClient
+
+from shared.agents import close_clients, get_agent_client
+from shared.tracing import Tracer, TracingMiddleware
+
+
+def test_agent_clients_are_pooled_per_deployment(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    monkeypatch.setenv("AZURE_AI_PROJECT_ENDPOINT", "https://example.services.ai.azure.com/api")
+    middleware = [TracingMiddleware(Tracer(tmp_path / "trace.jsonl"))]
+
+    async def get_clients():
+        clients = [
+            get_agent_client("gpt-4.1"),
+            get_agent_client("gpt-4.1"),
+            get_agent_client("gpt-4.1-mini"),
+            get_agent_client("gpt-4.1", middleware=middleware),
+            get_agent_client("gpt-4.1", middleware=middleware),
+        ]
+        await close_clients()
+        # Closed clients are not handed out again
+        clients.append(get_agent_client("gpt-4.1"))
+        await close_clients()
+        return clients
+
+    clients = asyncio.run(get_clients())
+    first, same, other_deployment, with_middleware, same_middleware, reopened = clients
+
+    assert first is same
+    assert with_middleware is same_middleware
+    assert len({id(first), id(other_deployment), id(with_middleware)}) == 3
+    # The HTTP connection pool is shared by every deployment of the project
+    assert isinstance(first, AzureAIAgentClient)
+    assert isinstance(other_deployment, AzureAIAgentClient)
+    assert isinstance(with_middleware, AzureAIAgentClient)
+    assert first.agents_client is other_deployment.agents_client is with_middleware.agents_client
+    assert reopened is not first
@@ -0,0 +1,84 @@
+import asyncio
+
+from shared.async_utils import gather_until, merge_streams
+
+
+def test_gather_until_cancels_the_remaining_work():
+    started: list[int] = []
+
+    async def work(i: int) -> int:
+        started.append(i)
+        await asyncio.sleep(0.01 * i)
+        return i
+
+    results = asyncio.run(gather_until([work(i) for i in (1, 2, 50, 60)], lambda i: i == 2))
+
+    assert started == [1, 2, 50, 60]
+    assert results == [1, 2, None, None]
+
+
+def test_gather_until_only_starts_work_while_it_should_not_stop():
+    started: list[int] = []
+
+    async def work(i: int) -> int:
+        started.append(i)
+        await asyncio.sleep(0.01 * (i + 1))
+        return i
+
+    results = asyncio.run(
+        gather_until([work(i) for i in range(6)], lambda i: i == 2, max_in_flight=2)
+    )
+
+    # 2 is done while 3 is in flight, so 3 is cancelled and 4 and 5 are never started
+    assert started == [0, 1, 2, 3]
+    assert results == [0, 1, 2, None, None, None]
+
+
+def test_merge_streams_yields_items_as_they_arrive_and_cancels_on_break():
+    closed: list[int] = []
+
+    async def stream(i: int, items: list[tuple[float, str]]):
+        try:
+            for delay, item in items:
+                await asyncio.sleep(delay)
+                yield item
+        finally:
+            closed.append(i)
+
+    async def main() -> list[tuple[int, str]]:
+        merged = merge_streams(
+            [stream(0, [(0.01, "a"), (0.04, "c")]), stream(1, [(0.03, "b"), (10, "d")])]
+        )
+        items = []
+        async for index_item in merged:
+            items.append(index_item)
+            if len(items) == 3:
+                break
+        await merged.aclose()
+        return items
+
+    assert asyncio.run(main()) == [(0, "a"), (1, "b"), (0, "c")]
+    # The stream still generating was cancelled rather than awaited
+    assert sorted(closed) == [0, 1]
+
+
+def test_merge_streams_starts_the_next_stream_once_another_is_exhausted():
+    started: list[int] = []
+
+    async def stream(i: int):
+        started.append(i)
+        await asyncio.sleep(0.01)
+        yield i
+
+    async def main() -> list[tuple[int, int]]:
+        items = []
+        merged = merge_streams([stream(i) for i in range(4)], max_in_flight=2)
+        async for index_item in merged:
+            items.append(index_item)
+            if len(items) == 1:
+                # Only the first two streams have started so far
+                assert started == [0, 1]
+        return items
+
+    assert sorted(asyncio.run(main())) == [(i, i) for i in range(4)]
+    assert started == [0, 1, 2, 3]
@@ -0,0 +1,53 @@
+import time
+
+from shared.logging.azureml_logger import MetricBuffer, MetricRecord
+
+
+def records(n: int, step: int = 0) -> list[MetricRecord]:
+    return [MetricRecord(f"metric_{i}", float(i), 0, step) for i in range(n)]
+
+
+def test_metrics_are_written_in_batches_on_close():
+    batches: list[list[MetricRecord]] = []
+    buffer = MetricBuffer(batches.append, flush_interval_seconds=60, max_batch_size=4)
+
+    buffer.add(records(3, step=0))
+    buffer.add(records(3, step=1))
+    buffer.close()
+
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert [record.step for batch in batches for record in batch] == [0, 0, 0, 1, 1, 1]
+
+
+def test_metrics_are_written_in_the_background():
+    batches: list[list[MetricRecord]] = []
+    buffer = MetricBuffer(batches.append, flush_interval_seconds=0.01)
+
+    buffer.add(records(2))
+    deadline = time.monotonic() + 5
+    while not batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    buffer.close()
+
+    assert batches == [records(2)]
+
+
+def test_write_errors_do_not_fail_the_caller():
+    written: list[MetricRecord] = []
+    n_calls = 0
+
+    def write_batch(batch: list[MetricRecord]) -> None:
+        nonlocal n_calls
+        n_calls += 1
+        if n_calls == 1:
+            raise ConnectionError("MLflow is down")
+        written.extend(batch)
+
+    buffer = MetricBuffer(write_batch, flush_interval_seconds=60)
+    buffer.add(records(1))
+    buffer.flush()
+    buffer.add(records(2))
+    buffer.close()
+
+    # The failed batch is dropped, later batches are still written
+    assert written == records(2)
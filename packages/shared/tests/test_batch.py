@@ -0,0 +1,64 @@
+import asyncio
+from pathlib import Path
+
+from shared.batch import BatchCheckpoint, list_documents, run_batch
+
+
+def test_list_documents_from_manifest(tmp_path: Path):
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# Annual reports\nreports/a.pdf\n\nb.pdf\n")
+
+    assert list_documents(manifest) == [tmp_path / "reports/a.pdf", tmp_path / "b.pdf"]
+
+
+def test_run_batch_resumes_from_checkpoint(tmp_path: Path):
+    documents = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.pdf"
+        path.write_text(name)
+        documents.append(path)
+
+    in_flight = 0
+    max_seen_in_flight = 0
+    processed: list[str] = []
+
+    async def process_document(path: Path, key: str) -> dict[str, str]:
+        nonlocal in_flight, max_seen_in_flight
+        in_flight += 1
+        max_seen_in_flight = max(max_seen_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+        if path.stem == "b":
+            raise RuntimeError("Extraction failed")
+        processed.append(path.stem)
+        return {"output": f"{path.stem}.csv"}
+
+    checkpoint_path = tmp_path / "checkpoint.jsonl"
+    summary = asyncio.run(
+        run_batch(documents, process_document, BatchCheckpoint(checkpoint_path), max_in_flight=2)
+    )
+
+    assert max_seen_in_flight == 2
+    assert sorted(path.stem for path in summary.completed) == ["a", "c"]
+    assert summary.failed == [tmp_path / "b.pdf"]
+
+    # A run interrupted while writing the checkpoint leaves an incomplete last line
+    with open(checkpoint_path, "a") as f:
+        f.write('{"key": "trunc')
+
+    processed.clear()
+    checkpoint = BatchCheckpoint(checkpoint_path)
+    summary = asyncio.run(run_batch(documents, process_document, checkpoint))
+
+    assert processed == []
+    assert sorted(path.stem for path in summary.skipped) == ["a", "c"]
+    assert sorted(record["output"] for record in summary.records.values()) == ["a.csv", "c.csv"]
+    assert sorted(record["output"] for record in checkpoint.records.values()) == ["a.csv", "c.csv"]
+
+    checkpoint.mark_done("d", output="d.csv")
+    assert BatchCheckpoint(checkpoint_path).is_done("d")
+
+    # Documents of previous batches are left out of the records of a smaller batch
+    summary = asyncio.run(run_batch(documents[:1], process_document, checkpoint))
+    assert [record["output"] for record in summary.records.values()] == ["a.csv"]
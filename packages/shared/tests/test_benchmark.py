@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from shared.benchmark import Measurement, best_of, find_regressions, load_results, save_results
+
+
+def test_results_round_trip(tmp_path: Path):
+    measurements = [
+        Measurement("evaluation_1000_rows", 150_000.0, "rows/s"),
+        Measurement("first_call", 0.2, "s", higher_is_better=False, tracked=False),
+    ]
+
+    save_results(tmp_path / "results.json", measurements)
+
+    assert list(load_results(tmp_path / "results.json").values()) == measurements
+
+
+def test_only_tracked_measurements_beyond_the_threshold_regress():
+    baseline = {
+        measurement.name: measurement
+        for measurement in [
+            Measurement("throughput", 100.0, "rows/s"),
+            Measurement("latency", 1.0, "s", higher_is_better=False),
+            Measurement("untracked", 100.0, "rows/s", tracked=False),
+            Measurement("slightly_slower", 100.0, "rows/s"),
+        ]
+    }
+    measurements = [
+        Measurement("throughput", 70.0, "rows/s"),
+        Measurement("latency", 1.5, "s", higher_is_better=False),
+        Measurement("untracked", 10.0, "rows/s", tracked=False),
+        Measurement("slightly_slower", 90.0, "rows/s"),
+        # Not in the baseline yet
+        Measurement("new", 1.0, "rows/s"),
+    ]
+
+    regressions = find_regressions(measurements, baseline, max_regression=0.2)
+
+    assert [regression.measurement.name for regression in regressions] == ["throughput", "latency"]
+    assert [round(regression.change, 2) for regression in regressions] == [-0.3, -0.5]
+
+
+def test_best_of_times_each_call():
+    calls = 0
+
+    def count():
+        nonlocal calls
+        calls += 1
+
+    assert best_of(count, repeat=3, number=10) >= 0
+    assert calls == 30
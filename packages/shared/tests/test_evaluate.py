@@ -1,8 +1,20 @@
 import json
 
+import numpy as np
 import pandas as pd
+import pytest
 
-from shared.evaluate import calculate_overall_metrics, create_evaluation_table
+from shared.evaluate import (
+    GroundTruthIndex,
+    calculate_overall_metrics,
+    create_evaluation_table,
+)
+from shared.metrics import (
+    compute_extraction_accuracy,
+    compute_match_metrics,
+    compute_precision,
+    compute_recall,
+)
 
 
 def test_smoke_evaluate():
@@ -31,3 +43,79 @@ def test_smoke_evaluate():
     metrics = calculate_overall_metrics(evaluation_df)
 
     assert len(metrics)
+
+
+def test_match_metrics_agree_with_pandas_metrics():
+    rng = np.random.default_rng(0)
+    expected = rng.choice([np.nan, 0.0, 10.0, 14.8], size=1000)
+    extracted = np.where(rng.random(1000) < 0.5, expected, rng.choice([np.nan, 4.0], size=1000))
+    data = pd.DataFrame({"expected_value": expected, "extracted_value": extracted})
+
+    metrics = compute_match_metrics(expected, extracted)
+
+    assert metrics["precision"] == pytest.approx(compute_precision(data))
+    assert metrics["recall"] == pytest.approx(compute_recall(data))
+    assert metrics["extraction_accuracy"] == pytest.approx(compute_extraction_accuracy(data))
+
+
+def test_match_metrics_tolerance():
+    expected = np.array([10.0, 14.8, np.nan, 5.0])
+    extracted = np.array([10.04, 15.2, 3.0, np.nan])
+
+    exact = compute_match_metrics(expected, extracted)
+    tolerant = compute_match_metrics(expected, extracted, atol=0.5)
+
+    assert exact["f1"] == 0.0
+    assert tolerant["precision"] == tolerant["recall"] == pytest.approx(2 / 3)
+    assert tolerant["f1"] == pytest.approx(2 / 3)
+    assert np.isnan(compute_match_metrics(np.array([]), np.array([]))["precision"])
+
+
+def test_ground_truth_index_matches_merged_evaluation():
+    ground_truth_df = pd.read_csv("packages/shared/tests/test_data/materiality_ground_truth.csv")
+    runs = {
+        "v1": pd.read_json(
+            "packages/shared/tests/test_data/materiality_response_1.json", lines=True
+        ).assign(id=1),
+        "v2": pd.concat(
+            [
+                pd.read_json(
+                    f"packages/shared/tests/test_data/materiality_response_{company_id}.json",
+                    lines=True,
+                ).assign(id=company_id)
+                for company_id in (1, 2)
+            ],
+            ignore_index=True,
+        ),
+    }
+    ground_truth = GroundTruthIndex(ground_truth_df)
+
+    by_run = ground_truth.evaluate(runs, yoy_pct_tolerance=0.5)
+    for run, agent_responses_df in runs.items():
+        expected = calculate_overall_metrics(
+            create_evaluation_table(ground_truth_df, agent_responses_df), yoy_pct_tolerance=0.5
+        )
+        assert by_run.loc[run, "precision"] == pytest.approx(expected["materiality_precision"])
+        assert by_run.loc[run, "recall"] == pytest.approx(expected["materiality_recall"])
+        assert by_run.loc[run, "f1"] == pytest.approx(expected["materiality_f1"])
+
+    by_run_and_name = ground_truth.evaluate(runs, group_by=["run", "name"])
+    assert by_run_and_name.index.names == ["run", "name"]
+    assert by_run_and_name.loc[("v2", "TFD/EBITDA (x)"), "n_expected"] == 1
+
+    by_name = ground_truth.evaluate(runs, group_by=["name"])
+    assert by_name["n_matches"].sum() == by_run_and_name["n_matches"].sum()
+    assert by_name.loc["Capital Expenditure", "n_expected"] == 2
+
+
+def test_ground_truth_index_evaluates_against_an_empty_ground_truth():
+    ground_truth = GroundTruthIndex(pd.DataFrame({"id": [], "name": [], "latest_yoy_pct": []}))
+    responses = pd.DataFrame(
+        {"id": ["1", "1"], "name": ["EBITDA", "Capex"], "latest_yoy_pct": [4.1, -2.0]}
+    )
+
+    by_run = ground_truth.evaluate({"v1": responses})
+
+    assert by_run.loc["v1", "n_extracted"] == 2
+    assert by_run.loc["v1", "n_matches"] == 0
+    assert by_run.loc["v1", "n_expected"] == 0
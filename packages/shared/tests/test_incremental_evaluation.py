@@ -0,0 +1,53 @@
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from shared import incremental_evaluation
+from shared.evaluate import calculate_overall_metrics, create_evaluation_table
+from shared.incremental_evaluation import evaluate_incrementally, overall_metrics_from_counts
+from shared.response_store import load_responses
+
+TEST_DATA_DIR = Path("packages/shared/tests/test_data")
+
+
+def _assert_matches_full_evaluation(counts: pd.DataFrame, ground_truth_df, paths):
+    expected = calculate_overall_metrics(
+        create_evaluation_table(
+            ground_truth_df, load_responses(paths).assign(name=lambda df: df["name"].astype(str))
+        )
+    )
+    metrics = overall_metrics_from_counts(counts)
+    for name in ("materiality_precision", "materiality_recall", "materiality_f1"):
+        assert metrics[name] == pytest.approx(expected[name])
+
+
+def test_only_changed_companies_are_recomputed(tmp_path: Path, monkeypatch):
+    ground_truth_df = pd.read_csv(TEST_DATA_DIR / "materiality_ground_truth.csv")
+    paths = []
+    for path in sorted(TEST_DATA_DIR.glob("materiality_response_*.json")):
+        paths.append(Path(shutil.copy(path, tmp_path)))
+    state_path = tmp_path / "state.json"
+
+    counts = evaluate_incrementally(ground_truth_df, paths, state_path)
+    _assert_matches_full_evaluation(counts, ground_truth_df, paths)
+
+    loaded: list[list[Path]] = []
+
+    def recording_load_responses(paths):
+        paths = list(paths)
+        loaded.append(paths)
+        return load_responses(paths)
+
+    monkeypatch.setattr(incremental_evaluation, "load_responses", recording_load_responses)
+
+    assert evaluate_incrementally(ground_truth_df, paths, state_path).equals(counts)
+    assert loaded == []
+
+    paths[1].write_text('{"name":"TFD/EBITDA (x)","latest_yoy_pct":14.8}\n')
+    counts = evaluate_incrementally(ground_truth_df, paths, state_path)
+
+    assert loaded == [[paths[1]]]
+    assert counts.loc["2", "n_matches"] == 1
+    _assert_matches_full_evaluation(counts, ground_truth_df, paths)
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from shared.agents import close_clients, get_agent_client
+from shared.mock_agents import MockAgentOptions, MockChatClient, MockServiceError
+from shared.rate_limit import AdaptiveRateLimiter, RateLimitMiddleware
+from shared.tracing import Tracer, TracingMiddleware
+
+NO_LATENCY = MockAgentOptions(latency_median_seconds=0)
+
+
+class Reference(BaseModel):
+    file_name: str
+    page_number: int
+
+
+class Change(BaseModel):
+    description: str
+    yoy_pct: float | None
+    references: list[Reference]
+
+
+class Report(BaseModel):
+    changes: list[Change]
+
+
+def test_responses_validate_into_the_response_format():
+    agent = MockChatClient(NO_LATENCY).create_agent(instructions="Extract", name="extraction")
+
+    response = asyncio.run(agent.run("Page 1: revenue up 5%", response_format=Report))
+
+    assert isinstance(response.value, Report)
+    assert 1 <= len(response.value.changes) <= NO_LATENCY.max_list_items
+    assert response.usage_details is not None
+    input_token_count = response.usage_details.input_token_count
+    assert input_token_count is not None and input_token_count > 0
+
+
+def test_responses_are_deterministic_per_request():
+    async def run(prompts: list[str]) -> dict[str, str]:
+        agent = MockChatClient(NO_LATENCY).create_agent(name="extraction")
+        responses = await asyncio.gather(
+            *(agent.run(prompt, response_format=Report) for prompt in prompts)
+        )
+        return {prompt: response.text for prompt, response in zip(prompts, responses)}
+
+    prompts = [f"Page {page}" for page in range(5)]
+    # Same outputs whatever the order the requests are sent in
+    assert asyncio.run(run(prompts)) == asyncio.run(run(prompts[::-1]))
+
+
+def test_throttled_requests_are_retried_by_the_rate_limiter():
+    tracer = Tracer()
+    limiter = AdaptiveRateLimiter(base_backoff_seconds=0.001, max_retries=20)
+    client = MockChatClient(
+        MockAgentOptions(latency_median_seconds=0, throttle_rate=0.5, retry_after_seconds=0),
+        middleware=[TracingMiddleware(tracer), RateLimitMiddleware(limiter)],
+    )
+    agent = client.create_agent(name="extraction")
+
+    async def main():
+        return await asyncio.gather(*(agent.run(f"Page {page}") for page in range(20)))
+
+    responses = asyncio.run(main())
+
+    assert all(response.text for response in responses)
+    assert limiter.n_throttled > 0
+    assert client.n_requests == 20 + limiter.n_retries
+    assert tracer.metrics()["llm_calls"] == 20
+
+
+def test_each_model_deployment_gets_its_own_rate_limiter():
+    quotas = {"gpt-4.1": 100.0, "gpt-4.1-mini": 500.0}
+
+    def create_rate_limiter(model: str | None) -> AdaptiveRateLimiter:
+        assert model is not None
+        return AdaptiveRateLimiter(requests_per_minute=quotas[model])
+
+    middleware = RateLimitMiddleware(create_rate_limiter)
+    options = MockAgentOptions(latency_median_seconds=0)
+    agents = {
+        model: MockChatClient(options, model_id=model, middleware=[middleware]).create_agent()
+        for model in quotas
+    }
+
+    async def main():
+        await asyncio.gather(*(agents["gpt-4.1"].run(f"Page {page}") for page in range(3)))
+        await agents["gpt-4.1-mini"].run("Page 1")
+
+    asyncio.run(main())
+
+    assert {model: limiter.n_requests for model, limiter in middleware.limiters.items()} == {
+        "gpt-4.1": 3,
+        "gpt-4.1-mini": 1,
+    }
+    assert middleware.limiters["gpt-4.1-mini"].metrics()["rate_limiter_available_requests"] > 400
+
+
+def test_failures_have_a_status_code():
+    agent = MockChatClient(MockAgentOptions(latency_median_seconds=0, error_rate=1)).create_agent()
+
+    with pytest.raises(MockServiceError) as error:
+        asyncio.run(agent.run("Page 1"))
+
+    assert error.value.status_code == 500
+
+
+def test_get_agent_client_returns_the_mock_backend(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("AGENT_BACKEND", "mock")
+    monkeypatch.setenv("MOCK_AGENT_OPTIONS", '{"latency_median_seconds": 0, "seed": 3}')
+
+    async def get_client():
+        client = get_agent_client("gpt-4.1")
+        assert get_agent_client("gpt-4.1") is client
+        await close_clients()
+        return client
+
+    client = asyncio.run(get_client())
+
+    assert isinstance(client, MockChatClient)
+    assert client.model_id == "gpt-4.1"
+    assert client.options.seed == 3
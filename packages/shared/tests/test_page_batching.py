@@ -0,0 +1,57 @@
+import base64
+import io
+
+from PIL import Image
+
+from shared.llm_utils import LLMInput
+from shared.page_batching import (
+    estimate_page_tokens,
+    image_tokens,
+    plan_page_batches,
+    sort_batches_by_rank,
+)
+
+
+def test_image_tokens_follow_the_tiling_rules():
+    # Scaled down to 768x768: 4 tiles
+    assert image_tokens(1024, 1024) == 85 + 170 * 4
+    # Scaled to fit 2048x2048 then 768 on the short side (768x1536): 6 tiles
+    assert image_tokens(2000, 4000) == 85 + 170 * 6
+    # Small images are not scaled up
+    assert image_tokens(500, 300) == 85 + 170
+
+
+def test_estimate_page_tokens_reads_the_image_size(tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (1024, 1024)).save(buffer, format="PNG")
+    data_url = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+    image_path = tmp_path / "page.png"
+    image_path.write_bytes(buffer.getvalue())
+
+    assert estimate_page_tokens(LLMInput(text="x" * 400)) == 100
+    assert estimate_page_tokens(LLMInput(image_data_url=data_url)) == 85 + 170 * 4
+    assert estimate_page_tokens(LLMInput(image_path=image_path, text="x" * 40)) == 10 + 765
+
+
+def test_plan_page_batches_packs_consecutive_pages():
+    page_tokens = {"1": 400, "2": 500, "3": 300, "4": 2000, "5": 100, "6": 100}
+
+    assert plan_page_batches(page_tokens, max_tokens_per_call=1000) == [
+        ["1", "2"],
+        ["3"],
+        ["4"],
+        ["5", "6"],
+    ]
+    assert plan_page_batches(page_tokens, max_tokens_per_call=1000, max_pages_per_call=1) == [
+        [page] for page in page_tokens
+    ]
+
+
+def test_sort_batches_by_rank_keeps_consecutive_pages_together():
+    page_tokens = {page: 100 for page in ("3", "4", "5", "9", "10", "12")}
+    batches = plan_page_batches(page_tokens, max_tokens_per_call=200)
+
+    ranked_pages = ["10", "4", "12", "3", "9", "5"]
+
+    assert batches == [["3", "4"], ["5", "9"], ["10", "12"]]
+    assert sort_batches_by_rank(batches, ranked_pages) == [["10", "12"], ["3", "4"], ["5", "9"]]
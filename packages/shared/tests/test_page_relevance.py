@@ -0,0 +1,48 @@
+from typing import get_args
+
+import pytest
+
+from shared.materiality_models import FINANCIAL_METRIC, METRIC_ALIASES
+from shared.page_relevance import rank_pages, relevance_recall_report, select_relevant_pages
+from shared.text_layer import PageText
+
+
+def _page(page_number: int, text: str, tables: list[str] | None = None) -> PageText:
+    return PageText(page_number=page_number, text=text, tables=tables or [], table_area_ratio=0)
+
+
+PAGES = [
+    _page(1, "Our purpose is to serve our customers a little better every day."),
+    _page(2, "Capex increased by 10.9% to £1.3bn as we invested in stores."),
+    _page(3, "Board of directors, biographies and committee memberships 2024 2025"),
+    _page(
+        4,
+        "Net debt/EBITDA improved from 2.2x to 2.0x. Net profit grew 10.9% year-on-year.",
+        tables=["| Metric | 2025 | 2024 |\n|---|---|---|\n| EBITDA | 4.1 | 3.9 |"],
+    ),
+]
+
+
+def test_metric_aliases_cover_every_financial_metric():
+    assert set(METRIC_ALIASES) == set(get_args(FINANCIAL_METRIC.__value__))
+
+
+def test_rank_pages_puts_financial_pages_first():
+    ranked_pages = rank_pages(PAGES)
+
+    assert [page_score.page_number for page_score in ranked_pages[:2]] == [4, 2]
+    assert ranked_pages[0].matched_metrics == {"EBITDA", "Net Profit", "TFD/EBITDA (x)"}
+    assert select_relevant_pages(ranked_pages, top_k=3, min_score=3) == [2, 4]
+
+
+def test_relevance_recall_report():
+    report = relevance_recall_report(rank_pages(PAGES), expected_pages=[2, 4], ks=(1, 2))
+
+    assert report == {
+        "page_recall_at_1": 0.5,
+        "page_recall_at_2": 1.0,
+        "page_worst_expected_rank": 2,
+    }
+
+    with pytest.raises(ValueError):
+        relevance_recall_report(rank_pages(PAGES), expected_pages=[])
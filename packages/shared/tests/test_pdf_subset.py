@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import pymupdf
+import pytest
+
+from shared.pdf_subset import (
+    SubsetJob,
+    coalesce_pages,
+    extract_pdf_pages,
+    extract_pdf_subsets,
+    parse_page_ranges,
+    read_manifest,
+)
+
+
+def _page_texts(path: Path) -> list[str]:
+    texts = []
+    with pymupdf.open(path) as doc:
+        for page in doc:
+            text = page.get_text("text")
+            assert isinstance(text, str)
+            texts.append(text.strip())
+    return texts
+
+
+def test_parse_page_ranges():
+    assert parse_page_ranges("21, 26, 30-32") == (21, 26, 30, 31, 32)
+    with pytest.raises(ValueError):
+        parse_page_ranges("5-3")
+
+
+def test_coalesce_pages_keeps_page_order():
+    assert coalesce_pages([3, 4, 5, 9, 1, 2]) == [(3, 5), (9, 9), (1, 2)]
+
+
+def test_extract_pdf_pages_copies_runs_of_pages(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=6)
+
+    result = extract_pdf_pages(pdf_path, [2, 3, 4, 6], tmp_path / "subset.pdf", garbage=3)
+
+    assert result.n_insert_calls == 2
+    assert _page_texts(tmp_path / "subset.pdf") == ["Page 2", "Page 3", "Page 4", "Page 6"]
+
+
+def test_extract_pdf_subsets_from_manifest(tmp_path: Path, make_pdf):
+    make_pdf(tmp_path / "a.pdf", n_pages=3)
+    make_pdf(tmp_path / "b.pdf", n_pages=5)
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text('pdf,pages,output\na.pdf,"1, 3",\nb.pdf,2-4,b subset.pdf\nb.pdf,9,\n')
+
+    jobs = read_manifest(manifest, tmp_path / "subsets")
+    summary = extract_pdf_subsets(jobs, max_workers=2, deflate=True)
+
+    assert jobs[1] == SubsetJob(tmp_path / "b.pdf", (2, 3, 4), tmp_path / "subsets/b subset.pdf")
+    assert summary.n_pages == 5
+    assert summary.failed == [jobs[2]]
+    assert jobs[2].output_path == tmp_path / "subsets/b_9.pdf"
+    assert _page_texts(tmp_path / "subsets/a_1-3.pdf") == ["Page 1", "Page 3"]
+    assert _page_texts(tmp_path / "subsets/b subset.pdf") == ["Page 2", "Page 3", "Page 4"]
+
+
+def test_read_manifest_rejects_outputs_overwriting_other_files(tmp_path: Path):
+    manifest = tmp_path / "manifest.csv"
+
+    # Subsets of the same PDF get distinct default names
+    manifest.write_text("pdf,pages\na.pdf,1-2\na.pdf,3\n")
+    assert [job.output_path.name for job in read_manifest(manifest, tmp_path)] == [
+        "a_1-2.pdf",
+        "a_3.pdf",
+    ]
+
+    manifest.write_text("pdf,pages,output\na.pdf,1,a.pdf\n")
+    with pytest.raises(ValueError, match="overwrite a source PDF"):
+        read_manifest(manifest, tmp_path)
+
+    manifest.write_text("pdf,pages,output\na.pdf,1,subset.pdf\nb.pdf,1,subset.pdf\n")
+    with pytest.raises(ValueError, match="both written to"):
+        read_manifest(manifest, tmp_path / "subsets")
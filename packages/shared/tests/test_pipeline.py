@@ -0,0 +1,209 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from shared.pipeline import PipelineRunner, load_pipeline
+
+PIPELINE = """
+type: pipeline
+inputs:
+  content: "hello world"
+
+jobs:
+  snapshot:
+    command: echo "Uploading full pipeline snapshot"
+    code: .
+
+  writer_step:
+    type: command
+    component: ./writer-step/aml-component.yaml
+    inputs:
+      content: ${{ parent.inputs.content }}
+    outputs:
+      data_path:
+        type: uri_folder
+
+  upper_reader_step:
+    type: command
+    component: ./reader-step/aml-component.yaml
+    inputs:
+      data_path: ${{ parent.jobs.writer_step.outputs.data_path }}
+      mode: upper
+
+  lower_reader_step:
+    type: command
+    component: ./reader-step/aml-component.yaml
+    inputs:
+      data_path: ${{ parent.jobs.writer_step.outputs.data_path }}
+"""
+
+WRITER_COMPONENT = """
+type: command
+command: >-
+  {python} write.py --content "${{{{ inputs.content }}}}" --data_path "${{{{outputs.data_path}}}}"
+inputs:
+  content:
+    type: string
+outputs:
+  data_path:
+    type: uri_folder
+code: .
+"""
+
+READER_COMPONENT = """
+type: command
+command: >-
+  {python} read.py --data_path "${{{{inputs.data_path}}}}" --mode ${{{{inputs.mode}}}}
+inputs:
+  data_path:
+    type: uri_folder
+  mode:
+    type: string
+    default: lower
+code: .
+"""
+
+WRITER_SCRIPT = """
+import argparse, pathlib
+parser = argparse.ArgumentParser()
+parser.add_argument("--content")
+parser.add_argument("--data_path", type=pathlib.Path)
+args = parser.parse_args()
+(args.data_path / "file.txt").write_text(args.content)
+"""
+
+READER_SCRIPT = """
+import argparse, pathlib
+parser = argparse.ArgumentParser()
+parser.add_argument("--data_path", type=pathlib.Path)
+parser.add_argument("--mode")
+args = parser.parse_args()
+content = (args.data_path / "file.txt").read_text()
+print(content.upper() if args.mode == "upper" else content.lower())
+"""
+
+
+def create_pipeline(tmp_path: Path) -> Path:
+    for step, component, script_name, script in (
+        ("writer-step", WRITER_COMPONENT, "write.py", WRITER_SCRIPT),
+        ("reader-step", READER_COMPONENT, "read.py", READER_SCRIPT),
+    ):
+        (tmp_path / step).mkdir()
+        (tmp_path / step / "aml-component.yaml").write_text(component.format(python=sys.executable))
+        (tmp_path / step / script_name).write_text(script)
+
+    pipeline_path = tmp_path / "pipeline.yaml"
+    pipeline_path.write_text(PIPELINE)
+    return pipeline_path
+
+
+def run(pipeline_path: Path, **kwargs):
+    runner = PipelineRunner(
+        pipeline_path,
+        cache_dir=pipeline_path.parent / "cache",
+        logs_dir=pipeline_path.parent / "logs",
+        **kwargs,
+    )
+    return {name: result.status for name, result in asyncio.run(runner.run()).items()}
+
+
+def test_load_pipeline_resolves_components_and_dependencies(tmp_path: Path):
+    inputs, steps = load_pipeline(create_pipeline(tmp_path))
+
+    assert inputs == {"content": "hello world"}
+    # The snapshot step has nothing to run
+    assert set(steps) == {"writer_step", "upper_reader_step", "lower_reader_step"}
+    assert steps["upper_reader_step"].dependencies == {"writer_step"}
+    assert steps["writer_step"].code_dir == (tmp_path / "writer-step").resolve()
+
+
+def test_pipeline_steps_run_once_and_are_reused(tmp_path: Path):
+    pipeline_path = create_pipeline(tmp_path)
+
+    assert set(run(pipeline_path).values()) == {"succeeded"}
+    assert (tmp_path / "logs/upper_reader_step.log").read_text() == "HELLO WORLD\n"
+    assert (tmp_path / "logs/lower_reader_step.log").read_text() == "hello world\n"
+
+    assert set(run(pipeline_path).values()) == {"cached"}
+
+    # Only the changed step reruns
+    reader_script = tmp_path / "reader-step/read.py"
+    reader_script.write_text(reader_script.read_text() + "\n# changed\n")
+    assert run(pipeline_path) == {
+        "writer_step": "cached",
+        "upper_reader_step": "succeeded",
+        "lower_reader_step": "succeeded",
+    }
+
+    # Forcing a step reruns the steps downstream of it too
+    assert set(run(pipeline_path, force=["writer_step"]).values()) == {"succeeded"}
+
+
+def test_failed_steps_skip_downstream_steps_and_are_not_cached(tmp_path: Path):
+    pipeline_path = create_pipeline(tmp_path)
+    (tmp_path / "writer-step/write.py").write_text("raise SystemExit(1)")
+
+    assert run(pipeline_path) == {
+        "writer_step": "failed",
+        "upper_reader_step": "skipped",
+        "lower_reader_step": "skipped",
+    }
+    assert [path.name for path in (tmp_path / "cache").iterdir()] == []
+
+
+def test_invalid_steps_fail_without_stopping_the_others(tmp_path: Path):
+    pipeline_path = create_pipeline(tmp_path)
+    # Only found once the output directory of the step is created
+    reader_component = tmp_path / "reader-step/aml-component.yaml"
+    reader_component.write_text(
+        reader_component.read_text().replace("inputs.mode", "inputs.unknown")
+    )
+
+    assert run(pipeline_path) == {
+        "writer_step": "succeeded",
+        "upper_reader_step": "failed",
+        "lower_reader_step": "failed",
+    }
+    # Only the output of the writer is left in the cache
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_prune_cache_keeps_only_the_outputs_of_the_run(tmp_path: Path):
+    pipeline_path = create_pipeline(tmp_path)
+    run(pipeline_path)
+    reader_script = tmp_path / "reader-step/read.py"
+    reader_script.write_text(reader_script.read_text() + "\n# changed\n")
+    (tmp_path / "cache/.interrupted").mkdir()
+
+    runner = PipelineRunner(pipeline_path, cache_dir=tmp_path / "cache", logs_dir=tmp_path / "logs")
+    results = asyncio.run(runner.run())
+    assert len(runner.prune_cache(results)) == 3
+
+    assert {path.name for path in (tmp_path / "cache").iterdir()} == {
+        result.key for result in results.values()
+    }
+    assert set(run(pipeline_path).values()) == {"cached"}
+
+
+def test_steps_run_in_an_environment_built_from_their_requirements(tmp_path: Path):
+    pipeline_path = create_pipeline(tmp_path)
+    requirements_path = tmp_path / "writer-step/requirements.txt"
+    requirements_path.write_text("pyyaml\n")
+    runner = PipelineRunner(
+        pipeline_path,
+        cache_dir=tmp_path / "cache",
+        logs_dir=tmp_path / "logs",
+        requirements=Path("requirements.txt"),
+    )
+    step = runner.steps["writer_step"]
+
+    args = runner.command_args(step, "echo hello")
+    assert args[:2] == ["uv", "run"]
+    assert args[args.index("--with-requirements") + 1] == str(requirements_path.resolve())
+    assert args[-3:] == ["bash", "-c", "echo hello"]
+
+    # Changing the requirements reruns the step
+    key = runner.step_key(step, {})
+    requirements_path.write_text("pyyaml>=6\n")
+    runner._tree_hashes.clear()
+    assert runner.step_key(step, {}) != key
@@ -0,0 +1,67 @@
+import asyncio
+import os
+from pathlib import Path
+
+from shared import llm_utils
+from shared.raster_cache import CacheKey, RasterCache
+
+
+def test_get_image_data_urls_reuses_cached_pages(tmp_path: Path, monkeypatch, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=2)
+    cache = RasterCache(tmp_path / "cache")
+    output_dir = tmp_path / "images"
+    output_dir.mkdir()
+
+    first = asyncio.run(llm_utils.get_image_data_urls(pdf_path, output_dir, 1, cache))
+
+    def fail_to_render(*args, **kwargs):
+        raise AssertionError("Cached pages should not be rendered again")
+
+    monkeypatch.setattr(llm_utils, "iter_encoded_pages", fail_to_render)
+    monkeypatch.setattr(llm_utils, "count_pages", fail_to_render)
+
+    second = asyncio.run(llm_utils.get_image_data_urls(pdf_path, output_dir, 1, cache))
+
+    assert list(first) == ["1", "2"]
+    assert second == first
+
+
+def test_raster_cache_evicts_least_recently_used(tmp_path: Path):
+    image_path = tmp_path / "page.png"
+    image_path.write_bytes(b"x" * 100)
+    cache = RasterCache(tmp_path / "cache", max_bytes=250)
+
+    keys = [CacheKey("abc", page_number) for page_number in (1, 2, 3)]
+    for i, key in enumerate(keys[:2]):
+        os.utime(cache.put_image(key, image_path), (i, i))
+
+    cache.put_image(keys[2], image_path)
+
+    assert cache.get_image(keys[0]) is None
+    assert cache.get_image(keys[1]) is not None
+    assert cache.get_image(keys[2]) is not None
+
+
+def test_lazy_inputs_survive_the_eviction_of_cached_pages(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=2)
+    cache = RasterCache(tmp_path / "cache")
+    for name in ("first", "second"):
+        (tmp_path / name).mkdir()
+
+    asyncio.run(
+        llm_utils.get_llm_inputs(
+            pdf_path, tmp_path / "first", "image", max_workers=1, cache=cache, lazy=True
+        )
+    )
+    # Served from the cache
+    llm_inputs = asyncio.run(
+        llm_utils.get_llm_inputs(
+            pdf_path, tmp_path / "second", "image", max_workers=1, cache=cache, lazy=True
+        )
+    )
+    cache.max_bytes = 0
+    cache.evict()
+
+    assert llm_inputs["1"].image_path == tmp_path / "second" / "report_page_1.png"
+    data_url = asyncio.run(llm_inputs["1"].get_image_data_url())
+    assert data_url is not None and data_url.startswith("data:image/png;base64,")
@@ -0,0 +1,114 @@
+import asyncio
+import base64
+from pathlib import Path
+
+from shared.llm_utils import (
+    PayloadBudget,
+    aiter_image_data_urls,
+    extract_pages_as_images,
+    get_llm_inputs,
+)
+from shared.rasterize import ImageOptions, iter_rendered_pages
+
+
+def test_iter_rendered_pages_yields_every_page(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=3)
+
+    rendered_pages = list(
+        iter_rendered_pages(pdf_path, tmp_path, ImageOptions(resolution=36), max_workers=2)
+    )
+
+    assert sorted(rendered_page.page_number for rendered_page in rendered_pages) == [1, 2, 3]
+    assert all(rendered_page.path.exists() for rendered_page in rendered_pages)
+    assert all(rendered_page.render_seconds >= 0 for rendered_page in rendered_pages)
+
+
+def test_extract_pages_as_images_is_ordered_by_page(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=3)
+
+    image_paths = extract_pages_as_images(pdf_path, tmp_path, max_workers=1)
+
+    assert list(image_paths) == ["1", "2", "3"]
+    assert image_paths["2"] == tmp_path / "report_page_2.png"
+
+
+def test_image_options_fit_the_pixel_budget(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=1)
+    image_options = ImageOptions(max_pixels=100 * 100, image_format="JPEG", grayscale=True)
+
+    (rendered_page,) = iter_rendered_pages(pdf_path, tmp_path, image_options, max_workers=1)
+
+    # A 200pt square page is 2.78 inches wide, so 100 pixels wide means 36 DPI...
+    assert ImageOptions(max_pixels=100 * 100, min_resolution=1).resolution_for(200, 200) == 36
+    # ...which is below the default minimum resolution
+    assert rendered_page.resolution == 72
+    assert rendered_page.path.suffix == ".jpg"
+    assert rendered_page.size_bytes == rendered_page.path.stat().st_size
+
+
+def test_image_data_urls_are_encoded_in_memory_without_blocking_the_loop(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=3)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    async def main():
+        ticker = asyncio.create_task(tick())
+        ticks_at_each_page = {}
+        async for page_number, data_url in aiter_image_data_urls(pdf_path, tmp_path, max_workers=1):
+            ticks_at_each_page[page_number] = (ticks, data_url)
+        ticker.cancel()
+        return ticks_at_each_page
+
+    ticks_at_each_page = asyncio.run(main())
+
+    assert sorted(ticks_at_each_page) == [1, 2, 3]
+    # Other tasks kept running while the first page was rendered
+    assert ticks_at_each_page[1][0] > 0
+
+    _, data_url = ticks_at_each_page[2]
+    header, encoded = data_url.split(",", 1)
+    assert header == "data:image/png;base64"
+    assert base64.b64decode(encoded) == (tmp_path / "report_page_2.png").read_bytes()
+
+
+def test_lazy_llm_inputs_encode_images_on_demand(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=2)
+    (tmp_path / "eager").mkdir()
+    (tmp_path / "lazy").mkdir()
+
+    eager = asyncio.run(get_llm_inputs(pdf_path, tmp_path / "eager", max_workers=1))
+    lazy = asyncio.run(get_llm_inputs(pdf_path, tmp_path / "lazy", max_workers=1, lazy=True))
+
+    assert list(lazy) == ["1", "2"]
+    assert lazy["1"].image_data_url is None
+    assert lazy["1"].image_path == tmp_path / "lazy" / "report_page_1.png"
+
+    data_url = asyncio.run(lazy["1"].get_image_data_url())
+    assert data_url is not None
+    assert data_url == eager["1"].image_data_url
+    assert lazy["1"].payload_bytes == eager["1"].payload_bytes == len(data_url)
+
+
+def test_payload_budget_caps_resident_bytes():
+    budget = PayloadBudget(max_bytes=100)
+    resident_bytes_by_request: dict[int, int] = {}
+
+    async def send(n_bytes: int):
+        async with budget.reserve(n_bytes):
+            await asyncio.sleep(0.01)
+            resident_bytes_by_request[n_bytes] = budget.resident_bytes
+
+    async def main():
+        await asyncio.gather(send(60), send(60), send(30), send(150))
+
+    asyncio.run(main())
+
+    assert max(resident_bytes_by_request[n_bytes] for n_bytes in (60, 30)) <= 100
+    # The request larger than the budget is sent alone
+    assert resident_bytes_by_request[150] == 150
+    assert budget.resident_bytes == 0
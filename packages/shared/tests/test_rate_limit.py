@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from shared.rate_limit import AdaptiveRateLimiter, get_retry_after_seconds, get_status_code
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: dict[str, str]):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status_code: int, headers: dict[str, str] | None = None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code, headers or {})
+
+
+def test_concurrency_is_halved_on_throttling_and_grows_back():
+    limiter = AdaptiveRateLimiter(initial_concurrency=8, base_backoff_seconds=10)
+
+    limiter.record_throttle()
+    # Throttled together with the previous request, so not decreased again
+    limiter.record_throttle()
+    assert limiter.concurrency_limit == 4
+
+    async def succeed(n_times: int):
+        for _ in range(n_times):
+            await limiter.record_success()
+
+    # Roughly +1 once a full window of 4 requests succeeded
+    asyncio.run(succeed(5))
+    assert limiter.concurrency_limit == 5
+
+
+def test_slots_never_exceed_concurrency_limit():
+    limiter = AdaptiveRateLimiter(initial_concurrency=2, max_concurrency=2)
+    in_flight = 0
+    max_in_flight = 0
+
+    async def request():
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    async def main():
+        await asyncio.gather(*(limiter.call(request) for _ in range(10)))
+
+    asyncio.run(main())
+
+    assert max_in_flight == 2
+    assert limiter.metrics()["rate_limiter_requests"] == 10
+
+
+def test_throttled_requests_are_retried():
+    limiter = AdaptiveRateLimiter(base_backoff_seconds=0.001)
+    attempts = 0
+
+    async def request():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise FakeHttpError(429, {"retry-after-ms": "1"})
+        return "ok"
+
+    assert asyncio.run(limiter.call(request)) == "ok"
+    assert limiter.n_retries == 2
+    assert limiter.n_throttled == 2
+
+
+def test_streams_are_retried_only_before_their_first_item():
+    limiter = AdaptiveRateLimiter(base_backoff_seconds=0.001)
+    attempts = 0
+
+    async def stream():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise FakeHttpError(429)
+        yield "first"
+        if attempts == 2:
+            raise FakeHttpError(500)
+        yield "second"
+
+    async def collect() -> list[str]:
+        return [item async for item in limiter.stream(stream)]
+
+    # Failed after its first item, so not retried
+    with pytest.raises(FakeHttpError):
+        asyncio.run(collect())
+    assert attempts == 2
+    assert limiter.n_retries == 1
+    assert asyncio.run(collect()) == ["first", "second"]
+
+
+def test_client_errors_are_not_retried():
+    limiter = AdaptiveRateLimiter(base_backoff_seconds=0.001)
+
+    async def request():
+        raise FakeHttpError(400)
+
+    with pytest.raises(FakeHttpError):
+        asyncio.run(limiter.call(request))
+    assert limiter.n_retries == 0
+
+
+def test_retry_after_is_read_from_headers_and_messages():
+    try:
+        raise RuntimeError("Agent run failed") from FakeHttpError(429, {"retry-after": "7"})
+    except RuntimeError as e:
+        assert get_status_code(e) == 429
+        assert get_retry_after_seconds(e) == 7
+
+    error = RuntimeError("Rate limit is exceeded. Try again in 20 seconds.")
+    assert get_retry_after_seconds(error) == 20
@@ -0,0 +1,50 @@
+from shared.reconcile import (
+    duplicate_key,
+    extract_yoy_pct,
+    group_duplicates,
+    match_metric,
+    unique_by,
+)
+
+
+def test_match_metric_normalizes_aliases():
+    assert match_metric("Capex rose 12% on new stores") == "Capital Expenditure"
+    assert match_metric("Net debt/EBITDA improved to 2.1x") == "TFD/EBITDA (x)"
+    assert match_metric("Adjusted EBITDA grew 5%") == "EBITDA"
+    assert match_metric("Profit for the year fell") == "Net Profit"
+    assert match_metric("Revenue grew 3%") is None
+
+
+def test_extract_yoy_pct_reads_the_direction():
+    assert extract_yoy_pct("EBITDA grew 5.2% year on year") == 5.2
+    assert extract_yoy_pct("Net profit decreased by 8 per cent") == -8.0
+    assert extract_yoy_pct("Working capital moved by -3%") == -3.0
+    assert extract_yoy_pct("EBITDA was stable") is None
+
+
+def test_extract_yoy_pct_only_applies_the_direction_of_its_clause():
+    assert extract_yoy_pct("EBITDA increased 5% despite a decrease in sales") == 5.0
+    assert extract_yoy_pct("Operating profit up 12.3%, with lower costs") == 12.3
+    assert extract_yoy_pct("Sales decreased last year but grew 4% this year") == 4.0
+    assert extract_yoy_pct("Revenue of £5bn, down 3% on last year") == -3.0
+    assert extract_yoy_pct("Capex fell sharply from last year by 10.9%") == -10.9
+    assert extract_yoy_pct("Cash flow was 3% lower than last year") == -3.0
+
+
+def test_duplicates_are_grouped_by_metric_or_wording():
+    changes = [
+        "Capex increased by 10%",
+        "Revenue grew 3%",
+        "Capital expenditure rose 10% year on year",
+        "revenue grew 3.1%!",
+        "Revenue grew 9%",
+    ]
+
+    groups = group_duplicates(changes, duplicate_key)
+
+    assert groups == [
+        ["Capex increased by 10%", "Capital expenditure rose 10% year on year"],
+        ["Revenue grew 3%", "revenue grew 3.1%!"],
+        ["Revenue grew 9%"],
+    ]
+    assert unique_by(changes, duplicate_key) == [group[0] for group in groups]
@@ -0,0 +1,118 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from agent_framework import (
+    BaseChatClient,
+    ChatMessage,
+    ChatResponse,
+    ChatResponseUpdate,
+    DataContent,
+    Role,
+    TextContent,
+    use_chat_middleware,
+)
+from pydantic import BaseModel
+
+from shared.response_cache import ResponseCache, ResponseCacheMiddleware, ResponseCacheMissError
+
+
+class Answer(BaseModel):
+    value: int
+
+
+@use_chat_middleware
+class CountingChatClient(BaseChatClient):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    async def _inner_get_response(self, *, messages, chat_options, **kwargs):
+        self.calls += 1
+        return ChatResponse(text='{"value": 42}', response_format=chat_options.response_format)
+
+    async def _inner_get_streaming_response(self, *, messages, chat_options, **kwargs):
+        self.calls += 1
+        for chunk in ('{"value": ', "42}"):
+            yield ChatResponseUpdate(text=chunk, role=Role.ASSISTANT)
+
+
+def _message(image_data_url: str) -> ChatMessage:
+    return ChatMessage(
+        role=Role.USER,
+        contents=[TextContent(text="Extract"), DataContent(uri=image_data_url)],
+    )
+
+
+def _run(client: CountingChatClient, image_data_url: str = "data:image/png;base64,AAAA"):
+    agent = client.create_agent(instructions="Be precise", name="extraction")
+    return asyncio.run(agent.run(_message(image_data_url), response_format=Answer, temperature=0))
+
+
+def test_identical_requests_are_served_from_cache(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    client = CountingChatClient(middleware=[ResponseCacheMiddleware(cache, mode="read_write")])
+
+    first = _run(client)
+    second = _run(client)
+    _run(client, image_data_url="data:image/png;base64,BBBB")
+
+    assert client.calls == 2
+    assert first.value == second.value == Answer(value=42)
+
+
+def test_streamed_responses_are_cached_and_replayed(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    client = CountingChatClient(middleware=[ResponseCacheMiddleware(cache, mode="read_write")])
+    agent = client.create_agent(instructions="Be precise", name="extraction")
+
+    async def stream() -> str:
+        message = _message("data:image/png;base64,AAAA")
+        updates = agent.run_stream(message, response_format=Answer, temperature=0)
+        return "".join([update.text async for update in updates])
+
+    first = asyncio.run(stream())
+    second = asyncio.run(stream())
+    # Non-streaming requests are served from the same cache entry
+    third = _run(client)
+
+    assert client.calls == 1
+    assert first == second == '{"value": 42}'
+    assert third.value == Answer(value=42)
+
+
+def test_replay_mode_fails_on_cache_miss(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    _run(CountingChatClient(middleware=[ResponseCacheMiddleware(cache, mode="record")]))
+
+    replay_client = CountingChatClient(middleware=[ResponseCacheMiddleware(cache, mode="replay")])
+
+    assert _run(replay_client).value == Answer(value=42)
+    with pytest.raises(ResponseCacheMissError):
+        _run(replay_client, image_data_url="data:image/png;base64,BBBB")
+    assert replay_client.calls == 0
+
+
+def test_invalid_cache_mode_is_rejected(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    monkeypatch.setenv("LLM_RESPONSE_CACHE_MODE", "replay ")
+
+    with pytest.raises(ValueError, match="read_write, record, replay, off"):
+        ResponseCacheMiddleware(cache)
+    assert ResponseCacheMiddleware(cache, mode="off").mode == "off"
+
+
+def test_response_cache_expires_and_evicts(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "responses.sqlite", ttl_seconds=0, max_bytes=10)
+    cache.put("a", "x" * 6)
+    cache.put("b", "x" * 6)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+
+    cache = ResponseCache(tmp_path / "other.sqlite", max_bytes=10)
+    cache.put("a", "x" * 6)
+    cache.put("b", "x" * 6)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "x" * 6
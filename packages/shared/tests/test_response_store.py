@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from shared.response_store import (
+    METRIC_NAME_DTYPE,
+    iter_response_batches,
+    load_responses,
+    read_responses,
+    write_responses,
+)
+
+TEST_DATA_DIR = Path("packages/shared/tests/test_data")
+
+
+def test_load_responses_matches_line_by_line_parsing():
+    paths = sorted(TEST_DATA_DIR.glob("materiality_response_*.json"))
+
+    responses = load_responses(paths)
+
+    expected = pd.concat(
+        [
+            pd.read_json(path, lines=True).assign(id=company_id)
+            for company_id, path in enumerate(paths, 1)
+        ],
+        ignore_index=True,
+    )
+    assert responses["name"].dtype == METRIC_NAME_DTYPE
+    assert responses["name"].astype(str).tolist() == expected["name"].tolist()
+    assert responses["latest_yoy_pct"].tolist() == expected["latest_yoy_pct"].tolist()
+    assert responses["id"].tolist() == expected["id"].tolist()
+
+
+def test_invalid_lines_are_skipped(tmp_path: Path):
+    path = tmp_path / "materiality_response_7.json"
+    path.write_text(
+        '{"name": "EBITDA", "latest_yoy_pct": 3.5}\n'
+        '{"name": "Revenue", "latest_yoy_pct": 1.0}\n'
+        "\n"
+        '{"name": "Net Profit", "latest_yoy_pct": -2.0}\n'
+    )
+
+    batches = list(iter_response_batches([path], batch_size=1))
+
+    assert len(batches) == 2
+    assert [batch["name"].iloc[0] for batch in batches] == ["EBITDA", "Net Profit"]
+    assert batches[0]["id"].iloc[0] == 7
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_responses_round_trip(tmp_path: Path, suffix: str):
+    paths = sorted(TEST_DATA_DIR.glob("materiality_response_*.json"))
+    path = tmp_path / f"responses{suffix}"
+
+    write_responses(iter_response_batches(paths, batch_size=2), path)
+
+    pd.testing.assert_frame_equal(read_responses(path), load_responses(paths))
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+
+from pydantic import BaseModel
+
+from shared.stream_parsing import JsonArrayItemParser, aiter_array_items
+
+
+class Change(BaseModel):
+    metric: str
+    values: list[float]
+
+
+RESPONSE = (
+    '{"summary": "Quoted \\"[{\\" text", "material_changes": ['
+    '{"metric": "Sales {up}", "values": [1, 2]}, '
+    '{"metric": "Net debt", "values": []}'
+    '], "other": [{"metric": "ignored", "values": []}]}'
+)
+
+
+def test_parser_returns_items_as_soon_as_they_are_complete():
+    parser = JsonArrayItemParser("material_changes")
+
+    # Split the response at every character to exercise every parser state across chunks
+    items_per_char = [parser.feed(char) for char in RESPONSE]
+    items = [item for char_items in items_per_char for item in char_items]
+
+    assert items == [
+        '{"metric": "Sales {up}", "values": [1, 2]}',
+        '{"metric": "Net debt", "values": []}',
+    ]
+    # The first item is returned on its closing brace, before the rest of the response
+    first_item_end = RESPONSE.index("]}, ") + 2
+    assert items_per_char[first_item_end - 1] == [items[0]]
+
+
+def test_invalid_items_are_skipped(caplog):
+    async def chunks():
+        yield '{"material_changes": [{"metric": "Sales", "values": [1]}, '
+        yield '{"metric": "Capex"}, {"metric": "Profit", "values": [2]}]}'
+
+    async def collect() -> list[Change]:
+        return [item async for item in aiter_array_items(chunks(), Change, "material_changes")]
+
+    with caplog.at_level(logging.WARNING):
+        changes = asyncio.run(collect())
+
+    assert [change.metric for change in changes] == ["Sales", "Profit"]
+    assert "Skipping invalid Change" in caplog.text
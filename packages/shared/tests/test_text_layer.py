@@ -0,0 +1,47 @@
+import asyncio
+from pathlib import Path
+
+from shared.llm_utils import get_llm_inputs
+from shared.text_layer import extract_page_texts, table_to_markdown
+
+PARAGRAPH = "Group sales increased by 4% to 69.9bn thanks to strong volume growth. " * 5
+
+
+def test_extract_page_texts_flags_pages_without_text(tmp_path: Path, make_pdf):
+    # The second page has no text layer, like a scanned page
+    pdf_path = make_pdf(tmp_path / "report.pdf", texts=[PARAGRAPH, ""], page_size=(595, 842))
+
+    page_texts = extract_page_texts(pdf_path, max_workers=1)
+
+    assert "Group sales increased by 4%" in page_texts[1].text
+    assert not page_texts[1].needs_image()
+    assert page_texts[2].needs_image()
+
+
+def test_hybrid_llm_inputs_only_rasterize_pages_that_need_it(tmp_path: Path, make_pdf):
+    # The second page has no text layer, like a scanned page
+    pdf_path = make_pdf(tmp_path / "report.pdf", texts=[PARAGRAPH, ""], page_size=(595, 842))
+
+    llm_inputs = asyncio.run(get_llm_inputs(pdf_path, tmp_path, mode="hybrid", max_workers=1))
+
+    assert llm_inputs["1"].text is not None and llm_inputs["1"].image_data_url is None
+    assert llm_inputs["2"].text is None and llm_inputs["2"].image_data_url is not None
+
+
+def test_table_to_markdown():
+    assert table_to_markdown([["Metric", "2025"], ["EBITDA", "4.1\nbn"], ["Capex", None]]) == (
+        "| Metric | 2025 |\n|---|---|\n| EBITDA | 4.1 bn |\n| Capex |  |"
+    )
+
+
+def test_llm_inputs_keep_the_order_of_the_page_texts(tmp_path: Path, make_pdf):
+    pdf_path = make_pdf(tmp_path / "report.pdf", n_pages=3)
+    page_texts = extract_page_texts(pdf_path, max_workers=1)
+    # e.g. most relevant pages first
+    ranked_page_texts = {page_number: page_texts[page_number] for page_number in (3, 1)}
+
+    for mode in ("image", "hybrid"):
+        llm_inputs = asyncio.run(
+            get_llm_inputs(pdf_path, tmp_path, mode, max_workers=1, page_texts=ranked_page_texts)
+        )
+        assert list(llm_inputs) == ["3", "1"]
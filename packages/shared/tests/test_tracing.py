@@ -0,0 +1,53 @@
+import asyncio
+import json
+from pathlib import Path
+
+from agent_framework import ChatMessage, DataContent, Role, TextContent
+
+from shared.mock_agents import MockAgentOptions, MockChatClient
+from shared.response_cache import ResponseCache, ResponseCacheMiddleware
+from shared.tracing import Tracer, TracingMiddleware, percentile
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+
+
+def test_tracing_records_usage_payload_and_cache_hits(tmp_path: Path):
+    tracer = Tracer(tmp_path / "trace.jsonl")
+    client = MockChatClient(
+        MockAgentOptions(latency_median_seconds=0),
+        middleware=[
+            TracingMiddleware(tracer),
+            ResponseCacheMiddleware(ResponseCache(tmp_path / "responses.sqlite"), "read_write"),
+        ],
+    )
+    agent = client.create_agent(name="extraction")
+    message = ChatMessage(
+        role=Role.USER,
+        contents=[TextContent(text="Extract"), DataContent(uri="data:image/png;base64,AAAA")],
+    )
+
+    asyncio.run(agent.run(message))
+    asyncio.run(agent.run(message))
+
+    first, second = tracer.traces
+    assert (first.cache_hit, second.cache_hit) == (False, True)
+    assert first.input_tokens and first.output_tokens
+    assert first.total_tokens == first.input_tokens + first.output_tokens
+    assert first.n_images == 1
+    assert first.payload_bytes == len("Extract") + len("data:image/png;base64,AAAA")
+
+    metrics = tracer.metrics()
+    assert metrics["llm_calls"] == 2
+    assert metrics["llm_cache_hits"] == 1
+    # Cache hits cost no tokens
+    assert metrics["llm_input_tokens"] == first.input_tokens
+    assert metrics["llm_latency_seconds_p95"] == first.latency_seconds
+
+    lines = (tmp_path / "trace.jsonl").read_text().splitlines()
+    assert [json.loads(line)["cache_hit"] for line in lines] == [False, True]